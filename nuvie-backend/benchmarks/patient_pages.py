@@ -0,0 +1,167 @@
+"""
+Benchmark of serving pages of patients.
+
+Times pages of `GET /patients`, from querying the DB to the bytes of the
+response, in two ways:
+
+- models: loading `Patient` objects, converting each one into a
+  `PatientPublic`, then validating and serializing the whole `PatientsPublic`
+  through the response model, as FastAPI does
+- rows: loading plain rows of the returned columns with
+  `patient_use_case.get_patient_rows`, and serializing them straight to JSON
+  bytes with pydantic-core, as the route does
+
+Both ways go through the same consecutive pages, and are checked to produce
+the same JSON.
+
+Usage, from the nuvie-backend directory, with the same env vars as the API:
+
+    python benchmarks/patient_pages.py --limits 100 1000 --pages 20
+"""
+
+import argparse
+import json
+import statistics
+import time
+
+from collections.abc import Callable
+from typing import Any
+from uuid import UUID
+
+from pydantic import TypeAdapter
+from pydantic_core import to_json
+from sqlmodel import Session
+
+from nuvie_sdk.db import create_db_engine
+from nuvie_sdk.models import PatientPublic, PatientsPublic
+from nuvie_sdk.use_cases import patient_use_case
+
+response_adapter = TypeAdapter(PatientsPublic)
+
+
+def render_json(content: Any) -> bytes:
+    """Render content like FastAPI's `JSONResponse`."""
+
+    return json.dumps(
+        content,
+        ensure_ascii=False,
+        allow_nan=False,
+        indent=None,
+        separators=(",", ":"),
+    ).encode("utf-8")
+
+
+def page_with_models(
+    session: Session, after: UUID | None, limit: int
+) -> tuple[bytes, float]:
+    """Serve a page through ORM objects and models."""
+
+    patients = patient_use_case.get_patients_after(
+        session=session, after=after, limit=limit
+    )
+    start = time.perf_counter()
+    data = [PatientPublic.model_validate(patient) for patient in patients]
+    response = PatientsPublic(data=data, count=None)
+    validated = response_adapter.validate_python(
+        response, from_attributes=True
+    )
+    content = render_json(response_adapter.dump_python(validated, mode="json"))
+    return content, time.perf_counter() - start
+
+
+def page_with_rows(
+    session: Session, after: UUID | None, limit: int
+) -> tuple[bytes, float]:
+    """Serve a page through plain rows serialized straight to JSON."""
+
+    rows = patient_use_case.get_patient_rows(
+        session=session, after=after, limit=limit
+    )
+    start = time.perf_counter()
+    content = to_json({"data": rows, "count": None, "next_cursor": None})
+    return content, time.perf_counter() - start
+
+
+def time_pages(
+    session: Session,
+    serve: Callable[[Session, UUID | None, int], tuple[bytes, float]],
+    afters: list[UUID | None],
+    limit: int,
+) -> tuple[list[float], list[float], list[bytes]]:
+    """
+    Serve each page, returning how long each one took in total and
+    serializing, in ms, and their contents.
+    """
+
+    totals, serializations, contents = [], [], []
+    for after in afters:
+        start = time.perf_counter()
+        content, serialization = serve(session, after, limit)
+        totals.append((time.perf_counter() - start) * 1000)
+        serializations.append(serialization * 1000)
+        contents.append(content)
+        session.expunge_all()
+    return totals, serializations, contents
+
+
+def report(label: str, totals: list[float], serializations: list[float]):
+    """Print latency statistics of a set of pages."""
+
+    percentiles = statistics.quantiles(totals, n=100)
+    share = sum(serializations) / sum(totals) * 100
+    print(
+        f"{label:>14}: "
+        f"mean {statistics.mean(totals):8.3f} ms | "
+        f"p50 {percentiles[49]:8.3f} ms | "
+        f"p95 {percentiles[94]:8.3f} ms | "
+        f"serializing {share:5.1f}%"
+    )
+
+
+def main() -> None:
+    """Entry point of the benchmark."""
+
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--limits",
+        type=int,
+        nargs="+",
+        default=[100, 1000],
+        help="Sizes of the pages (default: 100 1000)",
+    )
+    parser.add_argument(
+        "--pages",
+        type=int,
+        default=20,
+        help="Amount of pages served per size and way (default: 20)",
+    )
+    args = parser.parse_args()
+
+    engine = create_db_engine()
+    with Session(engine) as session:
+        for limit in args.limits:
+            # Starting IDs of consecutive pages, the same for both ways
+            afters: list[UUID | None] = [None]
+            for _ in range(args.pages - 1):
+                rows = patient_use_case.get_patient_rows(
+                    session=session, after=afters[-1], limit=limit
+                )
+                afters.append(rows[-1]["id"])
+
+            # Warming up the DB's cache, and the serializers
+            time_pages(session, page_with_models, afters[:2], limit)
+            time_pages(session, page_with_rows, afters[:2], limit)
+
+            print(f"Pages of {limit} patients:")
+            models = time_pages(session, page_with_models, afters, limit)
+            rows = time_pages(session, page_with_rows, afters, limit)
+            report("models", *models[:2])
+            report("rows", *rows[:2])
+
+            for with_models, with_rows in zip(models[2], rows[2]):
+                assert json.loads(with_models) == json.loads(with_rows)
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,21 +1,74 @@
+import asyncio
+
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
-from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 import constants as c
+import nuvie_sdk.auth as auth
+from nuvie_sdk.db import get_pool_stats
 from logger import log
+from middleware import CompressionMiddleware
 
 from api import api_router
-from db import engine, init_db
+from db import engine, init_db, replica_engines
+
+
+def log_stats() -> None:
+    """Log the statistics of the access token cache and connection pools."""
+
+    log.info("Access token cache statistics", **auth.token_cache.stats())
+    log.info("DB connection pool statistics", **get_pool_stats(engine))
+    for replica_engine in replica_engines:
+        log.info(
+            "Read replica connection pool statistics",
+            replica=replica_engine.url.render_as_string(),
+            **get_pool_stats(replica_engine),
+        )
+
+
+async def log_stats_periodically(interval: float) -> None:
+    """Log the statistics every `interval` seconds, until cancelled."""
+
+    while True:
+        await asyncio.sleep(interval)
+        log_stats()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    log.debug("Initializing connection to DB...")
+    async with AsyncSession(engine) as session:
+        await init_db(session)
+        log.debug("Connected to DB with success.")
+
+    stats_task = None
+    if c.STATS_LOG_INTERVAL > 0:
+        stats_task = asyncio.create_task(
+            log_stats_periodically(c.STATS_LOG_INTERVAL)
+        )
+
+    yield
+
+    if stats_task is not None:
+        stats_task.cancel()
+    log_stats()
+    auth.shutdown_password_pool()
+    await engine.dispose()
+    for replica_engine in replica_engines:
+        await replica_engine.dispose()
 
 
 app = FastAPI(
     title=c.PROJECT_NAME,
+    lifespan=lifespan,
 )
 
-log.debug("Initializing connection to DB...")
-with Session(engine) as session:
-    init_db(session)
-    log.debug("Connected to DB with success.")
+# Compression levels and minimum size are read from the COMPRESSION_*
+# environment variables
+app.add_middleware(CompressionMiddleware)
 
 
 app.include_router(api_router, prefix=c.API_V1_STR)
@@ -1,43 +1,44 @@
-from collections.abc import Generator
+from collections.abc import AsyncGenerator
 from typing import Annotated
 
-import jwt
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jwt.exceptions import InvalidTokenError
 from pydantic import ValidationError
-from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
 
-from nuvie_sdk.models import TokenPayload, User
+from nuvie_sdk.models import User
+from nuvie_sdk.use_cases import async_user_use_case
 
 import constants as c
 import nuvie_sdk.auth as auth
-from db import engine
+from db import SessionFactory
 
 reusable_oauth2 = OAuth2PasswordBearer(
     tokenUrl=f"{c.API_V1_STR}/login/access-token"
 )
 
 
-def get_db() -> Generator[Session, None, None]:
-    with Session(engine) as session:
+async def get_db() -> AsyncGenerator[AsyncSession, None]:
+    async with SessionFactory() as session:
         yield session
 
 
-SessionDep = Annotated[Session, Depends(get_db)]
+SessionDep = Annotated[AsyncSession, Depends(get_db)]
 TokenDep = Annotated[str, Depends(reusable_oauth2)]
 
 
-def get_current_user(session: SessionDep, token: TokenDep) -> User:
+async def get_current_user(session: SessionDep, token: TokenDep) -> User:
     try:
-        payload = jwt.decode(token, c.SECRET_KEY, algorithms=[auth.ALGORITHM])
-        token_data = TokenPayload(**payload)
+        token_data = auth.decode_access_token(token, c.SECRET_KEY)
     except (InvalidTokenError, ValidationError):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Could not validate credentials",
         )
-    user = session.get(User, token_data.sub)
+    user = await async_user_use_case.get_user_by_id(
+        session=session, user_id=token_data.sub
+    )
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     return user
@@ -46,7 +47,7 @@ def get_current_user(session: SessionDep, token: TokenDep) -> User:
 CurrentUser = Annotated[User, Depends(get_current_user)]
 
 
-def get_current_active_superuser(current_user: CurrentUser) -> User:
+async def get_current_active_superuser(current_user: CurrentUser) -> User:
     if not current_user.is_superuser:
         raise HTTPException(
             status_code=403, detail="The user doesn't have enough privileges"
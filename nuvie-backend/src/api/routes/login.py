@@ -1,3 +1,5 @@
+import math
+
 from datetime import timedelta
 from typing import Annotated, Any
 
@@ -9,13 +11,13 @@ import nuvie_sdk.auth as auth
 
 from api.deps import CurrentUser, SessionDep
 from nuvie_sdk.models import Token, UserPublic
-from nuvie_sdk.use_cases import user_use_case
+from nuvie_sdk.use_cases import async_user_use_case
 
 router = APIRouter()
 
 
 @router.post("/access-token")
-def login_access_token(
+async def login_access_token(
     response: Response,
     session: SessionDep,
     form_data: Annotated[OAuth2PasswordRequestForm, Depends()],
@@ -24,9 +26,18 @@ def login_access_token(
     OAuth2 compatible token login, get an access token for future requests
     """
 
-    user = user_use_case.authenticate(
-        session=session, email=form_data.username, password=form_data.password
-    )
+    try:
+        user = await async_user_use_case.authenticate(
+            session=session,
+            email=form_data.username,
+            password=form_data.password,
+        )
+    except async_user_use_case.LoginThrottledError as e:
+        raise HTTPException(
+            status_code=429,
+            detail="Too many failed logins, try again later",
+            headers={"Retry-After": str(math.ceil(e.retry_after))},
+        )
     if not user:
         raise HTTPException(
             status_code=400, detail="Incorrect email or password"
@@ -43,7 +54,7 @@ def login_access_token(
 
 
 @router.post("/test-token", response_model=UserPublic)
-def test_token(current_user: CurrentUser) -> Any:
+async def test_token(current_user: CurrentUser) -> Any:
     """Test access token"""
 
     return current_user
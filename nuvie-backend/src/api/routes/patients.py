@@ -1,49 +1,248 @@
-from typing import Any
+import csv
+import hashlib
+import io
+import json
+
+from collections.abc import AsyncIterator, Sequence
+from datetime import date
+from decimal import Decimal
+from typing import Annotated, Any, Literal
 from uuid import UUID
 
-from fastapi import APIRouter, HTTPException
+from fastapi import (
+    APIRouter,
+    Body,
+    Depends,
+    Header,
+    HTTPException,
+    Query,
+)
+from fastapi.responses import Response, StreamingResponse
+from pydantic_core import to_json
+from sqlalchemy import RowMapping
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 from api.deps import CurrentUser, SessionDep
+from db import engine
 from nuvie_sdk.models import (
+    MAX_BATCH_SIZE,
+    AgeDistribution,
+    CountMode,
+    Ethnicity,
+    Gender,
+    HealthcareStatsGroups,
     Message,
+    Patient,
+    PatientBulkUpdate,
     PatientCreate,
+    PatientFilters,
+    PatientGroupBy,
+    PatientGroupCounts,
     PatientPublic,
+    PatientsBatchGet,
+    PatientsBatchPublic,
+    PatientsBulkResult,
     PatientsPublic,
     PatientUpdate,
+    Race,
+)
+from nuvie_sdk.use_cases import (
+    async_patient_stats_use_case,
+    async_patient_use_case,
+)
+from nuvie_sdk.use_cases.patient_use_case import (
+    decode_patient_cursor,
+    encode_patient_cursor,
 )
-from nuvie_sdk.use_cases import patient_use_case
+from nuvie_sdk.use_cases.patient_stats_use_case import MAX_AGE_BUCKET_SIZE
 
 
 router = APIRouter()
 
+# Patients fetched from the DB, serialized and sent at once when exporting
+EXPORT_BATCH_SIZE = 1000
+
+EXPORT_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+
+def get_patient_filters(
+    state: str | None = None,
+    city: str | None = None,
+    county: str | None = None,
+    zip: str | None = None,
+    gender: Gender | None = None,
+    race: Race | None = None,
+    ethnicity: Ethnicity | None = None,
+    born_after: date | None = None,
+    born_before: date | None = None,
+    deceased: bool | None = None,
+    last_name_prefix: Annotated[str | None, Query(max_length=128)] = None,
+) -> PatientFilters:
+    """Reads the filters of patients from the query parameters."""
+
+    return PatientFilters(
+        state=state,
+        city=city,
+        county=county,
+        zip=zip,
+        gender=gender,
+        race=race,
+        ethnicity=ethnicity,
+        born_after=born_after,
+        born_before=born_before,
+        deceased=deceased,
+        last_name_prefix=last_name_prefix,
+    )
+
+
+def _etag(version: int) -> str:
+    """Strong ETag of a patient, changing whenever the patient does."""
+
+    return f'"{version}"'
+
+
+def _page_etag(
+    versions: Sequence[tuple[UUID, int]],
+    count: int | None,
+    next_cursor: str | None,
+) -> str:
+    """
+    Strong ETag of a page of patients, from the IDs and versions of its
+    patients, and everything else in the response.
+    """
+
+    digest = hashlib.blake2b(digest_size=16)
+    for patient_id, version in versions:
+        digest.update(patient_id.bytes)
+        digest.update(version.to_bytes(8, "big"))
+    digest.update(to_json([count, next_cursor]))
+    return f'"{digest.hexdigest()}"'
+
+
+def _etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """
+    Whether an `If-None-Match` header matches an ETag. As it's only used for
+    GET requests, weak ETags match their strong counterparts.
+    """
+
+    if if_none_match is None:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip().removeprefix("W/")
+        if candidate in ("*", etag):
+            return True
+    return False
+
+
+def _not_modified(etag: str) -> Response:
+    """Response to a conditional request for something that didn't change."""
+
+    return Response(status_code=304, headers={"ETag": etag})
+
 
 @router.get(
     "/",
     response_model=PatientsPublic,
 )
-def read_patients(
+async def read_patients(
     session: SessionDep,
     current_user: CurrentUser,
+    filters: Annotated[PatientFilters, Depends(get_patient_filters)],
     skip: int = 0,
     limit: int = 100,
+    after: str | None = None,
+    count_mode: Annotated[CountMode, Query(alias="count")] = CountMode.EXACT,
+    if_none_match: Annotated[str | None, Header()] = None,
 ) -> Any:
-    """Retrieve patients."""
+    """
+    Retrieve patients, ordered by ID.
+
+    Patients can be filtered by location, gender, race, ethnicity, range of
+    birthdates (inclusive), whether they are deceased, and start of their last
+    name (case-insensitive).
+
+    Pages can be requested either with `skip`, or with `after` set to the
+    `next_cursor` of the previous page. The latter is just as fast for the
+    last pages as for the first ones.
+
+    The total amount of patients is counted exactly (and cached for a few
+    seconds), estimated from the DB's statistics, or not counted at all,
+    depending on `count`. Filtered patients are counted exactly even when an
+    estimate is requested.
+
+    Pages have a strong ETag, changing whenever any of their patients, or
+    the count, do. When it matches `If-None-Match`, only the IDs and versions
+    of the patients are queried, and 304 is returned without a body.
+    """
+
+    after_id = None
+    if after is not None:
+        if skip:
+            raise HTTPException(
+                status_code=400,
+                detail="`skip` and `after` can't be used together",
+            )
+        try:
+            after_id = decode_patient_cursor(after)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    count = await async_patient_use_case.count_patients(
+        session=session, mode=count_mode, filters=filters
+    )
 
-    count = patient_use_case.count_patients(session=session)
-    patients = patient_use_case.get_patients(
-        session=session, skip=skip, limit=limit
+    if if_none_match is not None:
+        versions = await async_patient_use_case.get_patient_versions(
+            session=session,
+            skip=skip,
+            after=after_id,
+            limit=limit,
+            filters=filters,
+        )
+        next_cursor = None
+        if versions and len(versions) == limit:
+            next_cursor = encode_patient_cursor(versions[-1][0])
+        etag = _page_etag(versions, count, next_cursor)
+        if _etag_matches(if_none_match, etag):
+            return _not_modified(etag)
+
+    rows = await async_patient_use_case.get_patient_rows(
+        session=session,
+        skip=skip,
+        after=after_id,
+        limit=limit,
+        filters=filters,
     )
 
-    # Convert Patient models to PatientPublic
-    patients = [PatientPublic.model_validate(patient) for patient in patients]
-    return PatientsPublic(data=patients, count=count)
+    next_cursor = None
+    if rows and len(rows) == limit:
+        next_cursor = encode_patient_cursor(rows[-1]["id"])
+    # Computed from the rows themselves, as patients may have changed since
+    # their versions were queried
+    versions = [(row["id"], row["version"]) for row in rows]
+    etag = _page_etag(versions, count, next_cursor)
+
+    # Serializing the rows straight to JSON, as building a PatientPublic for
+    # each, then validating them all against the response model again, takes
+    # longer than the query itself. The response is the same
+    content = to_json(
+        {"data": rows, "count": count, "next_cursor": next_cursor}
+    )
+    return Response(
+        content=content,
+        media_type="application/json",
+        headers={"ETag": etag},
+    )
 
 
 @router.post(
     "/",
     response_model=PatientPublic,
 )
-def create_patient(
+async def create_patient(
     *,
     session: SessionDep,
     patient_in: PatientCreate,
@@ -52,7 +251,7 @@ def create_patient(
     """Create new patient."""
 
     # Check if patient with this SSN already exists
-    existing_patient = patient_use_case.get_patient_by_ssn(
+    existing_patient = await async_patient_use_case.get_patient_by_ssn(
         session=session, ssn=patient_in.ssn
     )
     if existing_patient:
@@ -62,7 +261,7 @@ def create_patient(
         )
 
     # Check if patient with this ID already exists, if needed
-    if patient_in.id and patient_use_case.get_patient_by_id(
+    if patient_in.id and await async_patient_use_case.get_patient_by_id(
         session=session, patient_id=patient_in.id
     ):
         raise HTTPException(
@@ -70,32 +269,278 @@ def create_patient(
             detail="A patient with this ID already exists in the system.",
         )
 
-    patient = patient_use_case.create_patient(
+    patient = await async_patient_use_case.create_patient(
         session=session, patient_create=patient_in
     )
 
     return patient
 
 
+@router.post("/batch-get", response_model=PatientsBatchPublic)
+async def read_patients_batch(
+    session: SessionDep, batch_in: PatientsBatchGet, current_user: CurrentUser
+) -> Any:
+    """
+    Get many patients at once, by IDs or by SSNs.
+
+    Patients are returned in the order of the keys requested, with nulls for
+    the keys that don't belong to any patient, which are also listed in
+    `missing`.
+    """
+
+    keys: list[Any]
+    if batch_in.ids is not None:
+        keys = batch_in.ids
+        patients = await async_patient_use_case.get_patients_by_ids(
+            session=session, patient_ids=batch_in.ids
+        )
+    else:
+        keys = batch_in.ssns or []
+        patients = await async_patient_use_case.get_patients_by_ssns(
+            session=session, ssns=keys
+        )
+
+    missing = [key for key, patient in zip(keys, patients) if patient is None]
+    return PatientsBatchPublic(
+        data=[
+            PatientPublic.model_validate(patient) if patient else None
+            for patient in patients
+        ],
+        missing=missing,
+    )
+
+
+@router.post("/bulk", response_model=PatientsBulkResult)
+async def create_patients_bulk(
+    *,
+    session: SessionDep,
+    patients_in: Annotated[
+        list[PatientCreate], Body(max_length=MAX_BATCH_SIZE)
+    ],
+    current_user: CurrentUser,
+    upsert: bool = False,
+    key: Literal["id", "ssn"] = "ssn",
+) -> Any:
+    """
+    Create many patients at once, in a single transaction.
+
+    Patients whose SSN or ID already exist are reported as conflicts, unless
+    `upsert` is set, in which case the existing patient with the same `key`
+    is updated instead. Repeated patients are skipped. The status of each
+    patient is returned in `statuses`, in order.
+    """
+
+    if upsert:
+        return await async_patient_use_case.bulk_upsert_patients(
+            session=session, patients=patients_in, key=key
+        )
+    return await async_patient_use_case.bulk_create_patients(
+        session=session, patients=patients_in
+    )
+
+
+@router.patch("/bulk", response_model=PatientsBulkResult)
+async def update_patients_bulk(
+    *,
+    session: SessionDep,
+    patients_in: Annotated[
+        list[PatientBulkUpdate], Body(max_length=MAX_BATCH_SIZE)
+    ],
+    current_user: CurrentUser,
+) -> Any:
+    """
+    Update many patients at once, by ID, in a single transaction.
+
+    Only the fields given for each patient are updated. The status of each
+    update is returned in `statuses`, in order.
+    """
+
+    return await async_patient_use_case.bulk_update_patients(
+        session=session, updates=patients_in
+    )
+
+
+@router.post("/bulk-delete", response_model=PatientsBulkResult)
+async def delete_patients_bulk(
+    *,
+    session: SessionDep,
+    patient_ids: Annotated[list[UUID], Body(max_length=MAX_BATCH_SIZE)],
+    current_user: CurrentUser,
+) -> Any:
+    """
+    Delete many patients at once, by ID, in a single transaction.
+
+    The status of each ID is returned in `statuses`, in order.
+    """
+
+    return await async_patient_use_case.bulk_delete_patients(
+        session=session, patient_ids=patient_ids
+    )
+
+
+def _json_default(value: Any) -> Any:
+    """Serializes values like the API does, decimals as strings included."""
+
+    if isinstance(value, (Decimal, UUID)):
+        return str(value)
+    if isinstance(value, date):
+        return value.isoformat()
+    raise TypeError(f"Can't serialize {type(value).__name__} to JSON")
+
+
+def _to_ndjson(rows: Sequence[RowMapping]) -> str:
+    return "".join(
+        json.dumps(dict(row), separators=(",", ":"), default=_json_default)
+        + "\n"
+        for row in rows
+    )
+
+
+def _to_csv(rows: Sequence[Any]) -> str:
+    buffer = io.StringIO()
+    # Dates, decimals and UUIDs are written with str(), enums by value
+    csv.writer(buffer).writerows(rows)
+    return buffer.getvalue()
+
+
+async def _export_patients(export_format: str) -> AsyncIterator[str]:
+    """Serializes every patient, one batch of rows at a time."""
+
+    if export_format == "csv":
+        columns = Patient.__table__.columns  # type: ignore
+        yield _to_csv([[column.name for column in columns]])
+
+    # With a session of its own, open for as long as the response streams
+    async with AsyncSession(engine) as session:
+        async for rows in async_patient_use_case.stream_patients(
+            session=session, batch_size=EXPORT_BATCH_SIZE
+        ):
+            if export_format == "csv":
+                yield _to_csv([row.values() for row in rows])
+            else:
+                yield _to_ndjson(rows)
+
+
+@router.get("/export")
+async def export_patients(
+    current_user: CurrentUser,
+    export_format: Annotated[
+        Literal["ndjson", "csv"], Query(alias="format")
+    ] = "ndjson",
+) -> StreamingResponse:
+    """
+    Export every patient, ordered by ID, as NDJSON or CSV.
+
+    Patients are streamed from a server-side cursor and serialized a batch at
+    a time, so exports of any size take the same amount of memory.
+    """
+
+    return StreamingResponse(
+        _export_patients(export_format),
+        media_type=EXPORT_MEDIA_TYPES[export_format],
+        headers={
+            "Content-Disposition": (
+                f'attachment; filename="patients.{export_format}"'
+            )
+        },
+    )
+
+
+@router.get("/stats/counts", response_model=PatientGroupCounts)
+async def read_patient_counts(
+    session: SessionDep,
+    current_user: CurrentUser,
+    group_by: PatientGroupBy,
+    filters: Annotated[PatientFilters, Depends(get_patient_filters)],
+) -> Any:
+    """
+    Count patients per value of a field, from most to least common.
+
+    Counted by the DB, and cached for a minute (by default).
+    """
+
+    return await async_patient_stats_use_case.count_patients_by(
+        session=session, group_by=group_by, filters=filters
+    )
+
+
+@router.get("/stats/ages", response_model=AgeDistribution)
+async def read_patient_ages(
+    session: SessionDep,
+    current_user: CurrentUser,
+    filters: Annotated[PatientFilters, Depends(get_patient_filters)],
+    bucket_size: Annotated[int, Query(ge=1, le=MAX_AGE_BUCKET_SIZE)] = 10,
+) -> Any:
+    """
+    Count patients per range of `bucket_size` years of age.
+
+    The age of deceased patients is their age at death. Counted by the DB,
+    and cached for a minute (by default).
+    """
+
+    return await async_patient_stats_use_case.get_age_distribution(
+        session=session, bucket_size=bucket_size, filters=filters
+    )
+
+
+@router.get("/stats/healthcare", response_model=HealthcareStatsGroups)
+async def read_patient_healthcare_stats(
+    session: SessionDep,
+    current_user: CurrentUser,
+    filters: Annotated[PatientFilters, Depends(get_patient_filters)],
+    group_by: PatientGroupBy | None = None,
+) -> Any:
+    """
+    Sum and average the healthcare expenses and coverage of patients, overall
+    or per value of a field.
+
+    Computed by the DB, and cached for a minute (by default).
+    """
+
+    return await async_patient_stats_use_case.get_healthcare_stats(
+        session=session, group_by=group_by, filters=filters
+    )
+
+
 @router.get("/{patient_id}", response_model=PatientPublic)
-def read_patient_by_id(
-    patient_id: UUID, session: SessionDep, current_user: CurrentUser
+async def read_patient_by_id(
+    patient_id: UUID,
+    session: SessionDep,
+    current_user: CurrentUser,
+    response: Response,
+    if_none_match: Annotated[str | None, Header()] = None,
 ) -> Any:
-    """Get a specific patient by id."""
+    """
+    Get a specific patient by id.
 
-    patient = patient_use_case.get_patient_by_id(
-        session=session, patient_id=patient_id
+    The patient's version is its strong ETag. When it matches
+    `If-None-Match`, only the version is queried, and 304 is returned
+    without a body.
+    """
+
+    if if_none_match is not None:
+        version = await async_patient_use_case.get_patient_version(
+            session=session, patient_id=patient_id
+        )
+        if version is not None and _etag_matches(
+            if_none_match, _etag(version)
+        ):
+            return _not_modified(_etag(version))
+
+    patient = await async_patient_use_case.get_patient_by_id(
+        session=session, patient_id=patient_id, replica=True
     )
     if not patient:
         raise HTTPException(
             status_code=404,
             detail="The patient with this id does not exist in the system",
         )
+    response.headers["ETag"] = _etag(patient.version)
     return patient
 
 
 @router.patch("/{patient_id}", response_model=PatientPublic)
-def update_patient(
+async def update_patient(
     *,
     session: SessionDep,
     patient_id: UUID,
@@ -104,7 +549,7 @@ def update_patient(
 ) -> Any:
     """Update a patient."""
 
-    db_patient = patient_use_case.get_patient_by_id(
+    db_patient = await async_patient_use_case.get_patient_by_id(
         session=session, patient_id=patient_id
     )
     if not db_patient:
@@ -115,7 +560,7 @@ def update_patient(
 
     # Check if SSN is being updated and if it conflicts with existing patient
     if patient_in.ssn:
-        existing_patient = patient_use_case.get_patient_by_ssn(
+        existing_patient = await async_patient_use_case.get_patient_by_ssn(
             session=session, ssn=patient_in.ssn
         )
         if existing_patient and existing_patient.id != patient_id:
@@ -123,27 +568,27 @@ def update_patient(
                 status_code=409, detail="Patient with this SSN already exists"
             )
 
-    db_patient = patient_use_case.update_patient(
+    db_patient = await async_patient_use_case.update_patient(
         session=session, db_patient=db_patient, patient_in=patient_in
     )
     return db_patient
 
 
 @router.delete("/{patient_id}", response_model=Message)
-def delete_patient(
+async def delete_patient(
     session: SessionDep, current_user: CurrentUser, patient_id: UUID
 ) -> Any:
     """Delete a patient."""
 
     # Check if patient exists
-    patient = patient_use_case.get_patient_by_id(
+    patient = await async_patient_use_case.get_patient_by_id(
         session=session, patient_id=patient_id
     )
     if not patient:
         raise HTTPException(status_code=404, detail="Patient not found")
 
     # Delete the patient
-    success = patient_use_case.delete_patient(
+    success = await async_patient_use_case.delete_patient(
         session=session, patient_id=patient_id
     )
     if not success:
@@ -153,12 +598,14 @@ def delete_patient(
 
 
 @router.get("/search/ssn/{ssn}", response_model=PatientPublic)
-def read_patient_by_ssn(
+async def read_patient_by_ssn(
     ssn: str, session: SessionDep, current_user: CurrentUser
 ) -> Any:
     """Get a specific patient by SSN."""
 
-    patient = patient_use_case.get_patient_by_ssn(session=session, ssn=ssn)
+    patient = await async_patient_use_case.get_patient_by_ssn(
+        session=session, ssn=ssn, replica=True
+    )
     if not patient:
         raise HTTPException(
             status_code=404,
@@ -1,11 +1,12 @@
-from typing import Any
+from typing import Annotated, Any
 
-from fastapi import APIRouter, Depends, HTTPException
-from sqlmodel import func, select
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlmodel import select
 
 from api.deps import CurrentUser, SessionDep, get_current_active_superuser
-from nuvie_sdk.auth import get_password_hash, verify_password
+from nuvie_sdk.auth import verify_password_async
 from nuvie_sdk.models import (
+    CountMode,
     Message,
     UpdatePassword,
     User,
@@ -15,7 +16,7 @@ from nuvie_sdk.models import (
     UsersPublic,
     UserUpdate,
 )
-from nuvie_sdk.use_cases import user_use_case
+from nuvie_sdk.use_cases import async_user_use_case
 
 
 router = APIRouter()
@@ -26,19 +27,21 @@ router = APIRouter()
     dependencies=[Depends(get_current_active_superuser)],
     response_model=UsersPublic,
 )
-def read_users(
+async def read_users(
     session: SessionDep,
     current_user: CurrentUser,
     skip: int = 0,
     limit: int = 100,
+    count_mode: Annotated[CountMode, Query(alias="count")] = CountMode.EXACT,
 ) -> Any:
     """Retrieve users."""
 
-    count_statement = select(func.count()).select_from(User)
-    count = session.exec(count_statement).one()
+    count = await async_user_use_case.count_users(
+        session=session, mode=count_mode
+    )
 
     statement = select(User).offset(skip).limit(limit)
-    users = session.exec(statement).all()
+    users = (await session.exec(statement)).all()
 
     return UsersPublic(data=users, count=count)  # type: ignore
 
@@ -48,12 +51,12 @@ def read_users(
     dependencies=[Depends(get_current_active_superuser)],
     response_model=UserPublic,
 )
-def create_user(
+async def create_user(
     *, session: SessionDep, user_in: UserCreate, current_user: CurrentUser
 ) -> Any:
     """Create new user."""
 
-    user = user_use_case.get_user_by_email(
+    user = await async_user_use_case.get_user_by_email(
         session=session, email=user_in.email
     )
     if user:
@@ -62,40 +65,39 @@ def create_user(
             detail="A user with this email already exists in the system.",
         )
 
-    user = user_use_case.create_user(session=session, user_create=user_in)
+    user = await async_user_use_case.create_user(
+        session=session, user_create=user_in
+    )
 
     return user
 
 
 @router.patch("/me", response_model=UserUpdate)
-def update_user_me(
+async def update_user_me(
     *, session: SessionDep, user_in: UserUpdate, current_user: CurrentUser
 ) -> Any:
     """Update own user."""
 
     if user_in.email:
-        existing_user = user_use_case.get_user_by_email(
+        existing_user = await async_user_use_case.get_user_by_email(
             session=session, email=user_in.email
         )
         if existing_user and existing_user.id != current_user.id:
             raise HTTPException(
                 status_code=409, detail="User with this email already exists"
             )
-    user_data = user_in.model_dump(exclude_unset=True)
-    current_user.sqlmodel_update(user_data)
-    session.add(current_user)
-    session.commit()
-    session.refresh(current_user)
-    return current_user
+    return await async_user_use_case.update_user(
+        session=session, db_user=current_user, user_in=user_in
+    )
 
 
 @router.patch("/me/password", response_model=Message)
-def update_password_me(
+async def update_password_me(
     *, session: SessionDep, body: UpdatePassword, current_user: CurrentUser
 ) -> Any:
     """Update own password."""
 
-    if not verify_password(
+    if not await verify_password_async(
         body.current_password, current_user.hashed_password
     ):
         raise HTTPException(status_code=400, detail="Incorrect password")
@@ -104,22 +106,23 @@ def update_password_me(
             status_code=400,
             detail="New password cannot be the same as the current one",
         )
-    hashed_password = get_password_hash(body.new_password)
-    current_user.hashed_password = hashed_password
-    session.add(current_user)
-    session.commit()
+    await async_user_use_case.update_user_password(
+        session, current_user, body.new_password
+    )
     return Message(message="Password updated successfully")
 
 
 @router.get("/me", response_model=UserPublic)
-def read_user_me(current_user: CurrentUser) -> Any:
+async def read_user_me(current_user: CurrentUser) -> Any:
     """Get current user."""
 
     return current_user
 
 
 @router.delete("/me", response_model=Message)
-def delete_user_me(session: SessionDep, current_user: CurrentUser) -> Any:
+async def delete_user_me(
+    session: SessionDep, current_user: CurrentUser
+) -> Any:
     """Delete own user."""
 
     if current_user.is_superuser:
@@ -128,16 +131,17 @@ def delete_user_me(session: SessionDep, current_user: CurrentUser) -> Any:
             detail="Super users are not allowed to delete themselves",
         )
 
-    session.delete(current_user)
-    session.commit()
+    await async_user_use_case.delete_user(
+        session=session, db_user=current_user
+    )
     return Message(message="User deleted successfully")
 
 
 @router.post("/signup", response_model=UserPublic)
-def register_user(session: SessionDep, user_in: UserSignup) -> Any:
+async def register_user(session: SessionDep, user_in: UserSignup) -> Any:
     """Create new user without the need to be logged in."""
 
-    user = user_use_case.get_user_by_email(
+    user = await async_user_use_case.get_user_by_email(
         session=session, email=user_in.email
     )
     if user:
@@ -146,17 +150,19 @@ def register_user(session: SessionDep, user_in: UserSignup) -> Any:
             detail="The user with this email already exists in the system",
         )
     user_create = UserSignup.model_validate(user_in)
-    user = user_use_case.create_user(session=session, user_create=user_create)
+    user = await async_user_use_case.create_user(
+        session=session, user_create=user_create
+    )
     return user
 
 
 @router.get("/{user_id}", response_model=UserPublic)
-def read_user_by_id(
+async def read_user_by_id(
     user_id: int, session: SessionDep, current_user: CurrentUser
 ) -> Any:
     """Get a specific user by id."""
 
-    user = session.get(User, user_id)
+    user = await session.get(User, user_id)
     if user == current_user:
         return user
     if not current_user.is_superuser:
@@ -172,7 +178,7 @@ def read_user_by_id(
     dependencies=[Depends(get_current_active_superuser)],
     response_model=UserUpdate,
 )
-def update_user(
+async def update_user(
     *,
     session: SessionDep,
     user_id: int,
@@ -180,14 +186,14 @@ def update_user(
 ) -> Any:
     """Update a user."""
 
-    db_user = session.get(User, user_id)
+    db_user = await session.get(User, user_id)
     if not db_user:
         raise HTTPException(
             status_code=404,
             detail="The user with this id does not exist in the system",
         )
     if user_in.email:
-        existing_user = user_use_case.get_user_by_email(
+        existing_user = await async_user_use_case.get_user_by_email(
             session=session, email=user_in.email
         )
         if existing_user and existing_user.id != user_id:
@@ -195,7 +201,7 @@ def update_user(
                 status_code=409, detail="User with this email already exists"
             )
 
-    db_user = user_use_case.update_user(
+    db_user = await async_user_use_case.update_user(
         session=session, db_user=db_user, user_in=user_in
     )
     return db_user
@@ -204,12 +210,12 @@ def update_user(
 @router.delete(
     "/{user_id}", dependencies=[Depends(get_current_active_superuser)]
 )
-def delete_user(
+async def delete_user(
     session: SessionDep, current_user: CurrentUser, user_id: int
 ) -> Message:
     """Delete a user."""
 
-    user = session.get(User, user_id)
+    user = await session.get(User, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     if user == current_user:
@@ -219,6 +225,5 @@ def delete_user(
         )
     # statement = delete(Item).where(col(Item.owner_id) == user_id)
     # session.exec(statement)  # type: ignore
-    session.delete(user)
-    session.commit()
+    await async_user_use_case.delete_user(session=session, db_user=user)
     return Message(message="User deleted successfully")
@@ -38,21 +38,51 @@ else:
 
 LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
 
+# Seconds between logs of the access token cache and connection pool
+# statistics. 0 to only log them at shutdown
+try:
+    STATS_LOG_INTERVAL = float(os.environ.get("STATS_LOG_INTERVAL", "60"))
+except ValueError:
+    raise ValueError(
+        "Environment variable STATS_LOG_INTERVAL must be a valid number"
+    )
+
 
 # * ###########################################################################
-# * DB credentials
+# * Response compression
 # * ###########################################################################
 
-POSTGRES_SERVER = os.getenv("POSTGRES_SERVER", "postgres")
-POSTGRES_PORT = os.getenv("POSTGRES_PORT", "5432")
+try:
+    COMPRESSION_MINIMUM_SIZE = int(
+        os.environ.get("COMPRESSION_MINIMUM_SIZE", "1000")
+    )
+except ValueError:
+    raise ValueError(
+        "Environment variable COMPRESSION_MINIMUM_SIZE must be a valid integer"
+    )
 
-POSTGRES_DB = os.getenv("POSTGRES_DB", "nuvie")
-POSTGRES_USER = os.getenv("POSTGRES_USER", "postgres")
-POSTGRES_PASSWORD = os.getenv("POSTGRES_PASSWORD", "")
+try:
+    COMPRESSION_GZIP_LEVEL = int(os.environ.get("COMPRESSION_GZIP_LEVEL", "6"))
+except ValueError:
+    raise ValueError(
+        "Environment variable COMPRESSION_GZIP_LEVEL must be a valid integer"
+    )
 
+try:
+    COMPRESSION_BROTLI_LEVEL = int(
+        os.environ.get("COMPRESSION_BROTLI_LEVEL", "4")
+    )
+except ValueError:
+    raise ValueError(
+        "Environment variable COMPRESSION_BROTLI_LEVEL must be a valid integer"
+    )
 
-def get_postgres_uri():
-    return f"postgresql+psycopg://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_SERVER}:{POSTGRES_PORT}/{POSTGRES_DB}"
+try:
+    COMPRESSION_ZSTD_LEVEL = int(os.environ.get("COMPRESSION_ZSTD_LEVEL", "3"))
+except ValueError:
+    raise ValueError(
+        "Environment variable COMPRESSION_ZSTD_LEVEL must be a valid integer"
+    )
 
 
 # * ###########################################################################
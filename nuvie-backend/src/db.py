@@ -1,13 +1,29 @@
-from sqlmodel import Session, create_engine, select
-
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from nuvie_sdk.db import (
+    create_async_db_engine,
+    create_async_replica_engines,
+    create_async_session_factory,
+)
 from nuvie_sdk.models import User, UserCreate
-from nuvie_sdk.use_cases import user_use_case
+from nuvie_sdk.use_cases import async_user_use_case
 
 from logger import log
 import constants as c
 
 
-engine = create_engine(str(c.get_postgres_uri()))
+# Pool settings are read from the DB_* environment variables
+engine = create_async_db_engine()
+# Read replicas in POSTGRES_REPLICAS, if any
+replica_engines = create_async_replica_engines()
+
+# Sessions sending the reads of use cases that allow it to the replicas.
+# Not expiring on commit, as expired attributes can't be lazily loaded
+# without awaiting, which serializing responses doesn't do
+SessionFactory = create_async_session_factory(
+    engine, replica_engines, expire_on_commit=False
+)
 
 
 # make sure all SQLModel models are imported (nuvie_sdk.models) before
@@ -17,10 +33,12 @@ engine = create_engine(str(c.get_postgres_uri()))
 # https://github.com/tiangolo/full-stack-fastapi-template/issues/28
 
 
-def init_db(session: Session) -> None:
+async def init_db(session: AsyncSession) -> None:
     # Creating first superuser if none exists
-    user = session.exec(
-        select(User).where(User.email == c.FIRST_SUPERUSER_EMAIL)
+    user = (
+        await session.exec(
+            select(User).where(User.email == c.FIRST_SUPERUSER_EMAIL)
+        )
     ).first()
 
     if not user:
@@ -33,6 +51,8 @@ def init_db(session: Session) -> None:
         )
         log.debug(f"New user data: {new_user}")
 
-        user_use_case.create_user(session=session, user_create=new_user)
+        await async_user_use_case.create_user(
+            session=session, user_create=new_user
+        )
 
         log.info("First superuser created with success!")
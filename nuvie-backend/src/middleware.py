@@ -0,0 +1,290 @@
+"""
+Compression of responses, negotiated with the `Accept-Encoding` of requests.
+
+gzip is always available. zstd and Brotli are too when the `zstandard` and
+`brotli` packages are installed, and are preferred to gzip when a client
+accepts them all equally.
+"""
+
+import zlib
+
+from typing import Any
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+import constants as c
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+# Media types compressed besides "text/*", "*+json" and "*+xml"
+COMPRESSIBLE_MEDIA_TYPES = {
+    "application/json",
+    "application/x-ndjson",
+    "application/javascript",
+    "application/xml",
+}
+
+
+class GzipCompressor:
+    """Compresses a response with gzip, chunk by chunk."""
+
+    def __init__(self, level: int) -> None:
+        # 16 + MAX_WBITS: a gzip header and trailer around the deflate stream
+        self._compressor = zlib.compressobj(
+            level, zlib.DEFLATED, 16 + zlib.MAX_WBITS
+        )
+
+    def flush(self, data: bytes) -> bytes:
+        """Compress a chunk, flushing it so that it can be sent right away."""
+
+        return self._compressor.compress(data) + self._compressor.flush(
+            zlib.Z_SYNC_FLUSH
+        )
+
+    def finish(self, data: bytes) -> bytes:
+        """Compress the last chunk, ending the stream."""
+
+        return self._compressor.compress(data) + self._compressor.flush()
+
+
+class BrotliCompressor:
+    """Compresses a response with Brotli, chunk by chunk."""
+
+    def __init__(self, level: int) -> None:
+        self._compressor = brotli.Compressor(quality=level)  # type: ignore
+
+    def flush(self, data: bytes) -> bytes:
+        """Compress a chunk, flushing it so that it can be sent right away."""
+
+        return self._compressor.process(data) + self._compressor.flush()
+
+    def finish(self, data: bytes) -> bytes:
+        """Compress the last chunk, ending the stream."""
+
+        return self._compressor.process(data) + self._compressor.finish()
+
+
+class ZstdCompressor:
+    """Compresses a response with zstd, chunk by chunk."""
+
+    def __init__(self, level: int) -> None:
+        self._compressor = zstandard.ZstdCompressor(  # type: ignore
+            level=level
+        ).compressobj()
+
+    def flush(self, data: bytes) -> bytes:
+        """Compress a chunk, flushing it so that it can be sent right away."""
+
+        return self._compressor.compress(data) + self._compressor.flush(
+            zstandard.COMPRESSOBJ_FLUSH_BLOCK  # type: ignore
+        )
+
+    def finish(self, data: bytes) -> bytes:
+        """Compress the last chunk, ending the stream."""
+
+        return self._compressor.compress(data) + self._compressor.flush()
+
+
+# Available encodings, by token in `Accept-Encoding`, in order of preference
+ENCODINGS: dict[str, Any] = {}
+if zstandard is not None:
+    ENCODINGS["zstd"] = ZstdCompressor
+if brotli is not None:
+    ENCODINGS["br"] = BrotliCompressor
+ENCODINGS["gzip"] = GzipCompressor
+
+
+def negotiate_encoding(accept_encoding: str) -> str | None:
+    """
+    Choose the encoding of a response from the `Accept-Encoding` of its
+    request.
+
+    Returns:
+        The available encoding with the highest quality value, preferring
+        the earliest in `ENCODINGS` on ties, or None if the client accepts
+        none of them.
+    """
+
+    qualities: dict[str, float] = {}
+    for item in accept_encoding.split(","):
+        name, _, parameters = item.partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        quality = 1.0
+        for parameter in parameters.split(";"):
+            key, _, value = parameter.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[name] = quality
+
+    encoding, best_quality = None, 0.0
+    for name in ENCODINGS:
+        quality = qualities.get(name, qualities.get("*", 0.0))
+        if quality > best_quality:
+            encoding, best_quality = name, quality
+    return encoding
+
+
+def _is_compressible(content_type: str) -> bool:
+    media_type = content_type.partition(";")[0].strip().lower()
+    return (
+        media_type.startswith("text/")
+        or media_type.endswith(("+json", "+xml"))
+        or media_type in COMPRESSIBLE_MEDIA_TYPES
+    )
+
+
+class _CompressingSend:
+    """
+    Sends the messages of a single response, compressing its body.
+
+    The start of the response is held back until the first chunk of the
+    body, to decide whether to compress it. Whole bodies smaller than the
+    minimum size are sent as they are, while streamed ones are compressed
+    regardless, and each chunk is flushed as soon as it's compressed.
+    """
+
+    def __init__(
+        self, send: Send, encoding: str | None, level: int, minimum_size: int
+    ) -> None:
+        self.send = send
+        self.encoding = encoding
+        self.level = level
+        self.minimum_size = minimum_size
+        self.start: Message | None = None
+        self.compressor: Any = None
+
+    async def __call__(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            self.start = message
+        elif message["type"] != "http.response.body":
+            await self.send(message)
+        elif self.start is not None:
+            await self._send_first_chunk(message)
+        elif self.compressor is not None:
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if more_body:
+                body = self.compressor.flush(body)
+            else:
+                body = self.compressor.finish(body)
+            await self.send(
+                {
+                    "type": "http.response.body",
+                    "body": body,
+                    "more_body": more_body,
+                }
+            )
+        else:
+            await self.send(message)
+
+    async def _send_first_chunk(self, message: Message) -> None:
+        start, self.start = self.start, None
+        assert start is not None
+        headers = MutableHeaders(raw=start["headers"])
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        compressible = "content-encoding" not in headers and _is_compressible(
+            headers.get("content-type", "")
+        )
+        if compressible:
+            # Whether it's compressed or not, the response depends on the
+            # request's `Accept-Encoding`, which caches must know about
+            headers.add_vary_header("Accept-Encoding")
+        if (
+            not compressible
+            or self.encoding is None
+            or (not more_body and len(body) < self.minimum_size)
+        ):
+            await self.send(start)
+            await self.send(message)
+            return
+
+        self.compressor = ENCODINGS[self.encoding](self.level)
+        headers["Content-Encoding"] = self.encoding
+        # The compressed bytes differ from the ones a strong ETag stands for,
+        # and may differ between compression levels or library versions
+        etag = headers.get("etag")
+        if etag is not None and not etag.startswith("W/"):
+            headers["ETag"] = f"W/{etag}"
+        if more_body:
+            # The final length isn't known until the last chunk
+            del headers["Content-Length"]
+            body = self.compressor.flush(body)
+        else:
+            body = self.compressor.finish(body)
+            headers["Content-Length"] = str(len(body))
+
+        await self.send(start)
+        await self.send(
+            {
+                "type": "http.response.body",
+                "body": body,
+                "more_body": more_body,
+            }
+        )
+
+
+class CompressionMiddleware:
+    """
+    Compresses responses with the encoding negotiated with each request.
+
+    Only responses with a textual media type, and no encoding of their own,
+    are compressed. Whole ones are only compressed when they are at least
+    `minimum_size` bytes long, while streamed ones always are.
+
+    Args:
+        app: The ASGI app whose responses are compressed
+        minimum_size: Bytes below which whole responses aren't compressed
+        gzip_level: Compression level of gzip, from 1 to 9
+        brotli_level: Quality of Brotli, from 0 to 11
+        zstd_level: Compression level of zstd, from 1 to 22
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = c.COMPRESSION_MINIMUM_SIZE,
+        gzip_level: int = c.COMPRESSION_GZIP_LEVEL,
+        brotli_level: int = c.COMPRESSION_BROTLI_LEVEL,
+        zstd_level: int = c.COMPRESSION_ZSTD_LEVEL,
+    ) -> None:
+        self.app = app
+        self.minimum_size = minimum_size
+        self.levels = {
+            "gzip": gzip_level,
+            "br": brotli_level,
+            "zstd": zstd_level,
+        }
+
+    async def __call__(
+        self, scope: Scope, receive: Receive, send: Send
+    ) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = negotiate_encoding(
+            Headers(scope=scope).get("accept-encoding", "")
+        )
+        level = self.levels[encoding] if encoding is not None else 0
+        await self.app(
+            scope,
+            receive,
+            _CompressingSend(send, encoding, level, self.minimum_size),
+        )
@@ -0,0 +1,223 @@
+"""
+Columnar parsing of patients CSV files, with Apache Arrow.
+
+An alternative to `parsers.parse_csv_row`, which builds a dictionary and a
+PatientCreate object per row. Here, chunks of the CSV file are read into Arrow
+arrays, and every conversion and validation is done a whole column at a time.
+The resulting record batches have the same columns as the patients table
+(except the ones filled by the DB), and are loaded straight into the DB by
+`copy_loader.copy_record_batch`.
+"""
+
+from enum import Enum
+from pathlib import Path
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pa_csv
+import sqlalchemy as sa
+
+from nuvie_sdk.models.patient import Patient
+from parsers import (
+    DEFAULT_ETHNICITY,
+    DEFAULT_GENDER,
+    DEFAULT_MARITAL,
+    DEFAULT_RACE,
+    ETHNICITY_MAPPING,
+    GENDER_MAPPING,
+    MARITAL_MAPPING,
+    RACE_MAPPING,
+)
+
+
+_PATIENT_TABLE = Patient.__table__  # type: ignore
+
+# CSV field of each column of the patients table
+CSV_FIELDS = {
+    "id": "Id",
+    "birthdate": "BIRTHDATE",
+    "deathdate": "DEATHDATE",
+    "ssn": "SSN",
+    "drivers_license": "DRIVERS",
+    "passport": "PASSPORT",
+    "prefix": "PREFIX",
+    "first": "FIRST",
+    "last": "LAST",
+    "suffix": "SUFFIX",
+    "maiden": "MAIDEN",
+    "marital": "MARITAL",
+    "race": "RACE",
+    "ethnicity": "ETHNICITY",
+    "gender": "GENDER",
+    "birthplace": "BIRTHPLACE",
+    "address": "ADDRESS",
+    "city": "CITY",
+    "state": "STATE",
+    "county": "COUNTY",
+    "zip": "ZIP",
+    "lat": "LAT",
+    "lon": "LON",
+    "healthcare_expenses": "HEALTHCARE_EXPENSES",
+    "healthcare_coverage": "HEALTHCARE_COVERAGE",
+}
+
+_UUID_PATTERN = (
+    r"^[0-9a-fA-F]{8}-?[0-9a-fA-F]{4}-?[0-9a-fA-F]{4}-?[0-9a-fA-F]{4}-?"
+    r"[0-9a-fA-F]{12}$"
+)
+_FLOAT_PATTERN = r"^\s*[-+]?(\d+\.?\d*|\.\d+)([eE][-+]?\d+)?\s*$"
+
+_NULL_STRING = pa.scalar(None, pa.string())
+
+
+def _is_blank(array: pa.Array) -> pa.Array:
+    """Whether each string is empty or only whitespace."""
+
+    return pc.equal(pc.utf8_trim_whitespace(array), "")
+
+
+def _parse_dates(array: pa.Array) -> pa.Array:
+    """Parses YYYY-MM-DD strings into dates, nulls for invalid ones."""
+
+    timestamps = pc.strptime(
+        array, format="%Y-%m-%d", unit="s", error_is_null=True
+    )
+    return pc.cast(timestamps, pa.date32())
+
+
+def _parse_decimals(array: pa.Array, column: sa.Column) -> pa.Array:
+    """
+    Parses numeric strings, rounded to the column's scale.
+
+    Values are parsed as floats and rounded half to even from their exact
+    binary value, just like `round(float(value), scale)` does. Invalid values,
+    and values too large for the column, are parsed as nulls.
+    """
+
+    precision, scale = column.type.precision, column.type.scale
+
+    valid = pc.match_substring_regex(array, _FLOAT_PATTERN)
+    floats = pc.cast(pc.if_else(valid, array, _NULL_STRING), pa.float64())
+    fits = pc.less(pc.abs(floats), 10.0 ** (precision - scale))
+    floats = pc.if_else(fits, floats, pa.scalar(None, pa.float64()))
+
+    exact = pc.cast(floats, pa.decimal128(38, 18), safe=False)
+    rounded = pc.round(exact, ndigits=scale, round_mode="half_to_even")
+    return pc.cast(rounded, pa.decimal128(precision, scale))
+
+
+def _map_enum(
+    array: pa.Array, mapping: dict[str, Enum], default: Enum
+) -> pa.Array:
+    """
+    Maps strings to names of enum members, as stored in the DB.
+
+    Values missing from the mapping are mapped to the default.
+    """
+
+    keys = pa.array(list(mapping.keys()))
+    names = pa.array([member.name for member in mapping.values()])
+    indices = pc.index_in(array, value_set=keys)
+    return pc.fill_null(pc.take(names, indices), default.name)
+
+
+def convert_patients(table: pa.Table) -> pa.RecordBatch:
+    """
+    Converts raw CSV string columns into patient columns.
+
+    Mirrors the conversions done by `parsers.parse_csv_row`: blank optional
+    fields become nulls, enums fall back to defaults, and decimals are rounded
+    to the scale of their columns. Rows with invalid IDs, dates or numbers, or
+    with strings longer than their columns allow, are dropped.
+
+    Args:
+        table: Table with one string column per CSV field
+
+    Returns:
+        A record batch of the valid rows, with the columns of the patients
+        table, in order, except the ones filled by the DB
+    """
+
+    columns: dict[str, pa.Array] = {}
+    valid = pc.match_substring_regex(table["Id"], _UUID_PATTERN)
+
+    for column in _PATIENT_TABLE.columns:
+        if column.server_default is not None:
+            # Filled by the DB, like the version
+            continue
+        raw = table[CSV_FIELDS[column.name]].combine_chunks()
+
+        if column.name == "id":
+            converted = raw
+        elif column.name == "race":
+            converted = _map_enum(
+                pc.utf8_lower(raw), RACE_MAPPING, DEFAULT_RACE
+            )
+        elif column.name == "ethnicity":
+            converted = _map_enum(
+                pc.utf8_lower(raw), ETHNICITY_MAPPING, DEFAULT_ETHNICITY
+            )
+        elif column.name == "gender":
+            converted = _map_enum(raw, GENDER_MAPPING, DEFAULT_GENDER)
+        elif column.name == "marital":
+            converted = pc.if_else(
+                _is_blank(raw),
+                _NULL_STRING,
+                _map_enum(raw, MARITAL_MAPPING, DEFAULT_MARITAL),
+            )
+        elif isinstance(column.type, sa.Date):
+            converted = _parse_dates(raw)
+            if column.nullable:
+                # Blank dates are nulls, but other unparseable ones are errors
+                valid = pc.and_(
+                    valid, pc.or_(_is_blank(raw), converted.is_valid())
+                )
+            else:
+                valid = pc.and_(valid, converted.is_valid())
+        elif isinstance(column.type, sa.Numeric):
+            converted = _parse_decimals(raw, column)
+            valid = pc.and_(valid, converted.is_valid())
+        else:
+            converted = raw
+            if column.nullable:
+                converted = pc.if_else(_is_blank(raw), _NULL_STRING, raw)
+            if column.type.length is not None:
+                fits = pc.less_equal(pc.utf8_length(raw), column.type.length)
+                valid = pc.and_(valid, pc.fill_null(fits, True))
+
+        columns[column.name] = converted
+
+    return pa.RecordBatch.from_pydict(columns).filter(valid)
+
+
+def parse_csv_chunk_arrow(
+    csv_file_path: Path, start: int, end: int, fieldnames: list[str]
+) -> tuple[pa.RecordBatch, int]:
+    """
+    Parse the rows of a CSV file within a byte range, column by column.
+
+    Args:
+        csv_file_path: Path to the CSV file
+        start: Byte offset of the first row of the range
+        end: Byte offset right after the last row of the range
+        fieldnames: Field names, as read from the header of the file
+
+    Returns:
+        A record batch with the valid patients in the range, and the amount of
+        rows in the range
+    """
+
+    with open(csv_file_path, "rb") as csvfile:
+        csvfile.seek(start)
+        data = csvfile.read(end - start)
+
+    table = pa_csv.read_csv(
+        pa.BufferReader(data),
+        read_options=pa_csv.ReadOptions(column_names=fieldnames),
+        convert_options=pa_csv.ConvertOptions(
+            column_types={name: pa.string() for name in fieldnames},
+            strings_can_be_null=False,
+            quoted_strings_can_be_null=False,
+        ),
+    )
+    return convert_patients(table), table.num_rows
@@ -0,0 +1,198 @@
+"""
+Checkpoints of ingestion runs, so that failed runs can be resumed.
+
+While a CSV file is processed, the byte offset up to which every row has been
+loaded into the DB is periodically saved to a JSON file next to it, along with
+the run's statistics. A resumed run starts parsing right at that offset,
+instead of at the beginning of the file.
+"""
+
+import json
+import os
+import time
+
+from pathlib import Path
+from threading import Lock
+from typing import NamedTuple
+
+from logger import log
+
+
+CHECKPOINT_SUFFIX = ".checkpoint.json"
+
+
+class Progress(NamedTuple):
+    """How far into the CSV file a run is."""
+
+    # Byte offset up to which every row of the file has been processed
+    offset: int
+    # Parsing statistics of the rows before the offset
+    parse_stats: dict[str, int]
+
+
+class Checkpoint(NamedTuple):
+    """Progress of a run, and statistics of the patients loaded so far."""
+
+    progress: Progress
+    stats: dict[str, int]
+
+
+def checkpoint_path(csv_file_path: Path) -> Path:
+    """Returns the path of the checkpoint file of a CSV file."""
+
+    return csv_file_path.with_name(csv_file_path.name + CHECKPOINT_SUFFIX)
+
+
+def _file_version(csv_file_path: Path) -> dict[str, int]:
+    """Returns what identifies a version of a CSV file."""
+
+    stat = csv_file_path.stat()
+    return {"file_size": stat.st_size, "file_mtime_ns": stat.st_mtime_ns}
+
+
+def load_checkpoint(csv_file_path: Path) -> Checkpoint | None:
+    """
+    Loads the checkpoint of the last run on a CSV file.
+
+    Returns:
+        The checkpoint, or None if there is none, or if the CSV file changed
+        since it was saved
+    """
+
+    path = checkpoint_path(csv_file_path)
+    if not path.exists():
+        return None
+
+    try:
+        data = json.loads(path.read_text())
+        if data["file"] != _file_version(csv_file_path):
+            log.warning(
+                "CSV file changed since the checkpoint was saved, ignoring it",
+                path=str(path),
+            )
+            return None
+
+        return Checkpoint(
+            progress=Progress(data["offset"], data["parse_stats"]),
+            stats=data["stats"],
+        )
+    except Exception as e:
+        log.error("Failed to load checkpoint", path=str(path), error=str(e))
+        return None
+
+
+class CheckpointTracker:
+    """
+    Tracks the batches loaded by the workers, and saves checkpoints.
+
+    Batches are numbered in file order, and may complete in any order. The
+    checkpoint only moves past a chunk of the file once all of its batches,
+    and every batch before them, are loaded, so it never moves past a failed
+    batch.
+    """
+
+    def __init__(
+        self,
+        csv_file_path: Path,
+        checkpoint: Checkpoint,
+        interval: float,
+    ) -> None:
+        """
+        Args:
+            csv_file_path: Path to the CSV file being processed
+            checkpoint: Where the run starts
+            interval: Minimum amount of seconds between saves
+        """
+
+        self.path = checkpoint_path(csv_file_path)
+        self.interval = interval
+
+        self._file = _file_version(csv_file_path)
+        self._progress = checkpoint.progress
+        self._stats = dict(checkpoint.stats)
+        # Stats of the loaded batches of the chunk after the checkpoint
+        self._chunk_stats = dict.fromkeys(self._stats, 0)
+        # Next batch the checkpoint is waiting for
+        self._next_batch = 0
+        # Batches done after the next one, with their progress and stats.
+        # Failed batches are kept as None
+        self._done: dict[
+            int, tuple[Progress | None, dict[str, int]] | None
+        ] = {}
+        self._saved_at = time.monotonic()
+        self._lock = Lock()
+
+    def batch_done(
+        self,
+        batch_num: int,
+        progress: Progress | None,
+        stats: dict[str, int],
+    ) -> None:
+        """
+        Records a processed batch, and saves a checkpoint if it's time to.
+
+        Args:
+            batch_num: Number of the batch
+            progress: Progress once the batch, and every batch before it, are
+                loaded. None unless the batch is the last of its chunk
+            stats: Statistics of the batch. Batches with errors are failed
+        """
+
+        with self._lock:
+            self._done[batch_num] = (
+                None if stats["errors"] else (progress, stats)
+            )
+            while self._done.get(self._next_batch) is not None:
+                progress, batch_stats = self._done.pop(self._next_batch)
+                self._next_batch += 1
+                for key in self._chunk_stats:
+                    self._chunk_stats[key] += batch_stats[key]
+
+                # Last batch of a chunk
+                if progress is not None:
+                    self._progress = progress
+                    for key in self._stats:
+                        self._stats[key] += self._chunk_stats[key]
+                    self._chunk_stats = dict.fromkeys(self._stats, 0)
+
+            if time.monotonic() - self._saved_at >= self.interval:
+                self._save()
+
+    def close(self, completed: bool, batch_count: int) -> None:
+        """
+        Saves the final checkpoint, or removes it if the run is complete.
+
+        Args:
+            completed: Whether the whole file was parsed
+            batch_count: Number of batches handed to the workers
+        """
+
+        with self._lock:
+            if completed and self._next_batch == batch_count:
+                self.path.unlink(missing_ok=True)
+            else:
+                self._save()
+                log.info(
+                    "Run is incomplete, resume it with --resume",
+                    checkpoint=str(self.path),
+                    offset=self._progress.offset,
+                )
+
+    def _save(self) -> None:
+        """Atomically writes the checkpoint file."""
+
+        data = {
+            "file": self._file,
+            "offset": self._progress.offset,
+            "parse_stats": self._progress.parse_stats,
+            "stats": self._stats,
+        }
+        temp_path = self.path.with_name(self.path.name + ".tmp")
+        try:
+            temp_path.write_text(json.dumps(data))
+            os.replace(temp_path, self.path)
+        except Exception as e:
+            log.error(
+                "Failed to save checkpoint", path=str(self.path), error=str(e)
+            )
+        self._saved_at = time.monotonic()
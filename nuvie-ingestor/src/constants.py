@@ -23,23 +23,30 @@ else:
             "Environment variable WORKERS must be a valid integer"
         )
 
-LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
-
-
-# * ###########################################################################
-# * DB credentials
-# * ###########################################################################
+try:
+    BATCH_SIZE = int(os.environ.get("BATCH_SIZE", 1000))
+except ValueError:
+    raise ValueError("Environment variable BATCH_SIZE must be a valid integer")
+
+try:
+    PARSE_PROCESSES = int(os.environ.get("PARSE_PROCESSES", 1))
+except ValueError:
+    raise ValueError(
+        "Environment variable PARSE_PROCESSES must be a valid integer"
+    )
+
+# Approximate size of each chunk of the CSV file parsed at once by each parse
+# process, in bytes
+PARSE_CHUNK_BYTES = 1024 * 1024
+
+try:
+    CHECKPOINT_INTERVAL = float(os.environ.get("CHECKPOINT_INTERVAL", 5))
+except ValueError:
+    raise ValueError(
+        "Environment variable CHECKPOINT_INTERVAL must be a valid number"
+    )
 
-POSTGRES_SERVER = os.getenv("POSTGRES_SERVER", "postgres")
-POSTGRES_PORT = os.getenv("POSTGRES_PORT", "5432")
-
-POSTGRES_DB = os.getenv("POSTGRES_DB", "nuvie")
-POSTGRES_USER = os.getenv("POSTGRES_USER", "postgres")
-POSTGRES_PASSWORD = os.getenv("POSTGRES_PASSWORD", "")
-
-
-def get_postgres_uri():
-    return f"postgresql+psycopg://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_SERVER}:{POSTGRES_PORT}/{POSTGRES_DB}"
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
 
 
 # * ###########################################################################
@@ -1,12 +1,18 @@
-from sqlmodel import Session, create_engine
+from sqlmodel import Session
 
 from logger import log
 import constants as c
 
-from nuvie_sdk.models import *
+import nuvie_sdk.constants as sdk_c
+from nuvie_sdk.db import create_db_engine
 
+# Registering every model. Star-importing them would also shadow `c`
+import nuvie_sdk.models  # noqa: F401
 
-engine = create_engine(str(c.get_postgres_uri()))
+
+# Each worker thread holds a connection while loading a batch, so the pool
+# keeps at least one per worker. Otherwise they'd wait for each other
+engine = create_db_engine(pool_size=max(c.WORKERS, sdk_c.DB_POOL_SIZE))
 
 
 # make sure all SQLModel models are imported (nuvie_sdk.models) before
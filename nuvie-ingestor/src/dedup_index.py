@@ -0,0 +1,270 @@
+"""
+In-memory index of patients already in the DB, or already seen during a run.
+
+Loaded once at the start of an ingestion run with a single scan of the
+patients table, it lets the ingestor drop patients that would be skipped
+anyway, without a query per patient. Patients repeated within the ingested
+file are caught too.
+
+Keys are lossless 128-bit integers, so that a new patient is never mistaken
+for an existing one: the UUIDs of patients, and their SSNs packed along with
+their length. They are kept in sorted arrays, which takes about 32 bytes per
+patient. SSNs too long to be packed, which real ones never are, are kept as
+they are instead.
+"""
+
+from array import array
+from bisect import bisect_left, bisect_right
+from collections.abc import Iterable, Iterator
+from uuid import UUID
+
+import pyarrow as pa
+import pyarrow.compute as pc
+from sqlalchemy import Engine
+from sqlmodel import select
+
+from logger import log
+from nuvie_sdk.models.patient import Patient, PatientCreate
+
+
+# Rows fetched at once when loading the index from the DB
+LOAD_BATCH_SIZE = 50_000
+
+# Keys added during the run are merged into the sorted array once there are
+# this many of them, so that memory doesn't grow with a set of Python ints
+PENDING_MERGE_SIZE = 500_000
+
+
+# Bytes of an SSN packed into a key, after a byte with its length
+SSN_KEY_SIZE = 15
+
+_LOW_MASK = (1 << 64) - 1
+
+
+def key_of_ssn(ssn: str) -> int | None:
+    """
+    Returns the key of an SSN, or None if it's longer than `SSN_KEY_SIZE`
+    bytes.
+    """
+
+    data = ssn.encode("utf-8")
+    if len(data) > SSN_KEY_SIZE:
+        return None
+    return int.from_bytes(
+        bytes([len(data)]) + data.ljust(SSN_KEY_SIZE, b"\0"), "big"
+    )
+
+
+def key_of_id(patient_id: UUID | str) -> int:
+    """Returns the key of a patient ID, given as a UUID or a string."""
+
+    if not isinstance(patient_id, UUID):
+        patient_id = UUID(patient_id)
+    return patient_id.int
+
+
+def _sorted_keys(high: array, low: array) -> tuple[array, array]:
+    """
+    Sorts the halves of 128-bit keys by key, without boxing each half.
+    """
+
+    halves = pa.record_batch(
+        [
+            pa.Array.from_buffers(
+                pa.uint64(), len(half), [None, pa.py_buffer(half)]
+            )
+            for half in (high, low)
+        ],
+        names=["high", "low"],
+    )
+    indices = pc.sort_indices(
+        halves, sort_keys=[("high", "ascending"), ("low", "ascending")]
+    )
+    sorted_halves = halves.take(indices)
+
+    result = []
+    for column in sorted_halves.columns:
+        half = array("Q")
+        half.frombytes(column.buffers()[1].to_pybytes())
+        result.append(half)
+    return result[0], result[1]
+
+
+class KeySet:
+    """
+    Compact set of 128-bit keys.
+
+    Holds the high and low 64 bits of keys in two arrays, sorted by key and
+    searched with bisection, plus a regular set of recently added keys,
+    which is merged into the arrays once it grows.
+    """
+
+    def __init__(self, keys: Iterable[int] = ()) -> None:
+        keys = list(keys)
+        self._high, self._low = _sorted_keys(
+            array("Q", (key >> 64 for key in keys)),
+            array("Q", (key & _LOW_MASK for key in keys)),
+        )
+        self._pending: set[int] = set()
+
+    @classmethod
+    def from_halves(cls, high: array, low: array) -> "KeySet":
+        """
+        Creates a set from the high and low 64 bits of its keys, in two
+        arrays of the same length, in any order.
+        """
+
+        key_set = cls()
+        key_set._high, key_set._low = _sorted_keys(high, low)
+        return key_set
+
+    def __len__(self) -> int:
+        return len(self._high) + len(self._pending)
+
+    def __contains__(self, key: int) -> bool:
+        if key in self._pending:
+            return True
+        high, low = key >> 64, key & _LOW_MASK
+        # Keys with the same high bits are next to each other, sorted by
+        # their low bits
+        start = bisect_left(self._high, high)
+        end = bisect_right(self._high, high, start)
+        i = bisect_left(self._low, low, start, end)
+        return i < end and self._low[i] == low
+
+    def add(self, key: int) -> None:
+        """Adds a key to the set."""
+
+        self._pending.add(key)
+        if len(self._pending) >= PENDING_MERGE_SIZE:
+            high = array("Q", self._high)
+            low = array("Q", self._low)
+            for pending_key in self._pending:
+                high.append(pending_key >> 64)
+                low.append(pending_key & _LOW_MASK)
+            self._high, self._low = _sorted_keys(high, low)
+            self._pending.clear()
+
+
+class DedupIndex:
+    """Index of the SSNs and IDs of patients known to exist."""
+
+    def __init__(
+        self, ssns: KeySet, ids: KeySet, long_ssns: set[str] | None = None
+    ) -> None:
+        self.ssns = ssns
+        self.ids = ids
+        # SSNs without a key
+        self.long_ssns = long_ssns if long_ssns is not None else set()
+
+    @classmethod
+    def load(cls, engine: Engine) -> "DedupIndex":
+        """
+        Loads the index with the patients in the DB, in a single scan.
+
+        Rows are streamed with a server-side cursor, so that they are never
+        all in memory at once.
+        """
+
+        log.info("Loading dedup index from the DB...")
+
+        ssn_high, ssn_low = array("Q"), array("Q")
+        id_high, id_low = array("Q"), array("Q")
+        long_ssns: set[str] = set()
+        statement = select(Patient.ssn, Patient.id)
+        with engine.connect() as connection:
+            result = connection.execution_options(
+                yield_per=LOAD_BATCH_SIZE
+            ).execute(statement)
+            for rows in result.partitions():
+                for ssn, patient_id in rows:
+                    key = key_of_ssn(ssn)
+                    if key is None:
+                        long_ssns.add(ssn)
+                    else:
+                        ssn_high.append(key >> 64)
+                        ssn_low.append(key & _LOW_MASK)
+                    key = key_of_id(patient_id)
+                    id_high.append(key >> 64)
+                    id_low.append(key & _LOW_MASK)
+
+        index = cls(
+            KeySet.from_halves(ssn_high, ssn_low),
+            KeySet.from_halves(id_high, id_low),
+            long_ssns,
+        )
+        log.info("Dedup index loaded", patients=len(id_high))
+        return index
+
+    def check_and_add(self, ssn: str, patient_id: UUID | str | None) -> bool:
+        """
+        Checks whether a patient is new, and records it if so.
+
+        Returns:
+            False if a patient with the same SSN or ID was already in the DB
+            or already checked, True otherwise
+        """
+
+        ssn_key = key_of_ssn(ssn)
+        if ssn_key is None:
+            if ssn in self.long_ssns:
+                return False
+        elif ssn_key in self.ssns:
+            return False
+        id_key = key_of_id(patient_id) if patient_id is not None else None
+        if id_key is not None and id_key in self.ids:
+            return False
+
+        if ssn_key is None:
+            self.long_ssns.add(ssn)
+        else:
+            self.ssns.add(ssn_key)
+        if id_key is not None:
+            self.ids.add(id_key)
+        return True
+
+    def filter_patients(
+        self, patients: Iterable[PatientCreate], stats: dict[str, int]
+    ) -> Iterator[PatientCreate]:
+        """
+        Lazily drops the patients that aren't new.
+
+        Args:
+            patients: Patients to filter
+            stats: Dictionary whose "duplicates" entry is incremented for
+                each dropped patient
+
+        Yields:
+            The new patients
+        """
+
+        for patient in patients:
+            if self.check_and_add(patient.ssn, patient.id):
+                yield patient
+            else:
+                stats["duplicates"] += 1
+
+    def filter_record_batch(
+        self, patients: pa.RecordBatch, stats: dict[str, int]
+    ) -> pa.RecordBatch:
+        """
+        Drops the patients that aren't new from a record batch.
+
+        Args:
+            patients: Record batch with "ssn" and "id" columns
+            stats: Dictionary whose "duplicates" entry is incremented for
+                each dropped patient
+
+        Returns:
+            A record batch of the new patients
+        """
+
+        is_new = [
+            self.check_and_add(ssn, patient_id)
+            for ssn, patient_id in zip(
+                patients.column("ssn").to_pylist(),
+                patients.column("id").to_pylist(),
+            )
+        ]
+        stats["duplicates"] += is_new.count(False)
+        return patients.filter(pa.array(is_new, pa.bool_()))
@@ -1,25 +1,37 @@
 import argparse
-import csv
 import sys
 
-from datetime import datetime
-from decimal import Decimal, InvalidOperation
+from collections.abc import Iterable, Iterator
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from multiprocessing import get_context
 from pathlib import Path
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from uuid import UUID
+from queue import Queue
+from threading import Lock, Thread
 
 import zipfile
 import httpx
+import pyarrow as pa
 from sqlmodel import Session
 
+from arrow_parser import parse_csv_chunk_arrow
+from checkpoint import (
+    Checkpoint,
+    CheckpointTracker,
+    Progress,
+    load_checkpoint,
+)
+from copy_loader import copy_patient_batch, copy_record_batch
 from db import engine
+from dedup_index import DedupIndex
 from logger import log
-from nuvie_sdk.models.patient import (
-    PatientCreate,
-    Race,
-    Ethnicity,
-    Gender,
-    MaritalStatus,
+from nuvie_sdk.db import get_pool_stats
+from nuvie_sdk.models.patient import PatientCreate
+from parsers import (
+    ChunkResult,
+    parse_csv_chunk,
+    read_csv_header,
+    split_csv_file,
 )
 from nuvie_sdk.use_cases import patient_use_case
 
@@ -83,237 +95,305 @@ def download_dataset(url: str, download_dir: Path, zip_filename: str) -> bool:
         return False
 
 
-def parse_csv_row(row: dict[str, str]) -> PatientCreate | None:
+def process_patient_batch(
+    patients_batch: list[PatientCreate],
+) -> dict[str, int]:
     """
-    Parse a CSV row into a PatientCreate object.
+    Process a batch of patients and insert them into the database.
+
+    Patients whose SSN or ID already exist are skipped. The whole batch is
+    inserted in a single transaction.
 
     Args:
-        row: Dictionary representing a CSV row
+        patients_batch: List of PatientCreate objects
 
     Returns:
-        PatientCreate object or None if parsing fails
+        Dictionary with statistics about the processing
     """
 
-    try:
-        # Parse UUID
-        patient_id = UUID(row["Id"])
-
-        # Parse dates
-        birthdate = datetime.strptime(row["BIRTHDATE"], "%Y-%m-%d").date()
-        deathdate = None
-        if row["DEATHDATE"].strip():
-            deathdate = datetime.strptime(row["DEATHDATE"], "%Y-%m-%d").date()
-
-        # Parse enums with fallback handling
-        race_mapping = {
-            "white": Race.WHITE,
-            "black": Race.BLACK,
-            "asian": Race.ASIAN,
-        }
-        race = race_mapping.get(row["RACE"].lower(), Race.WHITE)
+    with Session(engine) as session:
+        try:
+            result = patient_use_case.bulk_create_patients(
+                session=session, patients=patients_batch
+            )
+        except Exception as e:
+            log.error(
+                "Failed to create patients batch",
+                batch_size=len(patients_batch),
+                error=str(e),
+            )
+            return {"created": 0, "skipped": 0, "errors": len(patients_batch)}
+
+    return {
+        "created": result.created,
+        "skipped": result.skipped + result.conflicts,
+        "errors": 0,
+    }
 
-        ethnicity_mapping = {
-            "hispanic": Ethnicity.HISPANIC,
-            "nonhispanic": Ethnicity.NONHISPANIC,
-        }
-        ethnicity = ethnicity_mapping.get(
-            row["ETHNICITY"].lower(), Ethnicity.NONHISPANIC
-        )
 
-        gender_mapping = {
-            "M": Gender.MALE,
-            "F": Gender.FEMALE,
-            "male": Gender.MALE,
-            "female": Gender.FEMALE,
-        }
-        gender = gender_mapping.get(row["GENDER"], Gender.OTHER)
-
-        # Parse marital status
-        marital = None
-        if row["MARITAL"].strip():
-            marital_mapping = {
-                "M": MaritalStatus.MARRIED,
-                "S": MaritalStatus.SINGLE,
-                "married": MaritalStatus.MARRIED,
-                "single": MaritalStatus.SINGLE,
-            }
-            marital = marital_mapping.get(row["MARITAL"], MaritalStatus.NONE)
-
-        # Parse decimal fields with proper rounding for model constraints
-        lat = Decimal(str(round(float(row["LAT"]), 4)))
-        lon = Decimal(str(round(float(row["LON"]), 4)))
-        healthcare_expenses = Decimal(
-            str(round(float(row["HEALTHCARE_EXPENSES"]), 2))
-        )
-        healthcare_coverage = Decimal(
-            str(round(float(row["HEALTHCARE_COVERAGE"]), 2))
-        )
+# Functions used to load each batch of patients into the DB, by loader name
+LOADERS = {
+    "orm": process_patient_batch,
+    "copy": copy_patient_batch,
+}
 
-        patient = PatientCreate(
-            id=patient_id,
-            birthdate=birthdate,
-            deathdate=deathdate,
-            ssn=row["SSN"],
-            drivers_license=row["DRIVERS"] if row["DRIVERS"].strip() else None,
-            passport=row["PASSPORT"] if row["PASSPORT"].strip() else None,
-            prefix=row["PREFIX"] if row["PREFIX"].strip() else None,
-            first=row["FIRST"],
-            last=row["LAST"],
-            suffix=row["SUFFIX"] if row["SUFFIX"].strip() else None,
-            maiden=row["MAIDEN"] if row["MAIDEN"].strip() else None,
-            marital=marital,
-            race=race,
-            ethnicity=ethnicity,
-            gender=gender,
-            birthplace=row["BIRTHPLACE"],
-            address=row["ADDRESS"],
-            city=row["CITY"],
-            state=row["STATE"],
-            county=row["COUNTY"],
-            zip=row["ZIP"] if row["ZIP"].strip() else None,
-            lat=lat,
-            lon=lon,
-            healthcare_expenses=healthcare_expenses,
-            healthcare_coverage=healthcare_coverage,
-        )
 
-        return patient
+def read_patient_chunks(
+    csv_file_path: Path,
+    start: int | None = None,
+    chunk_bytes: int = c.PARSE_CHUNK_BYTES,
+) -> Iterator[ChunkResult]:
+    """
+    Lazily read and parse the patients CSV file, one chunk at a time.
 
-    except (ValueError, KeyError, InvalidOperation) as e:
-        log.warning(
-            "Failed to parse CSV row",
-            error=str(e),
-            row_id=row.get("Id", "unknown"),
+    Args:
+        csv_file_path: Path to the patients CSV file
+        start: Byte offset of the first row to read. Defaults to the first
+            row after the header
+        chunk_bytes: Approximate size of each chunk, in bytes
+
+    Yields:
+        The parsed chunks of the file, in order
+    """
+
+    fieldnames, header_end = read_csv_header(csv_file_path)
+    for chunk_start, chunk_end in split_csv_file(
+        csv_file_path, chunk_bytes, start=start or header_end
+    ):
+        yield parse_csv_chunk(
+            csv_file_path, chunk_start, chunk_end, fieldnames
         )
-        return None
 
 
-def process_patient_batch(
-    patients_batch: list[PatientCreate],
-) -> dict[str, int]:
+def read_patient_chunks_parallel(
+    csv_file_path: Path,
+    processes: int,
+    start: int | None = None,
+    chunk_bytes: int = c.PARSE_CHUNK_BYTES,
+) -> Iterator[ChunkResult]:
     """
-    Process a batch of patients and insert them into the database.
+    Read and parse the patients CSV file with a pool of worker processes.
+
+    The file is split into byte ranges aligned to line boundaries, which are
+    parsed in parallel. Only a couple of ranges per process are in flight at
+    any time, and chunks are yielded in the same order as in the file.
 
     Args:
-        patients_batch: List of PatientCreate objects
+        csv_file_path: Path to the patients CSV file
+        processes: Number of worker processes to parse the file with
+        start: Byte offset of the first row to read. Defaults to the first
+            row after the header
+        chunk_bytes: Approximate size of each range parsed at once, in bytes
 
-    Returns:
-        Dictionary with statistics about the processing
+    Yields:
+        The parsed chunks of the file, in order
     """
 
-    stats = {"created": 0, "skipped": 0, "errors": 0}
+    fieldnames, header_end = read_csv_header(csv_file_path)
+    chunks = split_csv_file(
+        csv_file_path, chunk_bytes, start=start or header_end
+    )
 
-    with Session(engine) as session:
-        for patient in patients_batch:
-            try:
-                # Check if patient already exists by SSN
-                existing_patient = patient_use_case.get_patient_by_ssn(
-                    session=session, ssn=patient.ssn
-                )
-                if existing_patient:
-                    log.debug(
-                        "Patient already exists, skipping", ssn=patient.ssn
-                    )
-                    stats["skipped"] += 1
-                    continue
-
-                # Create new patient
-                patient_use_case.create_patient(
-                    session=session, patient_create=patient
-                )
-                stats["created"] += 1
-                log.debug(
-                    "Patient created successfully", patient_id=str(patient.id)
+    # Spawning instead of forking, as the DB worker threads are already
+    # running by the time the pool starts
+    with ProcessPoolExecutor(
+        max_workers=processes, mp_context=get_context("spawn")
+    ) as executor:
+        pending: deque[Future[ChunkResult]] = deque()
+        for chunk_start, chunk_end in chunks:
+            pending.append(
+                executor.submit(
+                    parse_csv_chunk,
+                    csv_file_path,
+                    chunk_start,
+                    chunk_end,
+                    fieldnames,
                 )
+            )
+            if len(pending) >= processes * 2:
+                yield pending.popleft().result()
 
-            except Exception as e:
-                log.error(
-                    "Failed to create patient",
-                    patient_id=str(patient.id),
-                    ssn=patient.ssn,
-                    error=str(e),
-                )
-                stats["errors"] += 1
+        while pending:
+            yield pending.popleft().result()
 
-    return stats
 
+def read_patient_chunks_arrow(
+    csv_file_path: Path,
+    start: int | None = None,
+    chunk_bytes: int = c.PARSE_CHUNK_BYTES,
+) -> Iterator[ChunkResult]:
+    """
+    Read and parse the patients CSV file column by column, with Arrow.
+
+    Args:
+        csv_file_path: Path to the patients CSV file
+        start: Byte offset of the first row to read. Defaults to the first
+            row after the header
+        chunk_bytes: Approximate size of each range parsed at once, in bytes
+
+    Yields:
+        The parsed chunks of the file, in order, with record batches of valid
+        patients ready for `copy_record_batch`
+    """
+
+    fieldnames, header_end = read_csv_header(csv_file_path)
+    for chunk_start, chunk_end in split_csv_file(
+        csv_file_path, chunk_bytes, start=start or header_end
+    ):
+        patients, total_rows = parse_csv_chunk_arrow(
+            csv_file_path, chunk_start, chunk_end, fieldnames
+        )
+        yield ChunkResult(
+            patients, total_rows, total_rows - patients.num_rows, chunk_end
+        )
+
+
+def iter_batches(
+    chunks: Iterable[ChunkResult],
+    batch_size: int,
+    parse_stats: dict[str, int],
+    dedup_index: DedupIndex | None = None,
+) -> Iterator[tuple[list[PatientCreate] | pa.RecordBatch, Progress | None]]:
+    """
+    Split the patients of parsed chunks into batches of `batch_size`.
+
+    Batches don't span chunks, so that the last batch of each chunk comes
+    with the progress made once it, and every batch before it, are loaded.
+    Chunks left without patients, once parse errors and duplicates are
+    dropped, yield a single empty batch, so that their progress is made too.
+
+    Args:
+        chunks: Parsed chunks of the file, in order
+        batch_size: Maximum number of patients per batch
+        parse_stats: Dictionary updated with the amount of rows read and of
+            rows that failed to parse
+        dedup_index: If given, patients that aren't new are dropped, and
+            counted in the "duplicates" entry of `parse_stats`
+
+    Yields:
+        Batches of patients, with the progress made once they are loaded, or
+        None if they aren't the last batch of their chunk
+    """
 
-def process_patients_file(csv_file_path: Path, workers: int = 4) -> None:
+    for chunk in chunks:
+        parse_stats["total_rows"] += chunk.total_rows
+        parse_stats["parse_errors"] += chunk.parse_errors
+
+        patients = chunk.patients
+        if dedup_index is None:
+            pass
+        elif isinstance(patients, pa.RecordBatch):
+            patients = dedup_index.filter_record_batch(patients, parse_stats)
+        else:
+            patients = list(dedup_index.filter_patients(patients, parse_stats))
+
+        # At least one batch per chunk, even if it's empty
+        for offset in range(0, max(len(patients), 1), batch_size):
+            last = offset + batch_size >= len(patients)
+            yield (
+                patients[offset : offset + batch_size],
+                Progress(chunk.end, dict(parse_stats)) if last else None,
+            )
+
+
+def process_patients_file(
+    csv_file_path: Path,
+    workers: int = 4,
+    loader: str = "orm",
+    batch_size: int = c.BATCH_SIZE,
+    parse_processes: int = c.PARSE_PROCESSES,
+    parse_engine: str = "rows",
+    dedup: bool = True,
+    resume: bool = False,
+) -> None:
     """
     Process the patients CSV file with multiple workers.
 
+    The file is parsed lazily, and batches of patients are handed to the
+    workers through a bounded queue. Parsing blocks whenever the workers fall
+    behind, so at most a few batches per worker are held in memory at any
+    time, regardless of the size of the file.
+
+    Progress is saved to a checkpoint file as batches are loaded, which is
+    removed once the whole file is.
+
     Args:
         csv_file_path: Path to the patients CSV file
         workers: Number of worker threads to use
+        loader: Name of the loader used for each batch (see `LOADERS`)
+        batch_size: Number of patients loaded into the DB at once
+        parse_processes: Number of processes parsing the file. When 1, the
+            file is parsed in the main thread instead
+        parse_engine: Either "rows", parsing each row into a PatientCreate,
+            or "arrow", parsing the file column by column into record batches.
+            "arrow" requires the "copy" loader, and ignores `parse_processes`
+        dedup: Whether to load the SSNs and IDs of existing patients first,
+            so that patients already in the DB, or repeated in the file, are
+            skipped without reaching the DB
+        resume: Whether to resume from the checkpoint of a previous run on
+            the same file, if there is one
     """
 
+    if parse_engine == "arrow" and loader != "copy":
+        raise ValueError('The "arrow" parse engine requires the "copy" loader')
+
     if not csv_file_path.exists():
         log.error("Patients CSV file not found", path=str(csv_file_path))
         return
 
     log.info(
-        "Starting patient processing", file=str(csv_file_path), workers=workers
+        "Starting patient processing",
+        file=str(csv_file_path),
+        workers=workers,
+        loader=loader,
+        batch_size=batch_size,
+        parse_processes=parse_processes,
+        parse_engine=parse_engine,
+        dedup=dedup,
+        resume=resume,
     )
 
-    # Read and parse CSV file
-    patients_data = []
-    total_rows = 0
-    parse_errors = 0
-
-    with open(csv_file_path, encoding="utf-8") as csvfile:
-        reader = csv.DictReader(csvfile)
-        for row in reader:
-            total_rows += 1
-            patient = parse_csv_row(row)
-            if patient:
-                patients_data.append(patient)
-            else:
-                parse_errors += 1
-
-    log.info(
-        "CSV parsing completed",
-        total_rows=total_rows,
-        valid_patients=len(patients_data),
-        parse_errors=parse_errors,
+    checkpoint = load_checkpoint(csv_file_path) if resume else None
+    if checkpoint is not None:
+        log.info(
+            "Resuming from checkpoint",
+            offset=checkpoint.progress.offset,
+            **checkpoint.stats,
+        )
+    else:
+        if resume:
+            log.info("No checkpoint found, starting from the beginning")
+        checkpoint = Checkpoint(
+            progress=Progress(
+                0, {"total_rows": 0, "parse_errors": 0, "duplicates": 0}
+            ),
+            stats={"created": 0, "skipped": 0, "errors": 0},
+        )
+    tracker = CheckpointTracker(
+        csv_file_path, checkpoint, c.CHECKPOINT_INTERVAL
     )
 
-    if not patients_data:
-        log.error("No valid patients found in CSV file")
-        return
-
-    # Split patients into batches for processing
-    # 4 batches per worker
-    batch_size = max(1, len(patients_data) // (workers * 4))
-    batches = [
-        patients_data[i : i + batch_size]
-        for i in range(0, len(patients_data), batch_size)
-    ]
+    dedup_index = DedupIndex.load(engine) if dedup else None
 
-    log.info(
-        "Processing patients in batches",
-        total_patients=len(patients_data),
-        batch_count=len(batches),
-        batch_size=batch_size,
-    )
+    if parse_engine == "arrow":
+        process_batch = copy_record_batch
+    else:
+        process_batch = LOADERS[loader]
 
-    # Process batches with ThreadPoolExecutor
-    total_stats = {"created": 0, "skipped": 0, "errors": 0}
+    total_stats = dict(checkpoint.stats)
+    stats_lock = Lock()
 
-    with ThreadPoolExecutor(max_workers=workers) as executor:
-        # Submit all batches
-        future_to_batch = {
-            executor.submit(process_patient_batch, batch): i
-            for i, batch in enumerate(batches)
-        }
+    # Batches waiting for a worker. None signals workers to stop
+    batches: Queue[
+        tuple[int, list[PatientCreate] | pa.RecordBatch, Progress | None]
+        | None
+    ] = Queue(maxsize=workers * 2)
 
-        # Process completed batches
-        for future in as_completed(future_to_batch):
-            batch_num = future_to_batch[future]
+    def worker() -> None:
+        while (item := batches.get()) is not None:
+            batch_num, batch, progress = item
             try:
-                batch_stats = future.result()
-                for key in total_stats.keys():
-                    total_stats[key] += batch_stats[key]
-
+                batch_stats = process_batch(batch)
                 log.info(
                     "Batch completed",
                     batch=batch_num,
@@ -321,15 +401,89 @@ def process_patients_file(csv_file_path: Path, workers: int = 4) -> None:
                     skipped=batch_stats["skipped"],
                     errors=batch_stats["errors"],
                 )
-
             except Exception as e:
                 log.error(
                     "Batch processing failed", batch=batch_num, error=str(e)
                 )
-                total_stats["errors"] += len(batches[batch_num])
+                batch_stats = {
+                    "created": 0,
+                    "skipped": 0,
+                    "errors": len(batch),
+                }
+
+            with stats_lock:
+                for key in total_stats:
+                    total_stats[key] += batch_stats[key]
+            tracker.batch_done(batch_num, progress, batch_stats)
+
+    pool_size = get_pool_stats(engine)["size"]
+    if workers > pool_size:
+        log.warning(
+            "More workers than pooled DB connections, raise DB_POOL_SIZE to "
+            "keep them from waiting for each other",
+            workers=workers,
+            pool_size=pool_size,
+        )
+
+    threads = [
+        Thread(target=worker, name=f"ingestor-worker-{i}")
+        for i in range(workers)
+    ]
+    for thread in threads:
+        thread.start()
+
+    start = checkpoint.progress.offset
+    parse_stats = dict(checkpoint.progress.parse_stats)
+    batch_count = 0
+    completed = False
+    try:
+        if parse_engine == "arrow":
+            chunks = read_patient_chunks_arrow(csv_file_path, start=start)
+        elif parse_processes > 1:
+            chunks = read_patient_chunks_parallel(
+                csv_file_path, parse_processes, start=start
+            )
+        else:
+            chunks = read_patient_chunks(csv_file_path, start=start)
+
+        for batch, batch_progress in iter_batches(
+            chunks, batch_size, parse_stats, dedup_index=dedup_index
+        ):
+            if len(batch) == 0:
+                # Nothing to load, only progress to make
+                tracker.batch_done(
+                    batch_count, batch_progress, dict.fromkeys(total_stats, 0)
+                )
+            else:
+                # Blocks while the queue is full
+                batches.put((batch_count, batch, batch_progress))
+            batch_count += 1
+        completed = True
+    finally:
+        for _ in threads:
+            batches.put(None)
+        for thread in threads:
+            thread.join()
+        tracker.close(completed, batch_count)
+    log.info("DB connection pool statistics", **get_pool_stats(engine))
+
+    valid_patients = parse_stats["total_rows"] - parse_stats["parse_errors"]
+    log.info(
+        "CSV parsing completed",
+        total_rows=parse_stats["total_rows"],
+        valid_patients=valid_patients,
+        parse_errors=parse_stats["parse_errors"],
+        duplicates=parse_stats["duplicates"],
+    )
+    # Duplicates dropped before reaching the DB were skipped all the same
+    total_stats["skipped"] += parse_stats["duplicates"]
+
+    if not valid_patients:
+        log.error("No valid patients found in CSV file")
+        return
 
     # Final statistics
-    success_rate = total_stats["created"] / len(patients_data) * 100
+    success_rate = total_stats["created"] / valid_patients * 100
     log.info(
         "Patient processing completed",
         total_processed=sum(total_stats.values()),
@@ -359,19 +513,82 @@ def main():
         default=c.WORKERS,
         help=f"Number of worker threads (default: {c.WORKERS})",
     )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=c.BATCH_SIZE,
+        help=(
+            "Number of patients loaded into the DB at once "
+            f"(default: {c.BATCH_SIZE})"
+        ),
+    )
+    parser.add_argument(
+        "--parse-processes",
+        type=int,
+        default=c.PARSE_PROCESSES,
+        help=(
+            "Number of processes parsing the CSV file. When 1, the file is "
+            f"parsed in the main thread (default: {c.PARSE_PROCESSES})"
+        ),
+    )
+    parser.add_argument(
+        "--parse-engine",
+        choices=["rows", "arrow"],
+        default="rows",
+        help=(
+            "How the CSV file is parsed: row by row into pydantic models "
+            "(rows), or column by column with Apache Arrow (arrow). arrow "
+            "requires --loader copy, and ignores --parse-processes "
+            "(default: rows)"
+        ),
+    )
     parser.add_argument(
         "--skip-download",
         action="store_true",
         help="Skip download step and process existing CSV file",
     )
+    parser.add_argument(
+        "--loader",
+        choices=list(LOADERS.keys()),
+        default="orm",
+        help=(
+            "How patients are loaded into the DB: multi-row ORM inserts "
+            "(orm), or bulk loading with Postgres' COPY (copy) "
+            "(default: orm)"
+        ),
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help=(
+            "Resume the last run on the CSV file from its checkpoint, instead "
+            "of processing the whole file again"
+        ),
+    )
+    parser.add_argument(
+        "--no-dedup-index",
+        action="store_true",
+        help=(
+            "Don't load existing SSNs and IDs before processing, leaving "
+            "duplicate detection to the DB"
+        ),
+    )
 
     args = parser.parse_args()
+    if args.parse_engine == "arrow" and args.loader != "copy":
+        parser.error("--parse-engine arrow requires --loader copy")
 
     log.info(
         "Starting Nuvie Data Ingestor",
         dataset=args.dataset,
         workers=args.workers,
+        batch_size=args.batch_size,
+        parse_processes=args.parse_processes,
+        parse_engine=args.parse_engine,
         skip_download=args.skip_download,
+        loader=args.loader,
+        dedup_index=not args.no_dedup_index,
+        resume=args.resume,
     )
 
     # Setup paths
@@ -406,7 +623,16 @@ def main():
 
     # Process patients
     csv_file_path = download_dir / dataset_config["csv_filename"]
-    process_patients_file(csv_file_path, workers=args.workers)
+    process_patients_file(
+        csv_file_path,
+        workers=args.workers,
+        loader=args.loader,
+        batch_size=args.batch_size,
+        parse_processes=args.parse_processes,
+        parse_engine=args.parse_engine,
+        dedup=not args.no_dedup_index,
+        resume=args.resume,
+    )
 
     log.info("Ingestor completed successfully")
 
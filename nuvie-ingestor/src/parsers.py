@@ -0,0 +1,236 @@
+"""
+Parsing of patients CSV files.
+
+Kept apart from the rest of the ingestor, as chunks of the CSV file can be
+parsed in worker processes, which import this module.
+"""
+
+import csv
+import io
+
+from collections.abc import Iterator
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from pathlib import Path
+from typing import TYPE_CHECKING, NamedTuple
+from uuid import UUID
+
+from logger import log
+from nuvie_sdk.models.patient import (
+    PatientCreate,
+    Race,
+    Ethnicity,
+    Gender,
+    MaritalStatus,
+)
+
+if TYPE_CHECKING:
+    import pyarrow as pa
+
+
+# Mappings of CSV values to enums. Race and ethnicity are matched in lower
+# case, gender and marital status as-is. Unknown values fall back to defaults
+RACE_MAPPING = {
+    "white": Race.WHITE,
+    "black": Race.BLACK,
+    "asian": Race.ASIAN,
+}
+DEFAULT_RACE = Race.WHITE
+
+ETHNICITY_MAPPING = {
+    "hispanic": Ethnicity.HISPANIC,
+    "nonhispanic": Ethnicity.NONHISPANIC,
+}
+DEFAULT_ETHNICITY = Ethnicity.NONHISPANIC
+
+GENDER_MAPPING = {
+    "M": Gender.MALE,
+    "F": Gender.FEMALE,
+    "male": Gender.MALE,
+    "female": Gender.FEMALE,
+}
+DEFAULT_GENDER = Gender.OTHER
+
+MARITAL_MAPPING = {
+    "M": MaritalStatus.MARRIED,
+    "S": MaritalStatus.SINGLE,
+    "married": MaritalStatus.MARRIED,
+    "single": MaritalStatus.SINGLE,
+}
+DEFAULT_MARITAL = MaritalStatus.NONE
+
+
+def parse_csv_row(row: dict[str, str]) -> PatientCreate | None:
+    """
+    Parse a CSV row into a PatientCreate object.
+
+    Args:
+        row: Dictionary representing a CSV row
+
+    Returns:
+        PatientCreate object or None if parsing fails
+    """
+
+    try:
+        # Parse UUID
+        patient_id = UUID(row["Id"])
+
+        # Parse dates
+        birthdate = datetime.strptime(row["BIRTHDATE"], "%Y-%m-%d").date()
+        deathdate = None
+        if row["DEATHDATE"].strip():
+            deathdate = datetime.strptime(row["DEATHDATE"], "%Y-%m-%d").date()
+
+        # Parse enums with fallback handling
+        race = RACE_MAPPING.get(row["RACE"].lower(), DEFAULT_RACE)
+        ethnicity = ETHNICITY_MAPPING.get(
+            row["ETHNICITY"].lower(), DEFAULT_ETHNICITY
+        )
+        gender = GENDER_MAPPING.get(row["GENDER"], DEFAULT_GENDER)
+
+        # Parse marital status
+        marital = None
+        if row["MARITAL"].strip():
+            marital = MARITAL_MAPPING.get(row["MARITAL"], DEFAULT_MARITAL)
+
+        # Parse decimal fields with proper rounding for model constraints
+        lat = Decimal(str(round(float(row["LAT"]), 4)))
+        lon = Decimal(str(round(float(row["LON"]), 4)))
+        healthcare_expenses = Decimal(
+            str(round(float(row["HEALTHCARE_EXPENSES"]), 2))
+        )
+        healthcare_coverage = Decimal(
+            str(round(float(row["HEALTHCARE_COVERAGE"]), 2))
+        )
+
+        patient = PatientCreate(
+            id=patient_id,
+            birthdate=birthdate,
+            deathdate=deathdate,
+            ssn=row["SSN"],
+            drivers_license=row["DRIVERS"] if row["DRIVERS"].strip() else None,
+            passport=row["PASSPORT"] if row["PASSPORT"].strip() else None,
+            prefix=row["PREFIX"] if row["PREFIX"].strip() else None,
+            first=row["FIRST"],
+            last=row["LAST"],
+            suffix=row["SUFFIX"] if row["SUFFIX"].strip() else None,
+            maiden=row["MAIDEN"] if row["MAIDEN"].strip() else None,
+            marital=marital,
+            race=race,
+            ethnicity=ethnicity,
+            gender=gender,
+            birthplace=row["BIRTHPLACE"],
+            address=row["ADDRESS"],
+            city=row["CITY"],
+            state=row["STATE"],
+            county=row["COUNTY"],
+            zip=row["ZIP"] if row["ZIP"].strip() else None,
+            lat=lat,
+            lon=lon,
+            healthcare_expenses=healthcare_expenses,
+            healthcare_coverage=healthcare_coverage,
+        )
+
+        return patient
+
+    except (ValueError, KeyError, InvalidOperation) as e:
+        log.warning(
+            "Failed to parse CSV row",
+            error=str(e),
+            row_id=row.get("Id", "unknown"),
+        )
+        return None
+
+
+class ChunkResult(NamedTuple):
+    """Result of parsing a chunk of a CSV file."""
+
+    # Record batches when parsed by `arrow_parser`
+    patients: "list[PatientCreate] | pa.RecordBatch"
+    total_rows: int
+    parse_errors: int
+    # Byte offset right after the last row of the chunk
+    end: int
+
+
+def read_csv_header(csv_file_path: Path) -> tuple[list[str], int]:
+    """
+    Read the header of a CSV file.
+
+    Returns:
+        The field names, and the byte offset where the first row starts
+    """
+
+    with open(csv_file_path, "rb") as csvfile:
+        header = csvfile.readline()
+
+    fieldnames = next(csv.reader([header.decode("utf-8-sig")]))
+    return fieldnames, len(header)
+
+
+def split_csv_file(
+    csv_file_path: Path, chunk_bytes: int, start: int = 0
+) -> Iterator[tuple[int, int]]:
+    """
+    Split a CSV file into byte ranges aligned to line boundaries.
+
+    Every range ends right after a line break (or at the end of the file), so
+    each one holds only whole rows. Rows must not contain line breaks inside
+    quoted fields, which is the case for Synthea's CSV files.
+
+    Args:
+        csv_file_path: Path to the CSV file
+        chunk_bytes: Approximate size of each range, in bytes
+        start: Byte offset where the first range starts
+
+    Yields:
+        (start, end) byte offsets of each range, end being exclusive
+    """
+
+    file_size = csv_file_path.stat().st_size
+    with open(csv_file_path, "rb") as csvfile:
+        while start < file_size:
+            csvfile.seek(min(start + chunk_bytes, file_size))
+            # Moving on to the end of the line the seek landed in
+            csvfile.readline()
+            end = min(csvfile.tell(), file_size)
+            yield start, end
+            start = end
+
+
+def parse_csv_chunk(
+    csv_file_path: Path, start: int, end: int, fieldnames: list[str]
+) -> ChunkResult:
+    """
+    Parse the rows of a CSV file within a byte range.
+
+    Args:
+        csv_file_path: Path to the CSV file
+        start: Byte offset of the first row of the range
+        end: Byte offset right after the last row of the range
+        fieldnames: Field names, as read from the header of the file
+
+    Returns:
+        The valid patients in the range, plus row counts
+    """
+
+    with open(csv_file_path, "rb") as csvfile:
+        csvfile.seek(start)
+        data = csvfile.read(end - start)
+
+    patients = []
+    total_rows = 0
+    parse_errors = 0
+
+    reader = csv.DictReader(
+        io.StringIO(data.decode("utf-8"), newline=""), fieldnames=fieldnames
+    )
+    for row in reader:
+        total_rows += 1
+        patient = parse_csv_row(row)
+        if patient:
+            patients.append(patient)
+        else:
+            parse_errors += 1
+
+    return ChunkResult(patients, total_rows, parse_errors, end)
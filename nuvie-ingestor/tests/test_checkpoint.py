@@ -0,0 +1,147 @@
+import json
+
+from uuid import uuid4
+
+import pyarrow as pa
+import pytest
+
+from checkpoint import (
+    Checkpoint,
+    CheckpointTracker,
+    Progress,
+    checkpoint_path,
+    load_checkpoint,
+)
+from dedup_index import DedupIndex, KeySet, key_of_ssn
+from main import iter_batches
+from nuvie_sdk.models.patient import PatientCreate
+from parsers import ChunkResult
+
+
+def make_patient(ssn: str) -> PatientCreate:
+    # Only the SSN and ID of patients matter to batching and dedup
+    return PatientCreate.model_construct(id=uuid4(), ssn=ssn)
+
+
+def empty_parse_stats() -> dict[str, int]:
+    return {"total_rows": 0, "parse_errors": 0, "duplicates": 0}
+
+
+@pytest.fixture
+def csv_file(tmp_path):
+    path = tmp_path / "patients.csv"
+    path.write_text("Id,SSN\n")
+    return path
+
+
+def make_tracker(csv_file, interval: float = 0) -> CheckpointTracker:
+    checkpoint = Checkpoint(
+        progress=Progress(0, empty_parse_stats()),
+        stats={"created": 0, "skipped": 0, "errors": 0},
+    )
+    return CheckpointTracker(csv_file, checkpoint, interval)
+
+
+def loaded(created: int) -> dict[str, int]:
+    return {"created": created, "skipped": 0, "errors": 0}
+
+
+def test_iter_batches_splits_chunks():
+    patients = [make_patient(f"999-00-{i:04d}") for i in range(5)]
+    chunks = [ChunkResult(patients, 6, 1, 100)]
+    parse_stats = empty_parse_stats()
+
+    batches = list(iter_batches(chunks, 2, parse_stats))
+
+    assert [len(batch) for batch, _ in batches] == [2, 2, 1]
+    assert [progress for _, progress in batches[:-1]] == [None, None]
+    assert batches[-1][1] == Progress(
+        100, {"total_rows": 6, "parse_errors": 1, "duplicates": 0}
+    )
+
+
+def test_iter_batches_yields_progress_of_empty_chunks():
+    existing = make_patient("999-00-0000")
+    dedup_index = DedupIndex(KeySet([key_of_ssn(existing.ssn)]), KeySet())
+    chunks = [
+        # Only duplicates
+        ChunkResult([existing], 1, 0, 10),
+        # Only parse errors
+        ChunkResult([], 2, 2, 20),
+        ChunkResult([make_patient("999-00-0001")], 1, 0, 30),
+    ]
+    parse_stats = empty_parse_stats()
+
+    batches = list(
+        iter_batches(chunks, 2, parse_stats, dedup_index=dedup_index)
+    )
+
+    assert [len(batch) for batch, _ in batches] == [0, 0, 1]
+    assert [progress.offset for _, progress in batches] == [10, 20, 30]
+    assert batches[0][1].parse_stats["duplicates"] == 1
+    assert batches[1][1].parse_stats["parse_errors"] == 2
+
+
+def test_iter_batches_yields_progress_of_empty_record_batches():
+    empty = pa.record_batch(
+        [pa.array([], pa.string()), pa.array([], pa.string())],
+        names=["ssn", "id"],
+    )
+    batches = list(
+        iter_batches([ChunkResult(empty, 3, 3, 50)], 2, empty_parse_stats())
+    )
+
+    assert len(batches) == 1
+    assert batches[0][0].num_rows == 0
+    assert batches[0][1].offset == 50
+
+
+def test_tracker_waits_for_every_batch_before_a_chunk(csv_file):
+    tracker = make_tracker(csv_file)
+    first_chunk = Progress(10, empty_parse_stats())
+    second_chunk = Progress(20, empty_parse_stats())
+
+    # The second chunk is done before the first one
+    tracker.batch_done(2, second_chunk, loaded(3))
+    tracker.batch_done(1, first_chunk, loaded(2))
+    assert json.loads(checkpoint_path(csv_file).read_text())["offset"] == 0
+
+    tracker.batch_done(0, None, loaded(1))
+    checkpoint = load_checkpoint(csv_file)
+    assert checkpoint.progress.offset == 20
+    assert checkpoint.stats == loaded(6)
+
+
+def test_tracker_stops_at_failed_batches(csv_file):
+    tracker = make_tracker(csv_file)
+
+    tracker.batch_done(0, Progress(10, empty_parse_stats()), loaded(1))
+    tracker.batch_done(1, None, {"created": 0, "skipped": 0, "errors": 1})
+    tracker.batch_done(2, Progress(20, empty_parse_stats()), loaded(1))
+    tracker.close(completed=True, batch_count=3)
+
+    checkpoint = load_checkpoint(csv_file)
+    assert checkpoint.progress.offset == 10
+    assert checkpoint.stats == loaded(1)
+
+
+def test_tracker_advances_over_empty_batches(csv_file):
+    tracker = make_tracker(csv_file)
+
+    for batch_num, offset in enumerate([10, 20, 30]):
+        tracker.batch_done(
+            batch_num, Progress(offset, empty_parse_stats()), loaded(0)
+        )
+    assert load_checkpoint(csv_file).progress.offset == 30
+
+    tracker.close(completed=True, batch_count=3)
+    assert not checkpoint_path(csv_file).exists()
+
+
+def test_checkpoint_ignored_once_file_changes(csv_file):
+    tracker = make_tracker(csv_file)
+    tracker.batch_done(0, Progress(10, empty_parse_stats()), loaded(1))
+    assert load_checkpoint(csv_file) is not None
+
+    csv_file.write_text("Id,SSN\nchanged\n")
+    assert load_checkpoint(csv_file) is None
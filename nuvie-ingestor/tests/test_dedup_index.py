@@ -0,0 +1,113 @@
+from array import array
+from uuid import UUID, uuid4
+
+import pyarrow as pa
+
+import dedup_index
+from dedup_index import DedupIndex, KeySet, key_of_id, key_of_ssn
+
+
+def test_ssn_keys_are_lossless():
+    ssns = ["999-00-0000", "999-00-0001", "", "9", "9\0", "123456789012345"]
+    keys = [key_of_ssn(ssn) for ssn in ssns]
+
+    assert None not in keys
+    assert len(set(keys)) == len(ssns)
+    assert key_of_ssn("1234567890123456") is None
+
+
+def test_id_keys_accept_uuids_and_strings():
+    patient_id = uuid4()
+
+    assert key_of_id(patient_id) == key_of_id(str(patient_id))
+    assert key_of_id(patient_id) == patient_id.int
+
+
+def test_key_set_contains_initial_and_added_keys():
+    keys = [5, 1 << 64, (1 << 64) + 5, (1 << 128) - 1, 0]
+    key_set = KeySet(keys)
+
+    assert len(key_set) == len(keys)
+    assert all(key in key_set for key in keys)
+    assert 1 not in key_set
+    assert (2 << 64) + 5 not in key_set
+
+    key_set.add(1)
+    assert 1 in key_set
+    assert len(key_set) == len(keys) + 1
+
+
+def test_key_set_keys_sharing_high_bits():
+    # UUIDs whose first 8 bytes are the same only differ in their low bits
+    prefix = UUID("12345678-1234-1234-0000-000000000000").int
+    keys = [prefix + i for i in range(0, 100, 2)]
+    key_set = KeySet(reversed(keys))
+
+    assert all(key in key_set for key in keys)
+    assert not any(key + 1 in key_set for key in keys)
+
+
+def test_key_set_merges_pending_keys(monkeypatch):
+    monkeypatch.setattr(dedup_index, "PENDING_MERGE_SIZE", 3)
+    key_set = KeySet([10, 20])
+    for key in [(3 << 64) + 1, 15, 1, 25]:
+        key_set.add(key)
+
+    assert len(key_set._pending) == 1
+    assert len(key_set) == 6
+    assert all(key in key_set for key in [10, 20, (3 << 64) + 1, 15, 1, 25])
+    assert 2 not in key_set
+    assert list(key_set._high) == sorted(key_set._high)
+
+
+def test_key_set_from_halves():
+    key_set = KeySet.from_halves(array("Q", [1, 0, 1]), array("Q", [2, 9, 1]))
+
+    assert (1 << 64) + 2 in key_set
+    assert (1 << 64) + 1 in key_set
+    assert 9 in key_set
+    assert (1 << 64) + 9 not in key_set
+
+
+def test_dedup_index_check_and_add():
+    existing_id = uuid4()
+    index = DedupIndex(
+        KeySet([key_of_ssn("999-00-0000")]), KeySet([key_of_id(existing_id)])
+    )
+
+    # Already in the DB, by SSN or ID
+    assert not index.check_and_add("999-00-0000", uuid4())
+    assert not index.check_and_add("999-00-0001", existing_id)
+
+    new_id = uuid4()
+    assert index.check_and_add("999-00-0002", new_id)
+    # Repeated in the file
+    assert not index.check_and_add("999-00-0002", uuid4())
+    assert not index.check_and_add("999-00-0003", str(new_id))
+    # Patients without an ID are only checked by SSN
+    assert index.check_and_add("999-00-0004", None)
+    assert not index.check_and_add("999-00-0004", None)
+
+
+def test_dedup_index_long_ssns():
+    long_ssn = "X" * 20
+    index = DedupIndex(KeySet(), KeySet(), {long_ssn})
+
+    assert not index.check_and_add(long_ssn, uuid4())
+    assert index.check_and_add(long_ssn + "Y", uuid4())
+    assert not index.check_and_add(long_ssn + "Y", uuid4())
+
+
+def test_dedup_index_filter_record_batch():
+    ids = [str(uuid4()) for _ in range(4)]
+    index = DedupIndex(KeySet([key_of_ssn("a")]), KeySet())
+    batch = pa.record_batch(
+        [pa.array(["a", "b", "c", "b"]), pa.array(ids)], names=["ssn", "id"]
+    )
+    stats = {"duplicates": 0}
+
+    filtered = index.filter_record_batch(batch, stats)
+
+    assert filtered.column("ssn").to_pylist() == ["b", "c"]
+    assert filtered.column("id").to_pylist() == ids[1:3]
+    assert stats["duplicates"] == 2
@@ -0,0 +1,109 @@
+"""
+Benchmark of looking patients up by SSN.
+
+Times `patient_use_case.get_patient_by_ssn` for random SSNs taken from the
+patients table, as used by the SSN search route and by conflict checks.
+
+With `--compare`, lookups are also timed without the `ix_patients_ssn` index,
+by dropping it within a transaction that is rolled back afterwards. Dropping
+the index locks the patients table until then, so only compare against
+development DBs!
+
+Usage, from the nuvie-sdk directory, with the same env vars as migrations:
+
+    python benchmarks/ssn_lookup.py --lookups 200 --compare
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+from sqlalchemy import Connection, text
+from sqlmodel import Session, create_engine, select
+
+# Making the nuvie_sdk package importable when ran as a script
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+import nuvie_sdk.constants as c
+from nuvie_sdk.models import Patient
+from nuvie_sdk.use_cases import patient_use_case
+
+
+def time_lookups(connection: Connection, ssns: list[str]) -> list[float]:
+    """Look each SSN up, returning how long each lookup took, in ms."""
+
+    timings = []
+    with Session(bind=connection) as session:
+        for ssn in ssns:
+            start = time.perf_counter()
+            patient = patient_use_case.get_patient_by_ssn(
+                session=session, ssn=ssn
+            )
+            timings.append((time.perf_counter() - start) * 1000)
+            assert patient is not None
+            session.expunge_all()
+    return timings
+
+
+def report(label: str, timings: list[float]) -> None:
+    """Print latency statistics of a set of lookups."""
+
+    percentiles = statistics.quantiles(timings, n=100)
+    print(
+        f"{label:>14}: "
+        f"mean {statistics.mean(timings):8.3f} ms | "
+        f"p50 {percentiles[49]:8.3f} ms | "
+        f"p95 {percentiles[94]:8.3f} ms | "
+        f"max {max(timings):8.3f} ms"
+    )
+
+
+def main() -> None:
+    """Entry point of the benchmark."""
+
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--lookups",
+        type=int,
+        default=200,
+        help="Amount of SSNs looked up (default: 200)",
+    )
+    parser.add_argument(
+        "--compare",
+        action="store_true",
+        help="Also time lookups without the SSN index (locks the table!)",
+    )
+    args = parser.parse_args()
+
+    engine = create_engine(c.get_postgres_uri())
+    with engine.connect() as connection:
+        # Sampling SSNs from the whole table, so that lookups hit random pages
+        ssns = list(
+            connection.execute(
+                select(Patient.ssn)
+                .order_by(text("random()"))
+                .limit(args.lookups)
+            ).scalars()
+        )
+        if len(ssns) < 2:
+            sys.exit("Not enough patients in the DB to benchmark lookups")
+        rows = connection.execute(text("SELECT count(*) FROM patients"))
+        print(f"Looking up {len(ssns)} SSNs among {rows.scalar_one()} rows")
+        connection.rollback()
+
+        random.shuffle(ssns)
+        report("with index", time_lookups(connection, ssns))
+        connection.rollback()
+
+        if args.compare:
+            with connection.begin() as transaction:
+                connection.execute(text("DROP INDEX ix_patients_ssn"))
+                report("without index", time_lookups(connection, ssns))
+                transaction.rollback()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""Add unique index on patients SSN.
+
+Revision ID: 3e53ce013a4d
+Revises: 172d07dc80b4
+Create Date: 2026-10-17 02:36:08.895731
+"""
+
+from collections.abc import Sequence
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "3e53ce013a4d"
+down_revision: str | Sequence[str] | None = "172d07dc80b4"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Failing early with a clear message, instead of a failed index build
+    duplicates = (
+        op.get_bind()
+        .execute(
+            sa.text(
+                "SELECT count(*) FROM ("
+                "SELECT ssn FROM patients GROUP BY ssn HAVING count(*) > 1"
+                ") AS duplicates"
+            )
+        )
+        .scalar_one()
+    )
+    if duplicates:
+        raise RuntimeError(
+            f"{duplicates} SSNs are shared by more than one patient. Remove "
+            "the duplicate patients before running this migration."
+        )
+
+    # Building the index concurrently, so that the table isn't locked against
+    # writes meanwhile. That can't be done within a transaction
+    with op.get_context().autocommit_block():
+        op.create_index(
+            op.f("ix_patients_ssn"),
+            "patients",
+            ["ssn"],
+            unique=True,
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            op.f("ix_patients_ssn"),
+            table_name="patients",
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
@@ -0,0 +1,61 @@
+"""Add patient filter indexes.
+
+Revision ID: f514169bd27f
+Revises: 3e53ce013a4d
+Create Date: 2026-10-17 02:48:45.180534
+"""
+
+from collections.abc import Sequence
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "f514169bd27f"
+down_revision: str | Sequence[str] | None = "3e53ce013a4d"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+# Columns patients can be filtered by with an equality or a range
+FILTER_COLUMNS = ["birthdate", "city", "county", "state", "zip"]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Building the indexes concurrently, so that the table isn't locked
+    # against writes meanwhile. That can't be done within a transaction
+    with op.get_context().autocommit_block():
+        for column in FILTER_COLUMNS:
+            op.create_index(
+                op.f(f"ix_patients_{column}"),
+                "patients",
+                [column],
+                unique=False,
+                postgresql_concurrently=True,
+            )
+        op.create_index(
+            "ix_patients_last_lower",
+            "patients",
+            [sa.literal_column("lower(last) text_pattern_ops")],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ix_patients_last_lower",
+            table_name="patients",
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
+        for column in reversed(FILTER_COLUMNS):
+            op.drop_index(
+                op.f(f"ix_patients_{column}"),
+                table_name="patients",
+                postgresql_concurrently=True,
+                if_exists=True,
+            )
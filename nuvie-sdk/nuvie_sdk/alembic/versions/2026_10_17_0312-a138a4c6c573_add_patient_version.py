@@ -0,0 +1,72 @@
+"""Add patient version.
+
+Revision ID: a138a4c6c573
+Revises: f514169bd27f
+Create Date: 2026-10-17 03:12:27.418305
+"""
+
+from collections.abc import Sequence
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "a138a4c6c573"
+down_revision: str | Sequence[str] | None = "f514169bd27f"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+SEQUENCE_NAME = "patients_version_seq"
+TRIGGER_NAME = "patients_bump_version"
+
+# Versions are taken from a sequence shared by all patients, rather than
+# counted per patient, so that a patient deleted and created again with the
+# same ID doesn't get a version it already had
+BUMP_VERSION_FUNCTION_SQL = f"""
+CREATE FUNCTION {TRIGGER_NAME}() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    NEW.version := nextval('{SEQUENCE_NAME}');
+    RETURN NEW;
+END;
+$$
+"""
+
+# Updates that don't change anything (like upserts of the same data) keep the
+# version
+BUMP_VERSION_TRIGGER_SQL = f"""
+CREATE TRIGGER {TRIGGER_NAME}
+BEFORE UPDATE ON patients
+FOR EACH ROW
+WHEN (OLD.* IS DISTINCT FROM NEW.*)
+EXECUTE FUNCTION {TRIGGER_NAME}()
+"""
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute(sa.schema.CreateSequence(sa.Sequence(SEQUENCE_NAME)))
+    # A constant default doesn't rewrite the table, so existing patients all
+    # start at version 0. New ones then take versions from the sequence
+    op.add_column(
+        "patients",
+        sa.Column(
+            "version", sa.BigInteger(), nullable=False, server_default="0"
+        ),
+    )
+    op.alter_column(
+        "patients",
+        "version",
+        server_default=sa.text(f"nextval('{SEQUENCE_NAME}')"),
+    )
+    op.execute(f"ALTER SEQUENCE {SEQUENCE_NAME} OWNED BY patients.version")
+    op.execute(BUMP_VERSION_FUNCTION_SQL)
+    op.execute(BUMP_VERSION_TRIGGER_SQL)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute(f"DROP TRIGGER IF EXISTS {TRIGGER_NAME} ON patients")
+    op.execute(f"DROP FUNCTION IF EXISTS {TRIGGER_NAME}()")
+    # Also drops the sequence, owned by the column
+    op.drop_column("patients", "version")
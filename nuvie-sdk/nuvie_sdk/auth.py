@@ -1,10 +1,26 @@
 """
 Authentication module.
 
-This module handles authentication-related functionalities such as creating JWT
-tokens, setting cookies, and verifying passwords.
+This module handles authentication-related functionalities such as creating and
+decoding JWT tokens, setting cookies, and verifying passwords.
+
+Hashing and verifying passwords with bcrypt takes hundreds of milliseconds of
+CPU, so the async variants of these functions run them in a dedicated pool of
+`PASSWORD_HASH_WORKERS` processes, with at most `PASSWORD_HASH_CONCURRENCY` of
+them pending at once. That way, bursts of logins don't hold the GIL, nor the
+threads that serve every other request.
 """
 
+import asyncio
+import hashlib
+import multiprocessing
+import time
+import weakref
+
+from concurrent.futures import Executor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from threading import Lock
+
 from typing import Any
 from datetime import datetime, timedelta, UTC
 
@@ -12,18 +28,22 @@ import jwt
 from passlib.context import CryptContext
 
 from . import constants as c
+from .cache import TTLCache
+from .models import TokenPayload
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 
 ALGORITHM = "HS256"
 
+# Payloads of already verified tokens, by hash of the secret key and token.
+# Entries expire along with their tokens
+token_cache: TTLCache[TokenPayload] = TTLCache(
+    ttl=c.TOKEN_CACHE_MAX_TTL, maxsize=c.TOKEN_CACHE_SIZE
+)
 
-def create_access_token(
-    subject: str | Any, expires_delta: timedelta, secret_key: str | None = None
-) -> str:
-    """Creates a JWT access token with an expiration time."""
 
+def _get_secret_key(secret_key: str | None) -> str:
     if secret_key is None:
         secret_key = c.SECRET_KEY
     if secret_key is None:
@@ -31,6 +51,15 @@ def create_access_token(
             "`secret_key` argument was not provided and environment variable "
             "SECRET_KEY is not set!"
         )
+    return secret_key
+
+
+def create_access_token(
+    subject: str | Any, expires_delta: timedelta, secret_key: str | None = None
+) -> str:
+    """Creates a JWT access token with an expiration time."""
+
+    secret_key = _get_secret_key(secret_key)
 
     expire = datetime.now(UTC) + expires_delta
     to_encode = {"exp": expire, "sub": str(subject)}
@@ -38,6 +67,42 @@ def create_access_token(
     return encoded_jwt
 
 
+def decode_access_token(
+    token: str, secret_key: str | None = None
+) -> TokenPayload:
+    """
+    Verifies a JWT access token and returns its payload.
+
+    Tokens are presented again on every request, so verified payloads are
+    cached until the tokens expire, and the signature of a cached token isn't
+    verified again. Hits and misses are counted by `token_cache`.
+
+    Raises:
+        jwt.InvalidTokenError: If the token is invalid or expired
+        pydantic.ValidationError: If the payload isn't a valid TokenPayload
+    """
+
+    secret_key = _get_secret_key(secret_key)
+    key = hashlib.sha256(f"{secret_key}\0{token}".encode()).digest()
+
+    payload = token_cache.get(key)
+    if payload is not None:
+        return payload
+
+    decoded = jwt.decode(token, secret_key, algorithms=[ALGORITHM])
+    payload = TokenPayload(**decoded)
+
+    # Tokens without an expiration time are never cached
+    expires_at = decoded.get("exp")
+    if isinstance(expires_at, int | float):
+        token_cache.set(
+            key,
+            payload,
+            ttl=min(expires_at - time.time(), token_cache.ttl),
+        )
+    return payload
+
+
 def set_token_cookie(response: Any, token: str):
     """
     Sets the JWT token in the response cookies.
@@ -69,3 +134,89 @@ def get_password_hash(password: str) -> str:
     """Hashes a password using bcrypt."""
 
     return pwd_context.hash(password)
+
+
+# * ###########################################################################
+# * Password hashing pool
+# * ###########################################################################
+
+_password_pool: Executor | None = None
+_password_pool_lock = Lock()
+# Semaphores limiting the pending calls of each event loop, as a semaphore
+# can only be awaited from the loop it was first used in
+_password_semaphores: weakref.WeakKeyDictionary[
+    asyncio.AbstractEventLoop, asyncio.Semaphore
+] = weakref.WeakKeyDictionary()
+
+
+def _get_password_pool() -> Executor | None:
+    """Get the password hashing pool, started on first use."""
+
+    global _password_pool
+
+    if c.PASSWORD_HASH_WORKERS <= 0:
+        return None
+
+    with _password_pool_lock:
+        if _password_pool is None:
+            # Forking a process that runs threads (like the API) may deadlock
+            _password_pool = ProcessPoolExecutor(
+                max_workers=c.PASSWORD_HASH_WORKERS,
+                mp_context=multiprocessing.get_context("forkserver"),
+            )
+        return _password_pool
+
+
+def shutdown_password_pool() -> None:
+    """Stop the processes of the password hashing pool, if started."""
+
+    global _password_pool
+
+    with _password_pool_lock:
+        if _password_pool is not None:
+            _password_pool.shutdown(cancel_futures=True)
+            _password_pool = None
+
+
+async def _run_in_password_pool(function: Any, *args: Any) -> Any:
+    """
+    Run a password hashing function without blocking the event loop.
+
+    Runs in the password hashing pool, or in a thread if its amount of
+    workers is set to 0. At most `PASSWORD_HASH_CONCURRENCY` calls are
+    pending at once per event loop.
+    """
+
+    loop = asyncio.get_running_loop()
+    semaphore = _password_semaphores.get(loop)
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(c.PASSWORD_HASH_CONCURRENCY)
+        _password_semaphores[loop] = semaphore
+
+    async with semaphore:
+        pool = _get_password_pool()
+        if pool is None:
+            return await asyncio.to_thread(function, *args)
+
+        try:
+            return await loop.run_in_executor(pool, function, *args)
+        except BrokenProcessPool:
+            # A worker died, so the next call starts a new pool
+            shutdown_password_pool()
+            raise
+
+
+async def verify_password_async(
+    plain_password: str, hashed_password: str
+) -> bool:
+    """Verifies a plain password against a hashed password, off the loop."""
+
+    return await _run_in_password_pool(
+        verify_password, plain_password, hashed_password
+    )
+
+
+async def get_password_hash_async(password: str) -> str:
+    """Hashes a password using bcrypt, off the loop."""
+
+    return await _run_in_password_pool(get_password_hash, password)
@@ -0,0 +1,138 @@
+"""
+In-process caching.
+
+Caches here only live in the memory of the current process, so entries written
+by other processes (other API workers, the ingestor...) are only seen once
+they expire. Keep TTLs short for data that other processes may change.
+
+Caches that may be shared between processes instead are typed with the
+`CacheBackend` protocol, which `TTLCache` implements as an in-process
+stand-in.
+"""
+
+import time
+
+from collections import OrderedDict
+from collections.abc import Hashable
+from threading import Lock
+from typing import Any, Generic, Protocol, TypeVar
+
+V = TypeVar("V")
+
+_MISSING: Any = object()
+
+
+class CacheBackend(Protocol[V]):
+    """Storage of cache entries, possibly shared between processes."""
+
+    def get(self, key: Hashable, default: Any = None) -> V | Any:
+        """Get the value of a key, or `default` if missing or expired."""
+        ...
+
+    def set(self, key: Hashable, value: V, ttl: float | None = None) -> None:
+        """Store the value of a key, expiring after `ttl` seconds."""
+        ...
+
+    def delete(self, key: Hashable) -> None:
+        """Remove a key, if present."""
+        ...
+
+    def clear(self) -> None:
+        """Remove every entry."""
+        ...
+
+
+class TTLCache(Generic[V]):
+    """
+    Thread-safe mapping whose entries expire after a time-to-live.
+
+    Once `maxsize` entries are stored, the least recently used one is evicted
+    to make room for new ones. Hits and misses are counted, to help tune TTLs
+    and sizes.
+    """
+
+    def __init__(self, ttl: float, maxsize: int = 1024) -> None:
+        """
+        Initialize an empty cache.
+
+        Args:
+            ttl: Default time-to-live of entries, in seconds
+            maxsize: Maximum amount of entries stored at once
+        """
+
+        if maxsize < 1:
+            raise ValueError("`maxsize` must be at least 1")
+
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        # Values and expiration times, from least to most recently used
+        self._entries: OrderedDict[Hashable, tuple[V, float]] = OrderedDict()
+        self._lock = Lock()
+
+    def __len__(self) -> int:
+        """Get the amount of entries, including expired ones."""
+
+        return len(self._entries)
+
+    def get(self, key: Hashable, default: Any = None) -> V | Any:
+        """Get the value of a key, or `default` if missing or expired."""
+
+        with self._lock:
+            entry = self._entries.get(key, _MISSING)
+            if entry is not _MISSING:
+                value, expires_at = entry
+                if time.monotonic() < expires_at:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+
+            self.misses += 1
+            return default
+
+    def set(self, key: Hashable, value: V, ttl: float | None = None) -> None:
+        """
+        Store the value of a key.
+
+        Args:
+            key: Key of the entry
+            value: Value of the entry
+            ttl: Time-to-live of the entry, in seconds. Defaults to the
+                cache's TTL
+        """
+
+        if ttl is None:
+            ttl = self.ttl
+        if ttl <= 0:
+            self.delete(key)
+            return
+
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: Hashable) -> None:
+        """Remove a key, if present."""
+
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        """Remove every entry."""
+
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict[str, int]:
+        """Get the amount of hits, misses and entries of the cache."""
+
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._entries),
+            }
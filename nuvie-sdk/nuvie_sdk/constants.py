@@ -18,6 +18,68 @@ LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
 # is not set, throwing a ValueError.
 SECRET_KEY = os.getenv("SECRET_KEY", None)
 
+# Seconds failed credentials are remembered for, and rejected on login without
+# checking the password
+try:
+    LOGIN_FAILURE_WINDOW = float(os.getenv("LOGIN_FAILURE_WINDOW", "300"))
+except ValueError:
+    raise ValueError(
+        "Environment variable LOGIN_FAILURE_WINDOW must be a valid number"
+    )
+
+# Failed logins to an account, within LOGIN_FAILURE_WINDOW seconds, after which
+# its passwords are only checked once every LOGIN_THROTTLE_INTERVAL seconds
+try:
+    LOGIN_MAX_FAILURES = int(os.getenv("LOGIN_MAX_FAILURES", "10"))
+except ValueError:
+    raise ValueError(
+        "Environment variable LOGIN_MAX_FAILURES must be a valid integer"
+    )
+
+try:
+    LOGIN_THROTTLE_INTERVAL = float(os.getenv("LOGIN_THROTTLE_INTERVAL", "5"))
+except ValueError:
+    raise ValueError(
+        "Environment variable LOGIN_THROTTLE_INTERVAL must be a valid number"
+    )
+
+# Seconds an email that doesn't belong to any user is cached for, on login
+try:
+    UNKNOWN_EMAIL_CACHE_TTL = float(os.getenv("UNKNOWN_EMAIL_CACHE_TTL", "30"))
+except ValueError:
+    raise ValueError(
+        "Environment variable UNKNOWN_EMAIL_CACHE_TTL must be a valid number"
+    )
+
+# Maximum amount of emails whose failed logins are tracked at once
+try:
+    LOGIN_CACHE_SIZE = int(os.getenv("LOGIN_CACHE_SIZE", "10000"))
+except ValueError:
+    raise ValueError(
+        "Environment variable LOGIN_CACHE_SIZE must be a valid integer"
+    )
+
+# Processes hashing and verifying passwords for async callers. 0 to do it in
+# threads instead
+try:
+    PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+except ValueError:
+    raise ValueError(
+        "Environment variable PASSWORD_HASH_WORKERS must be a valid integer"
+    )
+
+# Maximum amount of passwords being hashed or verified at once for async
+# callers, per process. Others wait for their turn
+try:
+    PASSWORD_HASH_CONCURRENCY = int(
+        os.getenv("PASSWORD_HASH_CONCURRENCY", "8")
+    )
+except ValueError:
+    raise ValueError(
+        "Environment variable PASSWORD_HASH_CONCURRENCY must be a valid "
+        "integer"
+    )
+
 
 # * ###########################################################################
 # * DB credentials
@@ -37,6 +99,183 @@ def get_postgres_uri():
     return f"postgresql+psycopg://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_SERVER}:{POSTGRES_PORT}/{POSTGRES_DB}"
 
 
+# Read replicas of the DB, as comma-separated "host" or "host:port" (which
+# defaults to POSTGRES_PORT). Same DB and credentials as the primary
+POSTGRES_REPLICAS = [
+    replica.strip()
+    for replica in os.getenv("POSTGRES_REPLICAS", "").split(",")
+    if replica.strip()
+]
+
+
+def get_postgres_replica_uris() -> list[str]:
+    """Returns the PostgreSQL URIs of the read replicas for SQLAlchemy."""
+
+    uris = []
+    for replica in POSTGRES_REPLICAS:
+        host, _, port = replica.partition(":")
+        uris.append(
+            f"postgresql+psycopg://{POSTGRES_USER}:{POSTGRES_PASSWORD}"
+            f"@{host}:{port or POSTGRES_PORT}/{POSTGRES_DB}"
+        )
+    return uris
+
+
+# * ###########################################################################
+# * DB connection pool
+# * ###########################################################################
+
+# Connections kept open by each engine, and extra ones opened (then closed)
+# when all of those are checked out. Threads or tasks wait for one to be
+# returned past that, for at most DB_POOL_TIMEOUT seconds
+try:
+    DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+except ValueError:
+    raise ValueError(
+        "Environment variable DB_POOL_SIZE must be a valid integer"
+    )
+
+try:
+    DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+except ValueError:
+    raise ValueError(
+        "Environment variable DB_MAX_OVERFLOW must be a valid integer"
+    )
+
+try:
+    DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+except ValueError:
+    raise ValueError(
+        "Environment variable DB_POOL_TIMEOUT must be a valid number"
+    )
+
+# Whether connections are tested before being checked out, so that ones
+# closed by the server (restarts, failovers...) are replaced transparently
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in (
+    "1",
+    "true",
+    "yes",
+)
+
+# Seconds after which connections are replaced when checked out, so that
+# proxies and firewalls don't close them first. -1 to never replace them
+try:
+    DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+except ValueError:
+    raise ValueError(
+        "Environment variable DB_POOL_RECYCLE must be a valid integer"
+    )
+
+# Milliseconds after which the server cancels a statement. 0 for no limit
+try:
+    DB_STATEMENT_TIMEOUT = int(os.getenv("DB_STATEMENT_TIMEOUT", "0"))
+except ValueError:
+    raise ValueError(
+        "Environment variable DB_STATEMENT_TIMEOUT must be a valid integer"
+    )
+
+# Executions of the same query after which psycopg prepares it server-side.
+# Empty to never prepare statements, as required behind PgBouncer in
+# transaction mode
+DB_PREPARE_THRESHOLD: int | None
+try:
+    DB_PREPARE_THRESHOLD = int(os.getenv("DB_PREPARE_THRESHOLD", "5"))
+except ValueError:
+    if os.getenv("DB_PREPARE_THRESHOLD", "").strip():
+        raise ValueError(
+            "Environment variable DB_PREPARE_THRESHOLD must be a valid "
+            "integer, or empty"
+        )
+    DB_PREPARE_THRESHOLD = None
+
+# Seconds between checks of the health of each read replica. Unhealthy ones
+# are checked again after that long too, and used again once they pass
+try:
+    REPLICA_CHECK_INTERVAL = float(os.getenv("REPLICA_CHECK_INTERVAL", "5"))
+except ValueError:
+    raise ValueError(
+        "Environment variable REPLICA_CHECK_INTERVAL must be a valid number"
+    )
+
+# Seconds a read replica may lag behind the primary before it is considered
+# unhealthy
+try:
+    REPLICA_MAX_LAG = float(os.getenv("REPLICA_MAX_LAG", "10"))
+except ValueError:
+    raise ValueError(
+        "Environment variable REPLICA_MAX_LAG must be a valid number"
+    )
+
+
+# * ###########################################################################
+# * Caching
+# * ###########################################################################
+
+# Seconds an exact count of a table's rows is cached for
+try:
+    COUNT_CACHE_TTL = float(os.getenv("COUNT_CACHE_TTL", "10"))
+except ValueError:
+    raise ValueError(
+        "Environment variable COUNT_CACHE_TTL must be a valid number"
+    )
+
+# Seconds statistics about patients are cached for
+try:
+    STATS_CACHE_TTL = float(os.getenv("STATS_CACHE_TTL", "60"))
+except ValueError:
+    raise ValueError(
+        "Environment variable STATS_CACHE_TTL must be a valid number"
+    )
+
+# Seconds a user loaded by an authenticated request is cached for. Changes
+# made through the use cases of the same process are seen right away, others
+# only once the entry expires
+try:
+    USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "30"))
+except ValueError:
+    raise ValueError(
+        "Environment variable USER_CACHE_TTL must be a valid number"
+    )
+
+# Maximum amount of users cached at once
+try:
+    USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "1024"))
+except ValueError:
+    raise ValueError(
+        "Environment variable USER_CACHE_SIZE must be a valid integer"
+    )
+
+# Maximum seconds a verified JWT token is cached for. Tokens are never cached
+# past their expiration time
+try:
+    TOKEN_CACHE_MAX_TTL = float(os.getenv("TOKEN_CACHE_MAX_TTL", "3600"))
+except ValueError:
+    raise ValueError(
+        "Environment variable TOKEN_CACHE_MAX_TTL must be a valid number"
+    )
+
+# Maximum amount of verified JWT tokens cached at once
+try:
+    TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "4096"))
+except ValueError:
+    raise ValueError(
+        "Environment variable TOKEN_CACHE_SIZE must be a valid integer"
+    )
+
+
+# * ###########################################################################
+# * Limits
+# * ###########################################################################
+
+# Maximum amount of patients requested or written at once through the API
+try:
+    PATIENTS_MAX_BATCH_SIZE = int(os.getenv("PATIENTS_MAX_BATCH_SIZE", "1000"))
+except ValueError:
+    raise ValueError(
+        "Environment variable PATIENTS_MAX_BATCH_SIZE must be a valid integer"
+    )
+
+
 # * ###########################################################################
 # * DB table names
 # * ###########################################################################
@@ -0,0 +1,599 @@
+"""
+Creation of DB engines and sessions.
+
+Applications create their engines here rather than with SQLAlchemy directly,
+so that they all share the same connection settings, tunable with the
+`DB_*` environment variables, and report the same pool statistics.
+
+Each engine keeps a pool of `DB_POOL_SIZE` connections, opening up to
+`DB_MAX_OVERFLOW` more when all of them are checked out. Once that many are
+checked out too, threads (or tasks) wait for one to be returned. Time spent
+waiting, overflow connections and timeouts are counted, see
+`get_pool_stats`, to help size pools for the amount of threads or tasks
+using them.
+
+Sessions created by `create_session_factory` and
+`create_async_session_factory` send the statements marked with `on_replica`
+to read replicas, when there are any healthy ones, and every other statement
+to the primary. Once a session writes anything, all of its statements go to
+the primary, so that it reads its own writes. Reads that fail because a
+replica can't be reached are retried once on the primary.
+"""
+
+import itertools
+import time
+
+from collections.abc import Sequence
+from threading import Event, Lock, Thread
+from typing import Any, TypeVar
+
+from sqlalchemy import Engine, create_engine, event, exc, text
+from sqlalchemy.engine import ExceptionContext
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    async_sessionmaker,
+    create_async_engine,
+)
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool, QueuePool
+from sqlalchemy.sql.base import Executable
+from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from . import constants as c
+
+_DEFAULT: Any = object()
+
+E = TypeVar("E", bound=Executable)
+
+# Execution option of the statements that may be sent to a read replica
+REPLICA_OPTION = "nuvie_replica"
+
+# Seconds to wait for a connection to a read replica to be established
+REPLICA_CONNECT_TIMEOUT = 2
+
+# Seconds a replica lags behind the primary. 0 when it has replayed all the
+# WAL it received, since the last replayed transaction may be old on a quiet
+# primary. NULL on a primary
+REPLICA_LAG_SQL = text(
+    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() "
+    "THEN 0 ELSE extract(epoch FROM now() - "
+    "pg_last_xact_replay_timestamp()) END"
+)
+
+
+class _PoolStatsMixin:
+    """Counts checkouts of a `QueuePool`, and the time spent waiting."""
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.checkouts = 0
+        self.wait_time = 0.0
+        self.max_wait_time = 0.0
+        self.overflow_events = 0
+        self.timeouts = 0
+        self._stats_lock = Lock()
+
+    def connect(self) -> Any:
+        start = time.perf_counter()
+        try:
+            connection = super().connect()  # type: ignore
+        except exc.TimeoutError:
+            with self._stats_lock:
+                self.timeouts += 1
+            raise
+
+        # Includes pre-pings and connections being opened
+        waited = time.perf_counter() - start
+        with self._stats_lock:
+            self.checkouts += 1
+            self.wait_time += waited
+            self.max_wait_time = max(self.max_wait_time, waited)
+        return connection
+
+    def _create_connection(self) -> Any:
+        record = super()._create_connection()  # type: ignore
+        # Overflow is counted before opening, from -pool_size up
+        if self.overflow() > 0:  # type: ignore
+            with self._stats_lock:
+                self.overflow_events += 1
+        return record
+
+    def stats(self) -> dict[str, int | float]:
+        """Get the state of the pool, and counters since it was created."""
+
+        with self._stats_lock:
+            return {
+                "size": self.size(),  # type: ignore
+                "checked_out": self.checkedout(),  # type: ignore
+                "idle": self.checkedin(),  # type: ignore
+                "overflow": max(self.overflow(), 0),  # type: ignore
+                "checkouts": self.checkouts,
+                "wait_time": round(self.wait_time, 6),
+                "max_wait_time": round(self.max_wait_time, 6),
+                "overflow_events": self.overflow_events,
+                "timeouts": self.timeouts,
+            }
+
+
+class InstrumentedQueuePool(_PoolStatsMixin, QueuePool):
+    """`QueuePool` of sync engines, with statistics."""
+
+
+class InstrumentedAsyncQueuePool(_PoolStatsMixin, AsyncAdaptedQueuePool):
+    """`AsyncAdaptedQueuePool` of async engines, with statistics."""
+
+
+def _engine_options(
+    pool_size: int | None,
+    max_overflow: int | None,
+    pool_timeout: float | None,
+    pool_pre_ping: bool | None,
+    pool_recycle: int | None,
+    statement_timeout: int | None,
+    prepare_threshold: int | None,
+    kwargs: dict[str, Any],
+) -> dict[str, Any]:
+    """Fills in the options of an engine with the `DB_*` settings."""
+
+    if statement_timeout is None:
+        statement_timeout = c.DB_STATEMENT_TIMEOUT
+    if prepare_threshold is _DEFAULT:
+        prepare_threshold = c.DB_PREPARE_THRESHOLD
+
+    connect_args: dict[str, Any] = {"prepare_threshold": prepare_threshold}
+    if statement_timeout > 0:
+        connect_args["options"] = f"-c statement_timeout={statement_timeout}"
+    connect_args.update(kwargs.pop("connect_args", {}))
+
+    return {
+        "pool_size": c.DB_POOL_SIZE if pool_size is None else pool_size,
+        "max_overflow": (
+            c.DB_MAX_OVERFLOW if max_overflow is None else max_overflow
+        ),
+        "pool_timeout": (
+            c.DB_POOL_TIMEOUT if pool_timeout is None else pool_timeout
+        ),
+        "pool_pre_ping": (
+            c.DB_POOL_PRE_PING if pool_pre_ping is None else pool_pre_ping
+        ),
+        "pool_recycle": (
+            c.DB_POOL_RECYCLE if pool_recycle is None else pool_recycle
+        ),
+        "connect_args": connect_args,
+        **kwargs,
+    }
+
+
+def create_db_engine(
+    url: str | None = None,
+    *,
+    pool_size: int | None = None,
+    max_overflow: int | None = None,
+    pool_timeout: float | None = None,
+    pool_pre_ping: bool | None = None,
+    pool_recycle: int | None = None,
+    statement_timeout: int | None = None,
+    prepare_threshold: int | None = _DEFAULT,
+    **kwargs: Any,
+) -> Engine:
+    """
+    Create a sync engine, with a pool of connections.
+
+    Args:
+        url: URL of the DB. Defaults to `get_postgres_uri()`
+        pool_size: Connections kept open. Defaults to `DB_POOL_SIZE`
+        max_overflow: Extra connections opened when all of those are checked
+            out. Defaults to `DB_MAX_OVERFLOW`
+        pool_timeout: Seconds to wait for a connection to be returned before
+            raising `sqlalchemy.exc.TimeoutError`. Defaults to
+            `DB_POOL_TIMEOUT`
+        pool_pre_ping: Whether to test connections when checked out. Defaults
+            to `DB_POOL_PRE_PING`
+        pool_recycle: Seconds after which connections are replaced, -1 for
+            never. Defaults to `DB_POOL_RECYCLE`
+        statement_timeout: Milliseconds after which the server cancels a
+            statement, 0 for no limit. Defaults to `DB_STATEMENT_TIMEOUT`
+        prepare_threshold: Executions of a query after which it is prepared
+            server-side, None for never. Defaults to `DB_PREPARE_THRESHOLD`
+        **kwargs: Other arguments of `sqlalchemy.create_engine`
+
+    Returns:
+        The engine, whose pool statistics are given by `get_pool_stats`.
+    """
+
+    options = _engine_options(
+        pool_size,
+        max_overflow,
+        pool_timeout,
+        pool_pre_ping,
+        pool_recycle,
+        statement_timeout,
+        prepare_threshold,
+        kwargs,
+    )
+    return create_engine(
+        url or c.get_postgres_uri(),
+        poolclass=InstrumentedQueuePool,
+        **options,
+    )
+
+
+def create_async_db_engine(
+    url: str | None = None,
+    *,
+    pool_size: int | None = None,
+    max_overflow: int | None = None,
+    pool_timeout: float | None = None,
+    pool_pre_ping: bool | None = None,
+    pool_recycle: int | None = None,
+    statement_timeout: int | None = None,
+    prepare_threshold: int | None = _DEFAULT,
+    **kwargs: Any,
+) -> AsyncEngine:
+    """
+    Create an async engine, with a pool of connections.
+
+    Takes the same arguments as `create_db_engine`. psycopg 3 supports
+    asyncio natively, so the same URL works for both.
+    """
+
+    options = _engine_options(
+        pool_size,
+        max_overflow,
+        pool_timeout,
+        pool_pre_ping,
+        pool_recycle,
+        statement_timeout,
+        prepare_threshold,
+        kwargs,
+    )
+    return create_async_engine(
+        url or c.get_postgres_uri(),
+        poolclass=InstrumentedAsyncQueuePool,
+        **options,
+    )
+
+
+def get_pool_stats(engine: Engine | AsyncEngine) -> dict[str, int | float]:
+    """
+    Get statistics of the pool of an engine created by this module.
+
+    Returns:
+        The size of the pool, the amount of connections checked out, idle and
+        in overflow right now, and, since the pool was created (or the engine
+        last disposed of), the amount of checkouts, total and maximum seconds
+        spent checking out connections, overflow connections opened and
+        checkouts that timed out.
+
+    Raises:
+        TypeError: If the engine wasn't created by this module.
+    """
+
+    pool = engine.pool
+    if not isinstance(pool, _PoolStatsMixin):
+        raise TypeError("The engine wasn't created by `nuvie_sdk.db`")
+    return pool.stats()
+
+
+# * ###########################################################################
+# * Read replicas
+# * ###########################################################################
+
+
+def on_replica(statement: E) -> E:
+    """
+    Mark a read-only statement as allowed to run on a read replica.
+
+    Only mark statements whose results may be a little stale, up to
+    `REPLICA_MAX_LAG` seconds.
+    """
+
+    return statement.execution_options(**{REPLICA_OPTION: True})
+
+
+class _Replica:
+    """Health of a read replica."""
+
+    def __init__(self, engine: Engine) -> None:
+        self.engine = engine
+        # Checks open their own connections, without a pool, since they may
+        # run outside of the event loop an async engine's connections need
+        self.check_engine = create_engine(
+            engine.url,
+            poolclass=NullPool,
+            connect_args={"connect_timeout": REPLICA_CONNECT_TIMEOUT},
+        )
+        self.healthy = True
+
+
+class ReplicaRouter:
+    """
+    Chooses the read replica statements are sent to.
+
+    Healthy replicas are used in turns. A replica is unhealthy when it can't
+    be connected to, or lags behind the primary by more than `max_lag`
+    seconds. Health is checked every `check_interval` seconds by a background
+    thread, started when a replica is first chosen, so that checks never hold
+    up statements. A replica is also marked unhealthy as soon as a connection
+    to it is lost, and is used again once it passes a check.
+    """
+
+    def __init__(
+        self,
+        replicas: Sequence[Engine],
+        *,
+        check_interval: float | None = None,
+        max_lag: float | None = None,
+    ) -> None:
+        """
+        Initialize the router.
+
+        Args:
+            replicas: Sync engines of the replicas. For async engines, their
+                `sync_engine`
+            check_interval: Seconds between checks of each replica. Defaults
+                to `REPLICA_CHECK_INTERVAL`
+            max_lag: Maximum seconds of lag of healthy replicas. Defaults to
+                `REPLICA_MAX_LAG`
+        """
+
+        self.check_interval = (
+            c.REPLICA_CHECK_INTERVAL
+            if check_interval is None
+            else check_interval
+        )
+        self.max_lag = c.REPLICA_MAX_LAG if max_lag is None else max_lag
+        self._replicas = [_Replica(engine) for engine in replicas]
+        self._turns = itertools.cycle(range(len(self._replicas)))
+        self._lock = Lock()
+        self._checker: Thread | None = None
+        self._closed = Event()
+
+        for replica in self._replicas:
+            event.listen(
+                replica.engine,
+                "handle_error",
+                self._make_error_handler(replica),
+            )
+
+    def _make_error_handler(self, replica: _Replica) -> Any:
+        def handle_error(context: ExceptionContext) -> None:
+            # Lost connections, or ones that couldn't be established
+            if context.is_disconnect or context.connection is None:
+                replica.healthy = False
+
+        return handle_error
+
+    def _check(self, replica: _Replica) -> None:
+        """Check the health of a replica."""
+
+        try:
+            with replica.check_engine.connect() as connection:
+                lag = connection.execute(REPLICA_LAG_SQL).scalar()
+            replica.healthy = lag is None or lag <= self.max_lag
+        except exc.DBAPIError:
+            replica.healthy = False
+
+    def _run_checks(self) -> None:
+        """Check every replica, every `check_interval`, until closed."""
+
+        while not self._closed.is_set():
+            for replica in self._replicas:
+                self._check(replica)
+            self._closed.wait(self.check_interval)
+
+    def _start_checks(self) -> None:
+        with self._lock:
+            if self._checker is None and not self._closed.is_set():
+                self._checker = Thread(
+                    target=self._run_checks,
+                    name="replica-health-checks",
+                    daemon=True,
+                )
+                self._checker.start()
+
+    def choose(self) -> Engine | None:
+        """Get the engine of the next healthy replica, or None if none is."""
+
+        if self._checker is None:
+            self._start_checks()
+
+        for _ in range(len(self._replicas)):
+            with self._lock:
+                replica = self._replicas[next(self._turns)]
+            if replica.healthy:
+                return replica.engine
+        return None
+
+    def is_healthy(self, engine: Engine) -> bool:
+        """Get whether the replica of an engine is healthy."""
+
+        return any(
+            replica.healthy
+            for replica in self._replicas
+            if replica.engine is engine
+        )
+
+    def health(self) -> list[bool]:
+        """Get whether each replica is healthy, in order."""
+
+        return [replica.healthy for replica in self._replicas]
+
+    def close(self) -> None:
+        """Stop checking the health of the replicas."""
+
+        self._closed.set()
+        if self._checker is not None:
+            self._checker.join()
+
+
+class RoutingSession(Session):
+    """
+    Session sending statements marked with `on_replica` to read replicas.
+
+    Every other statement, and every statement after the session first
+    writes, is sent to the session's bind, the primary. A statement that
+    fails because its replica can't be reached is retried once on the
+    primary, where the rest of the session's statements then go too.
+    """
+
+    def __init__(
+        self, *args: Any, router: ReplicaRouter | None = None, **kwargs: Any
+    ) -> None:
+        """Initialize the session, routing with `router` if given."""
+
+        super().__init__(*args, **kwargs)
+        self.router = router
+        self.wrote = False
+        self.replica_failed = False
+        # Replica the statement being executed was sent to, if any
+        self._replica: Engine | None = None
+
+    def _retrying_on_primary(
+        self, method: Any, *args: Any, **kwargs: Any
+    ) -> Any:
+        """Call `method`, retrying it on the primary if its replica fails."""
+
+        self._replica = None
+        try:
+            return method(*args, **kwargs)
+        except exc.DBAPIError:
+            replica, self._replica = self._replica, None
+            # The replica is marked unhealthy by the router when a connection
+            # to it is lost or can't be established, not on other errors
+            if (
+                replica is None
+                or self.router is None
+                or self.router.is_healthy(replica)
+            ):
+                raise
+            self.replica_failed = True
+            self._discard_connection(replica)
+        return method(*args, **kwargs)
+
+    def _discard_connection(self, bind: Engine) -> None:
+        """
+        Remove the broken connection to a bind from the session's transaction.
+
+        Otherwise, committing the transaction fails, trying to commit on that
+        connection too. SQLAlchemy has no public API for this, and rolling
+        the whole session back would expire every instance loaded so far.
+        """
+
+        transaction = self.get_transaction()
+        while transaction is not None:
+            # Stored under both the engine and the connection
+            entry = transaction._connections.pop(bind, None)
+            if entry is not None:
+                transaction._connections.pop(entry[0], None)
+                entry[0].close()
+            transaction = transaction.parent
+
+    def execute(self, *args: Any, **kwargs: Any) -> Any:
+        """Execute a statement, as `Session.execute`."""
+
+        return self._retrying_on_primary(super().execute, *args, **kwargs)
+
+    def exec(self, *args: Any, **kwargs: Any) -> Any:
+        """Execute a statement, as `Session.exec`."""
+
+        return self._retrying_on_primary(super().exec, *args, **kwargs)
+
+    def get_bind(self, mapper: Any = None, **kwargs: Any) -> Any:
+        """Get the engine a statement is sent to."""
+
+        clause = kwargs.get("clause")
+        if self._flushing or getattr(clause, "is_dml", False):
+            self.wrote = True
+        elif (
+            self.router is not None
+            and not self.wrote
+            and not self.replica_failed
+            and isinstance(clause, Executable)
+            and clause.get_execution_options().get(REPLICA_OPTION)
+        ):
+            replica = self.router.choose()
+            if replica is not None:
+                self._replica = replica
+                return replica
+        return super().get_bind(mapper, **kwargs)
+
+
+def create_replica_engines(**kwargs: Any) -> list[Engine]:
+    """
+    Create sync engines of the read replicas in `POSTGRES_REPLICAS`.
+
+    Takes the same keyword arguments as `create_db_engine`.
+    """
+
+    connect_args = {"connect_timeout": REPLICA_CONNECT_TIMEOUT}
+    connect_args.update(kwargs.pop("connect_args", {}))
+    return [
+        create_db_engine(uri, connect_args=connect_args, **kwargs)
+        for uri in c.get_postgres_replica_uris()
+    ]
+
+
+def create_async_replica_engines(**kwargs: Any) -> list[AsyncEngine]:
+    """
+    Create async engines of the read replicas in `POSTGRES_REPLICAS`.
+
+    Takes the same keyword arguments as `create_db_engine`.
+    """
+
+    connect_args = {"connect_timeout": REPLICA_CONNECT_TIMEOUT}
+    connect_args.update(kwargs.pop("connect_args", {}))
+    return [
+        create_async_db_engine(uri, connect_args=connect_args, **kwargs)
+        for uri in c.get_postgres_replica_uris()
+    ]
+
+
+def create_session_factory(
+    engine: Engine, replicas: Sequence[Engine] = (), **kwargs: Any
+) -> sessionmaker[RoutingSession]:
+    """
+    Create a factory of sessions of the primary and its read replicas.
+
+    Args:
+        engine: Engine of the primary
+        replicas: Engines of the read replicas, if any
+        **kwargs: Other arguments of the sessions
+
+    Returns:
+        A factory of `RoutingSession`, called like `Session` without a bind.
+    """
+
+    router = ReplicaRouter(replicas) if replicas else None
+    return sessionmaker(engine, class_=RoutingSession, router=router, **kwargs)
+
+
+def create_async_session_factory(
+    engine: AsyncEngine, replicas: Sequence[AsyncEngine] = (), **kwargs: Any
+) -> async_sessionmaker[AsyncSession]:
+    """
+    Create a factory of async sessions of the primary and its read replicas.
+
+    Args:
+        engine: Engine of the primary
+        replicas: Engines of the read replicas, if any
+        **kwargs: Other arguments of the sessions
+
+    Returns:
+        A factory of `AsyncSession` proxying a `RoutingSession`, called like
+        `AsyncSession` without a bind.
+    """
+
+    router = (
+        ReplicaRouter([replica.sync_engine for replica in replicas])
+        if replicas
+        else None
+    )
+    return async_sessionmaker(
+        engine,
+        class_=AsyncSession,
+        sync_session_class=RoutingSession,
+        router=router,
+        **kwargs,
+    )
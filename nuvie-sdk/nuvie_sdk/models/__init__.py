@@ -2,6 +2,9 @@
 
 from .user import *
 from .patient import *
+from .patient_stats import *
+
+from enum import Enum
 
 from sqlmodel import SQLModel  # , Field
 
@@ -12,6 +15,17 @@ class Message(SQLModel):
     message: str
 
 
+class CountMode(str, Enum):
+    """How the total amount of items is counted when listing them."""
+
+    # Counting every row. Cached for a few seconds
+    EXACT = "exact"
+    # Reading the planner's estimate, as recent as the last (auto) ANALYZE
+    ESTIMATED = "estimated"
+    # Not counting at all
+    NONE = "none"
+
+
 class Token(SQLModel):
     """JSON payload containing access token."""
 
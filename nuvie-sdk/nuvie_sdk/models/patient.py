@@ -5,10 +5,18 @@ from decimal import Decimal
 from enum import Enum
 from uuid import UUID, uuid4
 
+import sqlalchemy as sa
+from pydantic import model_validator
 from sqlmodel import Field, SQLModel
 
 from .. import constants as c
 
+# Maximum amount of patients requested or written at once through the API
+MAX_BATCH_SIZE = c.PATIENTS_MAX_BATCH_SIZE
+
+# Sequence the versions of patients are taken from
+VERSION_SEQUENCE_NAME = "patients_version_seq"
+
 
 class MaritalStatus(str, Enum):
     """Marital status options."""
@@ -44,9 +52,9 @@ class Gender(str, Enum):
 class PatientBase(SQLModel):
     """Base model for Patient."""
 
-    birthdate: date = Field(nullable=False)
+    birthdate: date = Field(nullable=False, index=True)
     deathdate: date | None = Field(default=None, nullable=True)
-    ssn: str = Field(nullable=False, max_length=32)
+    ssn: str = Field(nullable=False, max_length=32, unique=True, index=True)
     drivers_license: str | None = Field(
         default=None, nullable=True, max_length=64
     )
@@ -62,10 +70,12 @@ class PatientBase(SQLModel):
     gender: Gender = Field(nullable=False)
     birthplace: str = Field(nullable=False, max_length=128)
     address: str = Field(nullable=False, max_length=256)
-    city: str = Field(nullable=False, max_length=64)
-    state: str = Field(nullable=False, max_length=64)
-    county: str = Field(nullable=False, max_length=64)
-    zip: str | None = Field(default=None, nullable=True, max_length=16)
+    city: str = Field(nullable=False, max_length=64, index=True)
+    state: str = Field(nullable=False, max_length=64, index=True)
+    county: str = Field(nullable=False, max_length=64, index=True)
+    zip: str | None = Field(
+        default=None, nullable=True, max_length=16, index=True
+    )
     lat: Decimal = Field(nullable=False, decimal_places=4, max_digits=12)
     lon: Decimal = Field(nullable=False, decimal_places=4, max_digits=12)
     healthcare_expenses: Decimal = Field(
@@ -115,17 +125,131 @@ class PatientUpdate(SQLModel):
     )
 
 
+class PatientBulkUpdate(PatientUpdate):
+    """Properties to receive via API on bulk updates, ID always required."""
+
+    id: UUID
+
+    @model_validator(mode="after")
+    def check_required_fields(self) -> "PatientBulkUpdate":
+        """Ensures required fields aren't set to null."""
+
+        for name in self.model_fields_set:
+            field = PatientBase.model_fields.get(name)
+            if (
+                getattr(self, name) is None
+                and field is not None
+                and field.is_required()
+            ):
+                raise ValueError(f"`{name}` can't be null")
+        return self
+
+
 class PatientPublic(PatientBase):
     """Properties to return via API, ID always required."""
 
     id: UUID
+    version: int
 
 
 class PatientsPublic(SQLModel):
     """Properties to return via API, for multiple patients."""
 
     data: list[PatientPublic]
-    count: int
+    # None when not counted
+    count: int | None
+    # Cursor to request the page after this one with, if it was full
+    next_cursor: str | None = None
+
+
+class PatientFilters(SQLModel):
+    """Criteria patients must all match to be listed, all optional."""
+
+    state: str | None = None
+    city: str | None = None
+    county: str | None = None
+    zip: str | None = None
+    gender: Gender | None = None
+    race: Race | None = None
+    ethnicity: Ethnicity | None = None
+    # Inclusive range of birthdates
+    born_after: date | None = None
+    born_before: date | None = None
+    # Whether patients have a deathdate
+    deceased: bool | None = None
+    # Case-insensitive start of the last name
+    last_name_prefix: str | None = Field(default=None, max_length=128)
+
+
+class PatientsBatchGet(SQLModel):
+    """Keys of the patients to retrieve at once, either IDs or SSNs."""
+
+    ids: list[UUID] | None = Field(default=None, max_length=MAX_BATCH_SIZE)
+    ssns: list[str] | None = Field(default=None, max_length=MAX_BATCH_SIZE)
+
+    @model_validator(mode="after")
+    def check_one_key(self) -> "PatientsBatchGet":
+        """Ensures exactly one kind of key is given."""
+
+        if (self.ids is None) == (self.ssns is None):
+            raise ValueError("Exactly one of `ids` and `ssns` must be given")
+        return self
+
+
+class PatientsBatchPublic(SQLModel):
+    """
+    Patients retrieved at once, to return via API.
+
+    `data` has one entry per key requested, in the same order, which is None
+    for keys with no patient. Those keys are also listed in `missing`.
+    """
+
+    data: list[PatientPublic | None]
+    missing: list[UUID | str]
+
+
+class BulkStatus(str, Enum):
+    """Outcome of each item of a bulk operation on patients."""
+
+    CREATED = "created"
+    UPDATED = "updated"
+    DELETED = "deleted"
+    SKIPPED = "skipped"
+    CONFLICT = "conflict"
+    NOT_FOUND = "not_found"
+
+
+class PatientsBulkResult(SQLModel):
+    """
+    Result of a bulk operation on patients.
+
+    `statuses` has one entry per item received, in the same order.
+    """
+
+    created: int = 0
+    updated: int = 0
+    deleted: int = 0
+    skipped: int = 0
+    conflicts: int = 0
+    not_found: int = 0
+    statuses: list[BulkStatus] = Field(default_factory=list)
+
+    def add(self, status: BulkStatus) -> None:
+        """Records the outcome of the next item."""
+
+        self.statuses.append(status)
+        if status == BulkStatus.CREATED:
+            self.created += 1
+        elif status == BulkStatus.UPDATED:
+            self.updated += 1
+        elif status == BulkStatus.DELETED:
+            self.deleted += 1
+        elif status == BulkStatus.SKIPPED:
+            self.skipped += 1
+        elif status == BulkStatus.CONFLICT:
+            self.conflicts += 1
+        else:
+            self.not_found += 1
 
 
 class Patient(PatientBase, table=True):
@@ -137,6 +261,25 @@ class Patient(PatientBase, table=True):
     """
 
     __tablename__ = c.PATIENT_TABLE_NAME  # type: ignore
-    __table_args__ = {"extend_existing": True}
+    __table_args__ = (
+        # For searches by start of last name, whatever the DB's collation
+        sa.Index(
+            "ix_patients_last_lower",
+            sa.text("lower(last) text_pattern_ops"),
+        ),
+        {"extend_existing": True},
+    )
 
     id: UUID = Field(default_factory=uuid4, primary_key=True, nullable=False)
+    # Set by the DB from the patients_version_seq sequence on insert, and
+    # again by a trigger on every update that changes the row. None until
+    # inserted
+    version: int | None = Field(
+        default=None,
+        sa_column=sa.Column(
+            sa.BigInteger,
+            nullable=False,
+            server_default=sa.text(f"nextval('{VERSION_SEQUENCE_NAME}')"),
+            server_onupdate=sa.FetchedValue(),
+        ),
+    )
@@ -0,0 +1,73 @@
+"""Contains models of statistics about patients."""
+
+from decimal import Decimal
+from enum import Enum
+
+from sqlmodel import SQLModel
+
+
+class PatientGroupBy(str, Enum):
+    """Fields patients can be grouped by in statistics."""
+
+    STATE = "state"
+    CITY = "city"
+    COUNTY = "county"
+    ZIP = "zip"
+    GENDER = "gender"
+    RACE = "race"
+    ETHNICITY = "ethnicity"
+    MARITAL = "marital"
+
+
+class PatientGroupCount(SQLModel):
+    """Amount of patients sharing a value of a field."""
+
+    # None for patients without a value
+    value: str | None
+    count: int
+
+
+class PatientGroupCounts(SQLModel):
+    """Amount of patients per value of a field, from most to least common."""
+
+    group_by: PatientGroupBy
+    data: list[PatientGroupCount]
+
+
+class AgeBucket(SQLModel):
+    """Amount of patients whose age is within a range."""
+
+    # Inclusive lower and exclusive upper bounds of the ages, in years
+    min_age: int
+    max_age: int
+    count: int
+
+
+class AgeDistribution(SQLModel):
+    """
+    Amount of patients per range of ages, from youngest to oldest.
+
+    The age of deceased patients is their age at death.
+    """
+
+    bucket_size: int
+    data: list[AgeBucket]
+
+
+class HealthcareStats(SQLModel):
+    """Sums and averages of the healthcare costs of a group of patients."""
+
+    # None when patients aren't grouped, or for patients without a value
+    value: str | None = None
+    count: int
+    expenses_sum: Decimal
+    expenses_avg: Decimal
+    coverage_sum: Decimal
+    coverage_avg: Decimal
+
+
+class HealthcareStatsGroups(SQLModel):
+    """Healthcare costs of patients, per value of a field or overall."""
+
+    group_by: PatientGroupBy | None = None
+    data: list[HealthcareStats]
@@ -54,7 +54,8 @@ class UsersPublic(SQLModel):
     """Properties to return via API, for multiple users."""
 
     data: list[UserPublic]
-    count: int
+    # None when not counted
+    count: int | None
 
 
 class User(UserBase, table=True):
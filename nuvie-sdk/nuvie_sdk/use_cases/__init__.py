@@ -1,4 +1,13 @@
 """This file contains the use cases used in the Nuvie SDK."""
 
 from .patient_use_case import *
+from .patient_stats_use_case import *
 from .user_use_case import *
+
+# Async use cases have the same names as the sync ones, so they are only
+# exposed as modules
+from . import async_patient_use_case as async_patient_use_case
+from . import (
+    async_patient_stats_use_case as async_patient_stats_use_case,
+)
+from . import async_user_use_case as async_user_use_case
@@ -0,0 +1,131 @@
+"""
+Counting of the rows of tables, shared by the sync and async use cases.
+
+Exact counts scan the whole table, so they are cached for `COUNT_CACHE_TTL`
+seconds, and invalidated by use cases that add or remove rows. Estimated counts
+come from the planner's statistics in `pg_class`, which are instant to read.
+
+Counts of the rows matching some filters are cached too, each under its own
+key. Invalidating a table's counts bumps its generation, which is part of
+every key, so that all of them are dropped at once.
+"""
+
+from collections.abc import Hashable, Sequence
+from itertools import count as counter
+from typing import Any
+
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+from sqlmodel import Session, SQLModel, func, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from .. import constants as c
+from ..cache import TTLCache
+from ..db import on_replica
+from ..models import CountMode
+
+# Exact counts, by table name, generation and filters
+count_cache: TTLCache[int] = TTLCache(ttl=c.COUNT_CACHE_TTL)
+
+# Generation of the cached counts of each table
+_generations: dict[str, int] = {}
+_next_generation = counter(1)
+
+
+def _table_name(model: type[SQLModel]) -> str:
+    return model.__tablename__  # type: ignore
+
+
+def _cache_key(model: type[SQLModel], key: Hashable) -> Hashable:
+    table_name = _table_name(model)
+    return (table_name, _generations.get(table_name, 0), key)
+
+
+def _exact_count_statement(model: type[SQLModel], where: Sequence[Any]) -> Any:
+    return on_replica(select(func.count()).select_from(model).where(*where))
+
+
+def _estimated_count_statement(model: type[SQLModel]) -> Any:
+    # reltuples is -1 for tables that were never analyzed
+    return on_replica(
+        select(sa.cast(sa.column("reltuples"), sa.BigInteger))
+        .select_from(sa.table("pg_class"))
+        .where(
+            sa.column("oid")
+            == sa.cast(sa.literal(_table_name(model)), postgresql.REGCLASS)
+        )
+    )
+
+
+def invalidate_count(model: type[SQLModel]) -> None:
+    """Drop the cached exact counts of a table, after adding/removing rows."""
+
+    _generations[_table_name(model)] = next(_next_generation)
+
+
+def count_rows(
+    *,
+    session: Session,
+    model: type[SQLModel],
+    mode: CountMode,
+    where: Sequence[Any] = (),
+    key: Hashable = None,
+) -> int | None:
+    """
+    Count the rows of a model's table.
+
+    Args:
+        session: DB session
+        model: Table model to count the rows of
+        mode: How to count. Tables without statistics yet, and filtered rows,
+            are counted exactly even when an estimate is requested
+        where: Clauses the rows counted must match
+        key: Identifies the clauses of `where` in the cache. Required when
+            `where` isn't empty
+
+    Returns:
+        The amount of rows, or None if `mode` is "none".
+    """
+
+    if mode == CountMode.NONE:
+        return None
+    if mode == CountMode.ESTIMATED and not where:
+        estimate = session.exec(_estimated_count_statement(model)).one()
+        if estimate >= 0:
+            return estimate
+
+    cache_key = _cache_key(model, key)
+    count = count_cache.get(cache_key)
+    if count is None:
+        count = session.exec(_exact_count_statement(model, where)).one()
+        count_cache.set(cache_key, count)
+    return count
+
+
+async def count_rows_async(
+    *,
+    session: AsyncSession,
+    model: type[SQLModel],
+    mode: CountMode,
+    where: Sequence[Any] = (),
+    key: Hashable = None,
+) -> int | None:
+    """Count the rows of a model's table. See `count_rows`."""
+
+    if mode == CountMode.NONE:
+        return None
+    if mode == CountMode.ESTIMATED and not where:
+        estimate = (
+            await session.exec(_estimated_count_statement(model))
+        ).one()
+        if estimate >= 0:
+            return estimate
+
+    cache_key = _cache_key(model, key)
+    count = count_cache.get(cache_key)
+    if count is None:
+        count = (
+            await session.exec(_exact_count_statement(model, where))
+        ).one()
+        count_cache.set(cache_key, count)
+    return count
@@ -0,0 +1,170 @@
+"""
+Caches of failed logins, shared by the sync and async use cases.
+
+Logins are rejected without querying the DB nor running bcrypt when the exact
+same credentials already failed in the last `LOGIN_FAILURE_WINDOW` seconds.
+Once an account failed `LOGIN_MAX_FAILURES` times within that window, its
+passwords are only checked once every `LOGIN_THROTTLE_INTERVAL` seconds, and
+other logins are rejected with a `LoginThrottledError` until then. Trying a
+new password each time then costs a single bcrypt run per interval, while the
+owner of the account can still log in with the correct password once the
+interval is over. Emails that don't belong to any user are cached for
+`UNKNOWN_EMAIL_CACHE_TTL` seconds, to skip the DB, but a password is still
+verified against a dummy hash, so that response times don't reveal which
+emails exist.
+
+Failed credentials are only stored as HMACs, keyed with a secret that lives in
+the memory of the process. Entries of an email are invalidated by the use
+cases that create users, or change their email or password.
+"""
+
+import hashlib
+import hmac
+import secrets
+import time
+
+from threading import Lock
+
+from .. import constants as c
+from ..auth import get_password_hash, get_password_hash_async
+from ..cache import TTLCache
+
+# Maximum amount of failed credentials remembered per email
+_MAX_FAILED_CREDENTIALS = 32
+
+_hmac_key = secrets.token_bytes(32)
+
+# Emails that don't belong to any user
+unknown_email_cache: TTLCache[bool] = TTLCache(
+    ttl=c.UNKNOWN_EMAIL_CACHE_TTL, maxsize=c.LOGIN_CACHE_SIZE
+)
+# HMACs of the passwords that failed, by email
+failed_credentials_cache: TTLCache[frozenset[bytes]] = TTLCache(
+    ttl=c.LOGIN_FAILURE_WINDOW, maxsize=c.LOGIN_CACHE_SIZE
+)
+# Amount of passwords that failed in the window, by email
+failure_count_cache: TTLCache[int] = TTLCache(
+    ttl=c.LOGIN_FAILURE_WINDOW, maxsize=c.LOGIN_CACHE_SIZE
+)
+# When the password of each throttled email was last checked
+_last_check_cache: TTLCache[float] = TTLCache(
+    ttl=c.LOGIN_THROTTLE_INTERVAL, maxsize=c.LOGIN_CACHE_SIZE
+)
+_throttle_lock = Lock()
+
+# Hash of a random password, made on first use
+_dummy_password_hash: str | None = None
+
+
+def get_dummy_password_hash() -> str:
+    """Get a hash to verify passwords of unknown emails against."""
+
+    global _dummy_password_hash
+
+    if _dummy_password_hash is None:
+        _dummy_password_hash = get_password_hash(secrets.token_urlsafe(16))
+    return _dummy_password_hash
+
+
+async def get_dummy_password_hash_async() -> str:
+    """Get the same dummy hash, hashing it off the loop the first time."""
+
+    global _dummy_password_hash
+
+    if _dummy_password_hash is None:
+        _dummy_password_hash = await get_password_hash_async(
+            secrets.token_urlsafe(16)
+        )
+    return _dummy_password_hash
+
+
+class LoginThrottledError(Exception):
+    """Raised when the password of an account can't be checked yet."""
+
+    def __init__(self, retry_after: float) -> None:
+        super().__init__(
+            f"Too many failed logins, retry in {retry_after:.0f} seconds"
+        )
+        # Seconds until the password of the account can be checked again
+        self.retry_after = retry_after
+
+
+def _credentials_hmac(email: str, password: str) -> bytes:
+    return hmac.digest(
+        _hmac_key, f"{email}\0{password}".encode(), hashlib.sha256
+    )
+
+
+def is_login_rejected(email: str, password: str) -> bool:
+    """
+    Whether a login can be rejected right away.
+
+    Doesn't extend how long the credentials are remembered for, so that
+    retrying them doesn't keep them rejected past the window.
+
+    Returns:
+        True if these exact credentials already failed recently.
+    """
+
+    failed = failed_credentials_cache.get(email)
+    return failed is not None and _credentials_hmac(email, password) in failed
+
+
+def check_login_throttle(email: str) -> None:
+    """
+    Claim the check of a password, for accounts that keep failing.
+
+    Once an account failed `LOGIN_MAX_FAILURES` times in the window, only one
+    of its passwords is checked per `LOGIN_THROTTLE_INTERVAL`. Rejected logins
+    aren't counted as failures, and don't delay the next check.
+
+    Raises:
+        LoginThrottledError: If a password of this account was already checked
+            in the interval
+    """
+
+    if failure_count_cache.get(email, 0) < c.LOGIN_MAX_FAILURES:
+        return
+
+    with _throttle_lock:
+        checked_at = _last_check_cache.get(email)
+        now = time.monotonic()
+        if checked_at is not None:
+            raise LoginThrottledError(
+                max(checked_at + c.LOGIN_THROTTLE_INTERVAL - now, 0.0)
+            )
+        _last_check_cache.set(email, now)
+
+
+def record_login_failure(email: str, password: str) -> None:
+    """Remember credentials that failed, once their password was checked."""
+
+    failure_count_cache.set(email, failure_count_cache.get(email, 0) + 1)
+
+    failed = failed_credentials_cache.get(email, frozenset())
+    if len(failed) >= _MAX_FAILED_CREDENTIALS:
+        failed = frozenset()
+    failed_credentials_cache.set(
+        email, failed | {_credentials_hmac(email, password)}
+    )
+
+
+def record_login_success(email: str) -> None:
+    """Stop throttling an account, once its correct password was given."""
+
+    failure_count_cache.delete(email)
+    _last_check_cache.delete(email)
+
+
+def invalidate_login(email: str) -> None:
+    """
+    Forget everything about the logins of an email.
+
+    To be called when a user is created with it, or when a user's email or
+    password changes, so that previously failed credentials may succeed.
+    """
+
+    unknown_email_cache.delete(email)
+    failed_credentials_cache.delete(email)
+    failure_count_cache.delete(email)
+    _last_check_cache.delete(email)
@@ -0,0 +1,148 @@
+"""
+Statements and helpers shared by the sync and async patient use cases.
+
+Only building statements and converting their results is shared, while
+executing them is left to each use case, with its own kind of session.
+"""
+
+from collections.abc import Iterable, Sequence
+from typing import Any, Literal
+from uuid import UUID
+
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+from sqlmodel import col, select
+
+from ..db import on_replica
+from ..models import Patient, PatientFilters, PatientPublic
+
+
+def any_of(values: list, item_type: Any) -> Any:
+    """Wraps a list as `ANY(:array)`, sent as a single array parameter."""
+
+    return sa.any_(sa.literal(values, postgresql.ARRAY(item_type)))
+
+
+def in_key_order(
+    patients: Iterable[Patient], keys: list[Any], key: Literal["id", "ssn"]
+) -> list[Patient | None]:
+    """Orders patients like the keys they were fetched by, None if missing."""
+
+    patient_by_key = {getattr(patient, key): patient for patient in patients}
+    return [patient_by_key.get(value) for value in keys]
+
+
+# Filters matched exactly against the column of the same name
+_EQUALITY_FILTERS = (
+    "state",
+    "city",
+    "county",
+    "zip",
+    "gender",
+    "race",
+    "ethnicity",
+)
+
+
+def _escape_like(value: str) -> str:
+    """Escapes the wildcards of a LIKE pattern, with backslashes."""
+
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def filter_clauses(filters: PatientFilters | None) -> list[Any]:
+    """Converts filters into WHERE clauses, all indexed except enum ones."""
+
+    if filters is None:
+        return []
+
+    clauses: list[Any] = []
+    for field in _EQUALITY_FILTERS:
+        value = getattr(filters, field)
+        if value is not None:
+            clauses.append(getattr(Patient, field) == value)
+    if filters.born_after is not None:
+        clauses.append(Patient.birthdate >= filters.born_after)
+    if filters.born_before is not None:
+        clauses.append(Patient.birthdate <= filters.born_before)
+    if filters.deceased is not None:
+        deathdate = col(Patient.deathdate)
+        clauses.append(
+            deathdate.is_not(None) if filters.deceased else deathdate.is_(None)
+        )
+    if filters.last_name_prefix:
+        # Matches the expression of the `lower(last) text_pattern_ops` index
+        pattern = _escape_like(filters.last_name_prefix.lower()) + "%"
+        clauses.append(sa.func.lower(Patient.last).like(pattern, escape="\\"))
+    return clauses
+
+
+def filters_key(filters: PatientFilters | None) -> Any:
+    """Identifies filters in the counts cache."""
+
+    if filters is None:
+        return None
+    return tuple(sorted(filters.model_dump(exclude_none=True).items())) or None
+
+
+def rows_statement(
+    skip: int,
+    after: UUID | None,
+    limit: int,
+    filters: PatientFilters | None,
+    columns: Sequence[Any] | None = None,
+) -> Any:
+    """
+    Selects a page of patients as plain rows.
+
+    Pages like `get_patients`, or like `get_patients_after` when `after` is
+    given.
+
+    Args:
+        skip: Amount of patients to skip
+        after: ID of the last patient of the previous page, or None
+        limit: Maximum amount of patients to select
+        filters: Criteria the patients must match
+        columns: Columns to select. Those of `PatientPublic` when None
+    """
+
+    if columns is None:
+        # Only the columns returned via API, in the same order
+        table = Patient.__table__  # type: ignore
+        columns = [table.c[name] for name in PatientPublic.model_fields]
+    statement = (
+        select(*columns)
+        .where(*filter_clauses(filters))
+        .order_by(Patient.id)
+        .offset(skip)
+        .limit(limit)
+    )
+    if after is not None:
+        statement = statement.where(Patient.id > after)
+    return on_replica(statement)
+
+
+def to_plain_rows(result: Any) -> list[dict[str, Any]]:
+    """Converts rows into dicts, and their enum members into values."""
+
+    # Enums are much slower to serialize than the strings they stand for
+    enum_columns = [
+        column.name
+        for column in Patient.__table__.columns  # type: ignore
+        if isinstance(column.type, sa.Enum)
+    ]
+    rows = [dict(row) for row in result.mappings()]
+    for row in rows:
+        for name in enum_columns:
+            if row[name] is not None:
+                row[name] = row[name].value
+    return rows
+
+
+def stream_statement() -> Any:
+    """Selects every patient, ordered by ID, for streaming."""
+
+    # Plain rows instead of ORM objects, which are much cheaper to build
+    return select(*Patient.__table__.columns).order_by(  # type: ignore
+        Patient.id
+    )
@@ -0,0 +1,147 @@
+"""
+Statements, helpers and cache shared by the sync and async patient stats.
+
+Both kinds of use cases read and fill the same cache of results.
+"""
+
+from collections.abc import Hashable
+from decimal import Decimal
+from enum import Enum
+from typing import Any
+
+import sqlalchemy as sa
+from sqlmodel import col, func, select
+
+from ._patient_queries import filter_clauses, filters_key
+from .. import constants as c
+from ..cache import TTLCache
+from ..models import (
+    AgeBucket,
+    AgeDistribution,
+    HealthcareStats,
+    HealthcareStatsGroups,
+    Patient,
+    PatientFilters,
+    PatientGroupBy,
+    PatientGroupCount,
+    PatientGroupCounts,
+)
+
+# Results of statistics, by kind, parameters and filters
+stats_cache: TTLCache[Any] = TTLCache(ttl=c.STATS_CACHE_TTL)
+
+# Widest range of ages grouped together, in years
+MAX_AGE_BUCKET_SIZE = 100
+
+
+def stats_key(
+    kind: str, parameter: Any, filters: PatientFilters | None
+) -> Hashable:
+    return (kind, parameter, filters_key(filters))
+
+
+def _group_value(value: Any) -> str | None:
+    """Converts a value of a grouped field, stored as an enum or not."""
+
+    return value.value if isinstance(value, Enum) else value
+
+
+def _group_column(group_by: PatientGroupBy) -> Any:
+    return getattr(Patient, group_by.value)
+
+
+def group_counts_statement(
+    group_by: PatientGroupBy, filters: PatientFilters | None
+) -> Any:
+    column = _group_column(group_by)
+    count = func.count().label("count")
+    return (
+        select(column, count)
+        .where(*filter_clauses(filters))
+        .group_by(column)
+        .order_by(count.desc(), column)
+    )
+
+
+def to_group_counts(group_by: PatientGroupBy, rows: Any) -> PatientGroupCounts:
+    return PatientGroupCounts(
+        group_by=group_by,
+        data=[
+            PatientGroupCount(value=_group_value(value), count=count)
+            for value, count in rows
+        ],
+    )
+
+
+def age_distribution_statement(
+    bucket_size: int, filters: PatientFilters | None
+) -> Any:
+    if not 1 <= bucket_size <= MAX_AGE_BUCKET_SIZE:
+        raise ValueError(
+            f"`bucket_size` must be between 1 and {MAX_AGE_BUCKET_SIZE}"
+        )
+
+    # Age at death for deceased patients, current age for the others
+    end = func.coalesce(Patient.deathdate, sa.func.current_date())
+    age = sa.extract("year", func.age(end, Patient.birthdate))
+    # Inlined, since a bound parameter would make the grouped expression
+    # differ from the selected one
+    size = sa.literal_column(str(int(bucket_size)))
+    min_age = sa.cast(func.floor(age / size) * size, sa.Integer)
+    return (
+        select(min_age.label("min_age"), func.count().label("count"))
+        .where(*filter_clauses(filters))
+        .group_by(sa.literal_column("min_age"))
+        .order_by(sa.literal_column("min_age"))
+    )
+
+
+def to_age_distribution(bucket_size: int, rows: Any) -> AgeDistribution:
+    return AgeDistribution(
+        bucket_size=bucket_size,
+        data=[
+            AgeBucket(
+                min_age=min_age, max_age=min_age + bucket_size, count=count
+            )
+            for min_age, count in rows
+        ],
+    )
+
+
+def healthcare_statement(
+    group_by: PatientGroupBy | None, filters: PatientFilters | None
+) -> Any:
+    expenses = col(Patient.healthcare_expenses)
+    coverage = col(Patient.healthcare_coverage)
+    zero = sa.literal(Decimal(0))
+    aggregates = [
+        func.count().label("count"),
+        func.coalesce(func.sum(expenses), zero).label("expenses_sum"),
+        func.coalesce(func.round(func.avg(expenses), 2), zero).label(
+            "expenses_avg"
+        ),
+        func.coalesce(func.sum(coverage), zero).label("coverage_sum"),
+        func.coalesce(func.round(func.avg(coverage), 2), zero).label(
+            "coverage_avg"
+        ),
+    ]
+    statement = select(*aggregates).where(*filter_clauses(filters))
+    if group_by is not None:
+        column = _group_column(group_by)
+        statement = (
+            statement.add_columns(column.label("value"))
+            .group_by(column)
+            .order_by(func.count().desc(), column)
+        )
+    return statement
+
+
+def to_healthcare_stats(
+    group_by: PatientGroupBy | None, rows: Any
+) -> HealthcareStatsGroups:
+    data = []
+    for row in rows:
+        stats = dict(row._mapping)
+        stats["value"] = _group_value(stats.get("value"))
+        data.append(HealthcareStats.model_validate(stats))
+    return HealthcareStatsGroups(group_by=group_by, data=data)
@@ -0,0 +1,65 @@
+"""
+Cache of the users loaded by authenticated requests.
+
+Every authenticated request loads its user, so snapshots of users are cached
+for `USER_CACHE_TTL` seconds, and invalidated by the use cases that modify or
+delete users. Snapshots are plain dictionaries of the user's columns, so that
+the in-process backend can be swapped for one shared between processes with
+`set_user_cache_backend`.
+"""
+
+from typing import Any
+
+from sqlalchemy.orm import make_transient_to_detached
+
+from .. import constants as c
+from ..cache import CacheBackend, TTLCache
+from ..models import User
+
+_backend: CacheBackend[dict[str, Any]] = TTLCache(
+    ttl=c.USER_CACHE_TTL, maxsize=c.USER_CACHE_SIZE
+)
+
+
+def set_user_cache_backend(backend: CacheBackend[dict[str, Any]]) -> None:
+    """Replace the backend of the users cache, e.g. with a shared one."""
+
+    global _backend
+    _backend = backend
+
+
+def get_user_cache_backend() -> CacheBackend[dict[str, Any]]:
+    """Get the backend of the users cache."""
+
+    return _backend
+
+
+def get_cached_user(user_id: int) -> User | None:
+    """
+    Get the cached snapshot of a user.
+
+    Returns:
+        A detached user, to be merged into a session with `load=False`, or
+        None if the user isn't cached.
+    """
+
+    snapshot = _backend.get(user_id)
+    if snapshot is None:
+        return None
+
+    user = User.model_validate(snapshot)
+    make_transient_to_detached(user)
+    return user
+
+
+def cache_user(user: User) -> None:
+    """Store a snapshot of a user loaded from the DB."""
+
+    _backend.set(user.id, user.model_dump())
+
+
+def invalidate_user(user_id: int | None) -> None:
+    """Drop the cached snapshot of a user, after modifying or deleting it."""
+
+    if user_id is not None:
+        _backend.delete(user_id)
@@ -0,0 +1,85 @@
+"""
+Implementation of statistics about patients, for async sessions.
+
+Mirrors `patient_stats_use_case`, with the same functions taking an
+`AsyncSession` instead of a `Session`, and sharing its cache.
+"""
+
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from ._patient_stats_queries import (
+    age_distribution_statement,
+    group_counts_statement,
+    healthcare_statement,
+    stats_cache,
+    stats_key,
+    to_age_distribution,
+    to_group_counts,
+    to_healthcare_stats,
+)
+from ..models import (
+    AgeDistribution,
+    HealthcareStatsGroups,
+    PatientFilters,
+    PatientGroupBy,
+    PatientGroupCounts,
+)
+
+
+async def count_patients_by(
+    *,
+    session: AsyncSession,
+    group_by: PatientGroupBy,
+    filters: PatientFilters | None = None,
+) -> PatientGroupCounts:
+    """Count patients per value of a field."""
+
+    key = stats_key("counts", group_by, filters)
+    result = stats_cache.get(key)
+    if result is None:
+        statement = group_counts_statement(group_by, filters)
+        rows = (await session.exec(statement)).all()
+        result = to_group_counts(group_by, rows)
+        stats_cache.set(key, result)
+    return result
+
+
+async def get_age_distribution(
+    *,
+    session: AsyncSession,
+    bucket_size: int = 10,
+    filters: PatientFilters | None = None,
+) -> AgeDistribution:
+    """
+    Count patients per range of ages.
+
+    Raises:
+        ValueError: If `bucket_size` is out of bounds.
+    """
+
+    key = stats_key("ages", bucket_size, filters)
+    result = stats_cache.get(key)
+    if result is None:
+        statement = age_distribution_statement(bucket_size, filters)
+        rows = (await session.exec(statement)).all()
+        result = to_age_distribution(bucket_size, rows)
+        stats_cache.set(key, result)
+    return result
+
+
+async def get_healthcare_stats(
+    *,
+    session: AsyncSession,
+    group_by: PatientGroupBy | None = None,
+    filters: PatientFilters | None = None,
+) -> HealthcareStatsGroups:
+    """Sum and average the healthcare expenses and coverage of patients."""
+
+    key = stats_key("healthcare", group_by, filters)
+    result = stats_cache.get(key)
+    if result is None:
+        statement = healthcare_statement(group_by, filters)
+        rows = (await session.exec(statement)).all()
+        result = to_healthcare_stats(group_by, rows)
+        stats_cache.set(key, result)
+    return result
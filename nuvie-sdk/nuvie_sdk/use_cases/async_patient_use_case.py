@@ -0,0 +1,360 @@
+"""
+Implementation of patient-related use cases (CRUD), for async sessions.
+
+Mirrors `patient_use_case`, with the same functions taking an `AsyncSession`
+instead of a `Session`.
+"""
+
+from collections.abc import AsyncIterator, Iterable, Sequence
+from typing import Any, Literal
+from uuid import UUID
+
+import sqlalchemy as sa
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from . import patient_use_case
+from ._counts import count_rows_async, invalidate_count
+from ._patient_queries import (
+    any_of,
+    filter_clauses,
+    filters_key,
+    in_key_order,
+    rows_statement,
+    stream_statement,
+    to_plain_rows,
+)
+from ..db import on_replica
+from ..models import (
+    CountMode,
+    Patient,
+    PatientCreate,
+    PatientBulkUpdate,
+    PatientFilters,
+    PatientsBulkResult,
+    PatientUpdate,
+)
+
+
+async def create_patient(
+    *, session: AsyncSession, patient_create: PatientCreate
+) -> Patient:
+    """Create a new patient."""
+
+    db_obj = Patient.model_validate(patient_create)
+    session.add(db_obj)
+    await session.commit()
+    invalidate_count(Patient)
+    await session.refresh(db_obj)
+    return db_obj
+
+
+async def get_patient_by_id(
+    *, session: AsyncSession, patient_id: UUID, replica: bool = False
+) -> Patient | None:
+    """
+    Get a patient by ID.
+
+    Read from the primary unless `replica` is set, so that lookups that
+    precede a write see the latest data, not a lagging replica's.
+    """
+
+    statement = select(Patient).where(Patient.id == patient_id)
+    if replica:
+        statement = on_replica(statement)
+    patient = (await session.exec(statement)).first()
+    return patient
+
+
+async def get_patient_version(
+    *, session: AsyncSession, patient_id: UUID
+) -> int | None:
+    """Get only the version of a patient, or None if there is no patient."""
+
+    statement = select(Patient.version).where(Patient.id == patient_id)
+    return (await session.exec(on_replica(statement))).first()
+
+
+async def get_patient_by_ssn(
+    *, session: AsyncSession, ssn: str, replica: bool = False
+) -> Patient | None:
+    """
+    Get a patient by SSN.
+
+    Read from the primary unless `replica` is set, like `get_patient_by_id`.
+    """
+
+    statement = select(Patient).where(Patient.ssn == ssn)
+    if replica:
+        statement = on_replica(statement)
+    patient = (await session.exec(statement)).first()
+    return patient
+
+
+async def get_patients_by_ids(
+    *, session: AsyncSession, patient_ids: list[UUID]
+) -> list[Patient | None]:
+    """
+    Get many patients by ID, with a single `= ANY(:ids)` query.
+
+    See `patient_use_case.get_patients_by_ids`.
+    """
+
+    statement = select(Patient).where(
+        Patient.id == any_of(patient_ids, sa.Uuid)
+    )
+    patients = (await session.exec(statement)).all()
+    return in_key_order(patients, patient_ids, "id")
+
+
+async def get_patients_by_ssns(
+    *, session: AsyncSession, ssns: list[str]
+) -> list[Patient | None]:
+    """
+    Get many patients by SSN, with a single `= ANY(:ssns)` query.
+
+    See `patient_use_case.get_patients_by_ssns`.
+    """
+
+    statement = select(Patient).where(Patient.ssn == any_of(ssns, sa.String))
+    patients = (await session.exec(statement)).all()
+    return in_key_order(patients, ssns, "ssn")
+
+
+async def get_patients(
+    *,
+    session: AsyncSession,
+    skip: int = 0,
+    limit: int = 100,
+    filters: PatientFilters | None = None,
+) -> list[Patient]:
+    """Get multiple patients with pagination, ordered by ID."""
+
+    statement = (
+        select(Patient)
+        .where(*filter_clauses(filters))
+        .order_by(Patient.id)
+        .offset(skip)
+        .limit(limit)
+    )
+    patients = (await session.exec(on_replica(statement))).all()
+    return list(patients)
+
+
+async def get_patients_after(
+    *,
+    session: AsyncSession,
+    after: UUID | None = None,
+    limit: int = 100,
+    filters: PatientFilters | None = None,
+) -> list[Patient]:
+    """
+    Get multiple patients with keyset pagination, ordered by ID.
+
+    See `patient_use_case.get_patients_after`.
+    """
+
+    statement = (
+        select(Patient)
+        .where(*filter_clauses(filters))
+        .order_by(Patient.id)
+        .limit(limit)
+    )
+    if after is not None:
+        statement = statement.where(Patient.id > after)
+    patients = (await session.exec(on_replica(statement))).all()
+    return list(patients)
+
+
+async def get_patient_rows(
+    *,
+    session: AsyncSession,
+    skip: int = 0,
+    after: UUID | None = None,
+    limit: int = 100,
+    filters: PatientFilters | None = None,
+) -> list[dict[str, Any]]:
+    """
+    Get multiple patients as plain rows, ordered by ID.
+
+    See `patient_use_case.get_patient_rows`.
+    """
+
+    statement = rows_statement(skip, after, limit, filters)
+    result = await session.execute(statement)
+    return to_plain_rows(result)
+
+
+async def get_patient_versions(
+    *,
+    session: AsyncSession,
+    skip: int = 0,
+    after: UUID | None = None,
+    limit: int = 100,
+    filters: PatientFilters | None = None,
+) -> list[tuple[UUID, int]]:
+    """
+    Get only the IDs and versions of multiple patients, ordered by ID.
+
+    See `patient_use_case.get_patient_versions`.
+    """
+
+    statement = rows_statement(
+        skip, after, limit, filters, columns=[Patient.id, Patient.version]
+    )
+    result = await session.execute(statement)
+    return [(row.id, row.version) for row in result]
+
+
+async def stream_patients(
+    *, session: AsyncSession, batch_size: int = 1000
+) -> AsyncIterator[Sequence[sa.RowMapping]]:
+    """
+    Stream every patient, ordered by ID, in batches of plain rows.
+
+    See `patient_use_case.stream_patients`.
+    """
+
+    result = await session.stream(
+        stream_statement(),
+        execution_options={"yield_per": batch_size},
+    )
+    async for rows in result.mappings().partitions():
+        yield rows
+
+
+async def update_patient(
+    *, session: AsyncSession, db_patient: Patient, patient_in: PatientUpdate
+) -> Any:
+    """Update an existing patient."""
+
+    patient_data = patient_in.model_dump(exclude_unset=True)
+    db_patient.sqlmodel_update(patient_data)
+    session.add(db_patient)
+    await session.commit()
+    # Filtered counts may have changed
+    invalidate_count(Patient)
+    await session.refresh(db_patient)
+    return db_patient
+
+
+async def delete_patient(*, session: AsyncSession, patient_id: UUID) -> bool:
+    """Delete a patient by ID."""
+
+    statement = select(Patient).where(Patient.id == patient_id)
+    patient = (await session.exec(statement)).first()
+    if patient:
+        await session.delete(patient)
+        await session.commit()
+        invalidate_count(Patient)
+        return True
+    return False
+
+
+async def count_patients(
+    *,
+    session: AsyncSession,
+    mode: CountMode = CountMode.EXACT,
+    filters: PatientFilters | None = None,
+) -> int | None:
+    """
+    Count total number of patients.
+
+    Args:
+        session: DB session
+        mode: How to count. Exact counts are cached for `COUNT_CACHE_TTL`
+            seconds. Filtered patients are always counted exactly
+        filters: Criteria the patients counted must match
+
+    Returns:
+        The amount of patients, or None if `mode` is "none".
+    """
+
+    return await count_rows_async(
+        session=session,
+        model=Patient,
+        mode=mode,
+        where=filter_clauses(filters),
+        key=filters_key(filters),
+    )
+
+
+async def bulk_create_patients(
+    *,
+    session: AsyncSession,
+    patients: Iterable[PatientCreate],
+    chunk_size: int = 1000,
+) -> PatientsBulkResult:
+    """
+    Create many patients at once, skipping the ones that already exist.
+
+    See `patient_use_case.bulk_create_patients`, which this runs on the
+    session's underlying sync session.
+    """
+
+    return await session.run_sync(
+        lambda sync_session: patient_use_case.bulk_create_patients(
+            session=sync_session, patients=patients, chunk_size=chunk_size
+        )
+    )
+
+
+async def bulk_upsert_patients(
+    *,
+    session: AsyncSession,
+    patients: Iterable[PatientCreate],
+    key: Literal["id", "ssn"] = "ssn",
+    chunk_size: int = 1000,
+) -> PatientsBulkResult:
+    """
+    Create many patients at once, updating the ones that already exist.
+
+    See `patient_use_case.bulk_upsert_patients`, which this runs on the
+    session's underlying sync session.
+    """
+
+    return await session.run_sync(
+        lambda sync_session: patient_use_case.bulk_upsert_patients(
+            session=sync_session,
+            patients=patients,
+            key=key,
+            chunk_size=chunk_size,
+        )
+    )
+
+
+async def bulk_update_patients(
+    *,
+    session: AsyncSession,
+    updates: Iterable[PatientBulkUpdate],
+    chunk_size: int = 1000,
+) -> PatientsBulkResult:
+    """
+    Update many patients at once, by ID.
+
+    See `patient_use_case.bulk_update_patients`, which this runs on the
+    session's underlying sync session.
+    """
+
+    return await session.run_sync(
+        lambda sync_session: patient_use_case.bulk_update_patients(
+            session=sync_session, updates=updates, chunk_size=chunk_size
+        )
+    )
+
+
+async def bulk_delete_patients(
+    *, session: AsyncSession, patient_ids: list[UUID]
+) -> PatientsBulkResult:
+    """
+    Delete many patients at once, by ID, with a single DELETE statement.
+
+    See `patient_use_case.bulk_delete_patients`, which this runs on the
+    session's underlying sync session.
+    """
+
+    return await session.run_sync(
+        lambda sync_session: patient_use_case.bulk_delete_patients(
+            session=sync_session, patient_ids=patient_ids
+        )
+    )
@@ -0,0 +1,186 @@
+"""
+Implementation of user-related use cases (CRUD), for async sessions.
+
+Mirrors `user_use_case`, with the same functions taking an `AsyncSession`
+instead of a `Session`. Password hashing is CPU-bound, so it runs in the
+password hashing pool of `auth` instead of blocking the event loop.
+"""
+
+from typing import Any
+
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from ._counts import count_rows_async, invalidate_count
+from ._login_guard import (
+    # Re-exported, for callers to tell throttled logins apart
+    LoginThrottledError,  # noqa: F401
+    check_login_throttle,
+    get_dummy_password_hash_async,
+    invalidate_login,
+    is_login_rejected,
+    record_login_failure,
+    record_login_success,
+    unknown_email_cache,
+)
+from ._user_cache import cache_user, get_cached_user, invalidate_user
+from ..db import on_replica
+from ..auth import get_password_hash_async, verify_password_async
+from ..models import (
+    CountMode,
+    User,
+    UserCreate,
+    UserUpdate,
+)
+
+
+async def create_user(
+    *, session: AsyncSession, user_create: UserCreate
+) -> User:
+    """Create a new user."""
+
+    hashed_password = await get_password_hash_async(user_create.password)
+    db_obj = User.model_validate(
+        user_create, update={"hashed_password": hashed_password}
+    )
+    session.add(db_obj)
+    await session.commit()
+    invalidate_count(User)
+    invalidate_login(db_obj.email)
+    await session.refresh(db_obj)
+    return db_obj
+
+
+async def update_user(
+    *, session: AsyncSession, db_user: User, user_in: UserUpdate
+) -> Any:
+    """Update an existing user."""
+
+    previous_email = db_user.email
+    user_data = user_in.model_dump(exclude_unset=True)
+    extra_data = {}
+    if "password" in user_data:
+        password = user_data["password"]
+        hashed_password = await get_password_hash_async(password)
+        extra_data["hashed_password"] = hashed_password
+    db_user.sqlmodel_update(user_data, update=extra_data)
+    session.add(db_user)
+    await session.commit()
+    invalidate_user(db_user.id)
+    invalidate_login(previous_email)
+    invalidate_login(db_user.email)
+    await session.refresh(db_user)
+    return db_user
+
+
+async def delete_user(*, session: AsyncSession, db_user: User) -> None:
+    """Delete a user."""
+
+    await session.delete(db_user)
+    await session.commit()
+    invalidate_count(User)
+    invalidate_user(db_user.id)
+
+
+async def count_users(
+    *, session: AsyncSession, mode: CountMode = CountMode.EXACT
+) -> int | None:
+    """
+    Count total number of users.
+
+    Args:
+        session: DB session
+        mode: How to count. Exact counts are cached for `COUNT_CACHE_TTL`
+            seconds
+
+    Returns:
+        The amount of users, or None if `mode` is "none".
+    """
+
+    return await count_rows_async(session=session, model=User, mode=mode)
+
+
+async def get_user_by_email(
+    *, session: AsyncSession, email: str, replica: bool = False
+) -> User | None:
+    """
+    Get a user by email.
+
+    Read from the primary unless `replica` is set, so that uniqueness checks
+    and logins see the latest data, not a lagging replica's.
+    """
+
+    statement = select(User).where(User.email == email)
+    if replica:
+        statement = on_replica(statement)
+    session_user = (await session.exec(statement)).first()
+    return session_user
+
+
+async def get_user_by_id(
+    *, session: AsyncSession, user_id: int
+) -> User | None:
+    """
+    Get a user by id, for authenticating requests.
+
+    Users are cached for `USER_CACHE_TTL` seconds. Cached users are attached
+    to the session without querying the DB, so they can still be modified.
+    """
+
+    cached_user = get_cached_user(user_id)
+    if cached_user is not None:
+        return await session.merge(cached_user, load=False)
+
+    db_user = await session.get(User, user_id)
+    if db_user is not None:
+        cache_user(db_user)
+    return db_user
+
+
+async def authenticate(
+    *, session: AsyncSession, email: str, password: str
+) -> User | None:
+    """
+    Authenticate a user by email and password.
+
+    Credentials that failed recently are rejected without querying the DB
+    nor verifying the password.
+
+    Raises:
+        LoginThrottledError: If the account failed too many logins, and a
+            password was already checked in the throttling interval
+    """
+
+    if is_login_rejected(email, password):
+        return None
+    check_login_throttle(email)
+
+    db_user = None
+    if not unknown_email_cache.get(email, False):
+        db_user = await get_user_by_email(session=session, email=email)
+    if not db_user:
+        unknown_email_cache.set(email, True)
+        # Taking as long as for existing users
+        await verify_password_async(
+            password, await get_dummy_password_hash_async()
+        )
+        record_login_failure(email, password)
+        return None
+    if not await verify_password_async(password, db_user.hashed_password):
+        record_login_failure(email, password)
+        return None
+
+    record_login_success(email)
+    return db_user
+
+
+async def update_user_password(
+    db: AsyncSession, user: User, new_password: str
+):
+    """Update the password of a user."""
+
+    user.hashed_password = await get_password_hash_async(new_password)
+    await db.commit()
+    invalidate_user(user.id)
+    invalidate_login(user.email)
+    await db.refresh(user)
@@ -0,0 +1,117 @@
+"""
+Implementation of statistics about patients.
+
+Statistics are aggregated by the DB with GROUP BY queries, so that only their
+results are transferred, and cached for `STATS_CACHE_TTL` seconds, per kind
+and filters. Changes to patients are only reflected once they expire.
+"""
+
+from sqlmodel import Session
+
+from ._patient_stats_queries import (
+    # Re-exported, for callers to validate bucket sizes with
+    MAX_AGE_BUCKET_SIZE,  # noqa: F401
+    age_distribution_statement,
+    group_counts_statement,
+    healthcare_statement,
+    stats_cache,
+    stats_key,
+    to_age_distribution,
+    to_group_counts,
+    to_healthcare_stats,
+)
+from ..models import (
+    AgeDistribution,
+    HealthcareStatsGroups,
+    PatientFilters,
+    PatientGroupBy,
+    PatientGroupCounts,
+)
+
+
+def count_patients_by(
+    *,
+    session: Session,
+    group_by: PatientGroupBy,
+    filters: PatientFilters | None = None,
+) -> PatientGroupCounts:
+    """
+    Count patients per value of a field.
+
+    Args:
+        session: DB session
+        group_by: Field to group patients by
+        filters: Criteria the patients counted must match
+
+    Returns:
+        The amount of patients with each value, from most to least common.
+    """
+
+    key = stats_key("counts", group_by, filters)
+    result = stats_cache.get(key)
+    if result is None:
+        rows = session.exec(group_counts_statement(group_by, filters)).all()
+        result = to_group_counts(group_by, rows)
+        stats_cache.set(key, result)
+    return result
+
+
+def get_age_distribution(
+    *,
+    session: Session,
+    bucket_size: int = 10,
+    filters: PatientFilters | None = None,
+) -> AgeDistribution:
+    """
+    Count patients per range of ages.
+
+    Args:
+        session: DB session
+        bucket_size: Years covered by each range, from 1 to
+            `MAX_AGE_BUCKET_SIZE`
+        filters: Criteria the patients counted must match
+
+    Returns:
+        The amount of patients in each range with any, from youngest to
+        oldest.
+
+    Raises:
+        ValueError: If `bucket_size` is out of bounds.
+    """
+
+    key = stats_key("ages", bucket_size, filters)
+    result = stats_cache.get(key)
+    if result is None:
+        statement = age_distribution_statement(bucket_size, filters)
+        rows = session.exec(statement).all()
+        result = to_age_distribution(bucket_size, rows)
+        stats_cache.set(key, result)
+    return result
+
+
+def get_healthcare_stats(
+    *,
+    session: Session,
+    group_by: PatientGroupBy | None = None,
+    filters: PatientFilters | None = None,
+) -> HealthcareStatsGroups:
+    """
+    Sum and average the healthcare expenses and coverage of patients.
+
+    Args:
+        session: DB session
+        group_by: Field to group patients by, or None for overall figures
+        filters: Criteria the patients must match
+
+    Returns:
+        The figures of each group, from largest to smallest, or a single
+        entry of overall figures.
+    """
+
+    key = stats_key("healthcare", group_by, filters)
+    result = stats_cache.get(key)
+    if result is None:
+        rows = session.exec(healthcare_statement(group_by, filters)).all()
+        result = to_healthcare_stats(group_by, rows)
+        stats_cache.set(key, result)
+    return result
@@ -1,16 +1,44 @@
 """Implementation of patient-related use cases (CRUD)."""
 
-from typing import Any
-from uuid import UUID
+import base64
 
-from sqlmodel import Session, select, func
+from collections.abc import Iterable, Iterator, Sequence
+from itertools import islice
+from typing import Any, Literal, TypeVar
+from uuid import UUID, uuid4
 
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+from sqlmodel import Session, select
+
+from ._counts import count_rows, invalidate_count
+from ._patient_queries import (
+    any_of,
+    filter_clauses,
+    filters_key,
+    in_key_order,
+    rows_statement,
+    stream_statement,
+    to_plain_rows,
+)
+from ..db import on_replica
 from ..models import (
+    BulkStatus,
+    CountMode,
     Patient,
     PatientCreate,
+    PatientBulkUpdate,
+    PatientFilters,
+    PatientsBulkResult,
     PatientUpdate,
 )
 
+# Each patient row takes one query parameter per column, and Postgres accepts
+# at most 65535 parameters per statement
+MAX_BULK_CHUNK_SIZE = 2000
+
+T = TypeVar("T")
+
 
 def create_patient(
     *, session: Session, patient_create: PatientCreate
@@ -20,36 +48,226 @@ def create_patient(
     db_obj = Patient.model_validate(patient_create)
     session.add(db_obj)
     session.commit()
+    invalidate_count(Patient)
     session.refresh(db_obj)
     return db_obj
 
 
-def get_patient_by_id(*, session: Session, patient_id: UUID) -> Patient | None:
-    """Get a patient by ID."""
+def get_patient_by_id(
+    *, session: Session, patient_id: UUID, replica: bool = False
+) -> Patient | None:
+    """
+    Get a patient by ID.
+
+    Read from the primary unless `replica` is set, so that lookups that
+    precede a write see the latest data, not a lagging replica's.
+    """
 
     statement = select(Patient).where(Patient.id == patient_id)
+    if replica:
+        statement = on_replica(statement)
     patient = session.exec(statement).first()
     return patient
 
 
-def get_patient_by_ssn(*, session: Session, ssn: str) -> Patient | None:
-    """Get a patient by SSN."""
+def get_patient_version(*, session: Session, patient_id: UUID) -> int | None:
+    """Get only the version of a patient, or None if there is no patient."""
+
+    statement = select(Patient.version).where(Patient.id == patient_id)
+    return session.exec(on_replica(statement)).first()
+
+
+def get_patient_by_ssn(
+    *, session: Session, ssn: str, replica: bool = False
+) -> Patient | None:
+    """
+    Get a patient by SSN.
+
+    Read from the primary unless `replica` is set, like `get_patient_by_id`.
+    """
 
     statement = select(Patient).where(Patient.ssn == ssn)
+    if replica:
+        statement = on_replica(statement)
     patient = session.exec(statement).first()
     return patient
 
 
+def get_patients_by_ids(
+    *, session: Session, patient_ids: list[UUID]
+) -> list[Patient | None]:
+    """
+    Get many patients by ID, with a single `= ANY(:ids)` query.
+
+    Returns:
+        The patient of each ID, in the same order, or None for IDs that don't
+        belong to any patient.
+    """
+
+    statement = select(Patient).where(
+        Patient.id == any_of(patient_ids, sa.Uuid)
+    )
+    patients = session.exec(statement).all()
+    return in_key_order(patients, patient_ids, "id")
+
+
+def get_patients_by_ssns(
+    *, session: Session, ssns: list[str]
+) -> list[Patient | None]:
+    """
+    Get many patients by SSN, with a single `= ANY(:ssns)` query.
+
+    Returns:
+        The patient of each SSN, in the same order, or None for SSNs that don't
+        belong to any patient.
+    """
+
+    statement = select(Patient).where(Patient.ssn == any_of(ssns, sa.String))
+    patients = session.exec(statement).all()
+    return in_key_order(patients, ssns, "ssn")
+
+
 def get_patients(
-    *, session: Session, skip: int = 0, limit: int = 100
+    *,
+    session: Session,
+    skip: int = 0,
+    limit: int = 100,
+    filters: PatientFilters | None = None,
 ) -> list[Patient]:
-    """Get multiple patients with pagination."""
+    """Get multiple patients with pagination, ordered by ID."""
 
-    statement = select(Patient).offset(skip).limit(limit)
-    patients = session.exec(statement).all()
+    statement = (
+        select(Patient)
+        .where(*filter_clauses(filters))
+        .order_by(Patient.id)
+        .offset(skip)
+        .limit(limit)
+    )
+    patients = session.exec(on_replica(statement)).all()
+    return list(patients)
+
+
+def get_patients_after(
+    *,
+    session: Session,
+    after: UUID | None = None,
+    limit: int = 100,
+    filters: PatientFilters | None = None,
+) -> list[Patient]:
+    """
+    Get multiple patients with keyset pagination, ordered by ID.
+
+    Unlike `get_patients`, which has to scan and discard every skipped row,
+    this seeks straight to the first patient of the page through the primary
+    key's index, so every page costs the same.
+
+    Args:
+        session: DB session
+        after: ID of the last patient of the previous page, or None for the
+            first page
+        limit: Maximum amount of patients to return
+        filters: Criteria the patients must match
+    """
+
+    statement = (
+        select(Patient)
+        .where(*filter_clauses(filters))
+        .order_by(Patient.id)
+        .limit(limit)
+    )
+    if after is not None:
+        statement = statement.where(Patient.id > after)
+    patients = session.exec(on_replica(statement)).all()
     return list(patients)
 
 
+def get_patient_rows(
+    *,
+    session: Session,
+    skip: int = 0,
+    after: UUID | None = None,
+    limit: int = 100,
+    filters: PatientFilters | None = None,
+) -> list[dict[str, Any]]:
+    """
+    Get multiple patients as plain rows, ordered by ID.
+
+    Pages like `get_patients`, or like `get_patients_after` when `after` is
+    given, but without building ORM objects. Meant for responses serialized
+    straight to JSON, for which building and validating models for every
+    patient costs more than the query itself.
+
+    Returns:
+        Dicts with the fields of `PatientPublic`, in the same order. Enums are
+        given as their values.
+    """
+
+    result = session.execute(rows_statement(skip, after, limit, filters))
+    return to_plain_rows(result)
+
+
+def get_patient_versions(
+    *,
+    session: Session,
+    skip: int = 0,
+    after: UUID | None = None,
+    limit: int = 100,
+    filters: PatientFilters | None = None,
+) -> list[tuple[UUID, int]]:
+    """
+    Get only the IDs and versions of multiple patients, ordered by ID.
+
+    Pages like `get_patient_rows`, for telling whether a page changed much
+    more cheaply than by getting it again.
+    """
+
+    statement = rows_statement(
+        skip, after, limit, filters, columns=[Patient.id, Patient.version]
+    )
+    result = session.execute(statement)
+    return [(row.id, row.version) for row in result]
+
+
+def stream_patients(
+    *, session: Session, batch_size: int = 1000
+) -> Iterator[Sequence[sa.RowMapping]]:
+    """
+    Stream every patient, ordered by ID, in batches of plain rows.
+
+    Rows are fetched from a server-side cursor, `batch_size` at a time, so
+    that only one batch is ever held in memory.
+
+    Yields:
+        Lists of rows, as mappings from column names to values.
+    """
+
+    result = session.execute(
+        stream_statement(), execution_options={"yield_per": batch_size}
+    )
+    yield from result.mappings().partitions()
+
+
+def encode_patient_cursor(patient_id: UUID) -> str:
+    """Encode the ID of the last patient of a page into an opaque cursor."""
+
+    return base64.urlsafe_b64encode(patient_id.bytes).rstrip(b"=").decode()
+
+
+def decode_patient_cursor(cursor: str) -> UUID:
+    """
+    Decode a cursor made by `encode_patient_cursor` back into a patient ID.
+
+    Raises:
+        ValueError: If the cursor is invalid.
+    """
+
+    padding = "=" * (-len(cursor) % 4)
+    try:
+        return UUID(bytes=base64.urlsafe_b64decode(cursor + padding))
+    except ValueError as e:
+        raise ValueError(f"Invalid patient cursor: {cursor!r}") from e
+
+
 def update_patient(
     *, session: Session, db_patient: Patient, patient_in: PatientUpdate
 ) -> Any:
@@ -59,6 +277,8 @@ def update_patient(
     db_patient.sqlmodel_update(patient_data)
     session.add(db_patient)
     session.commit()
+    # Filtered counts may have changed
+    invalidate_count(Patient)
     session.refresh(db_patient)
     return db_patient
 
@@ -71,14 +291,422 @@ def delete_patient(*, session: Session, patient_id: UUID) -> bool:
     if patient:
         session.delete(patient)
         session.commit()
+        invalidate_count(Patient)
         return True
     return False
 
 
-def count_patients(*, session: Session) -> int:
-    """Count total number of patients."""
+def count_patients(
+    *,
+    session: Session,
+    mode: CountMode = CountMode.EXACT,
+    filters: PatientFilters | None = None,
+) -> int | None:
+    """
+    Count total number of patients.
+
+    Args:
+        session: DB session
+        mode: How to count. Exact counts are cached for `COUNT_CACHE_TTL`
+            seconds. Filtered patients are always counted exactly
+        filters: Criteria the patients counted must match
+
+    Returns:
+        The amount of patients, or None if `mode` is "none".
+    """
+
+    return count_rows(
+        session=session,
+        model=Patient,
+        mode=mode,
+        where=filter_clauses(filters),
+        key=filters_key(filters),
+    )
+
+
+def _chunked(patients: Iterable[T], chunk_size: int) -> Iterator[list[T]]:
+    """Splits an iterable of patients into lists of at most `chunk_size`."""
+
+    iterator = iter(patients)
+    while chunk := list(islice(iterator, chunk_size)):
+        yield chunk
+
+
+def _get_existing_keys(
+    *, session: Session, rows: list[dict[str, Any]]
+) -> tuple[dict[str, UUID], set[UUID]]:
+    """
+    Finds which of the rows' SSNs and IDs already exist in the DB.
+
+    Returns:
+        A mapping from each existing SSN to the ID of its patient, and the set
+        of existing IDs.
+    """
+
+    ssns = [row["ssn"] for row in rows]
+    ids = [row["id"] for row in rows]
+    statement = select(Patient.id, Patient.ssn).where(
+        sa.or_(
+            Patient.ssn == any_of(ssns, sa.String),
+            Patient.id == any_of(ids, sa.Uuid),
+        )
+    )
+    existing = session.exec(statement).all()
+
+    id_by_ssn = {ssn: patient_id for patient_id, ssn in existing}
+    existing_ids = {patient_id for patient_id, _ in existing}
+    return id_by_ssn, existing_ids
+
+
+def _to_rows(chunk: list[PatientCreate]) -> list[dict[str, Any]]:
+    """Validates patients and converts them to rows for the patients table."""
+
+    rows = []
+    for patient_create in chunk:
+        # Versions are set by the DB
+        row = Patient.model_validate(patient_create).model_dump(
+            exclude={"version"}
+        )
+        if row["id"] is None:
+            row["id"] = uuid4()
+        rows.append(row)
+    return rows
+
+
+def _bulk_write_chunk(
+    *,
+    session: Session,
+    chunk: list[PatientCreate],
+    seen_ssns: set[str],
+    seen_ids: set[UUID],
+    result: PatientsBulkResult,
+    upsert: bool,
+    key: Literal["id", "ssn"],
+) -> None:
+    """Writes a chunk of patients with a single multi-row INSERT."""
+
+    rows = _to_rows(chunk)
+    id_by_ssn, existing_ids = _get_existing_keys(session=session, rows=rows)
+
+    # Status of each row of the chunk, None for the ones that will be written
+    statuses: list[BulkStatus | None] = []
+    to_write: list[dict[str, Any]] = []
+    for row in rows:
+        existing_id = id_by_ssn.get(row["ssn"])
+        if upsert and key == "ssn" and existing_id is not None:
+            # Updating the patient that has this SSN, whatever ID came in
+            row["id"] = existing_id
+
+        if row["ssn"] in seen_ssns or row["id"] in seen_ids:
+            # Only the first occurrence of each SSN and ID is written
+            statuses.append(BulkStatus.SKIPPED)
+            continue
+
+        if not upsert:
+            conflict = existing_id is not None or row["id"] in existing_ids
+        elif key == "ssn":
+            # The ID can't be taken by a patient with another SSN
+            conflict = existing_id is None and row["id"] in existing_ids
+        else:
+            # The SSN can't be taken by a patient other than the one updated
+            conflict = existing_id is not None and existing_id != row["id"]
+
+        if conflict:
+            statuses.append(BulkStatus.CONFLICT)
+            continue
+
+        seen_ssns.add(row["ssn"])
+        seen_ids.add(row["id"])
+        statuses.append(None)
+        to_write.append(row)
+
+    written: dict[UUID, bool] = {}
+    if to_write:
+        statement = postgresql.insert(Patient).values(to_write)
+        if upsert:
+            statement = statement.on_conflict_do_update(
+                index_elements=[Patient.id],
+                set_={
+                    column.name: statement.excluded[column.name]
+                    for column in Patient.__table__.columns  # type: ignore
+                    if column.name not in ("id", "version")
+                },
+            )
+        else:
+            statement = statement.on_conflict_do_nothing()
+        statement = statement.returning(
+            Patient.id,
+            # xmax is only zero for rows that weren't there before
+            sa.literal_column("xmax = 0").label("inserted"),
+        )
+        written = dict(session.exec(statement).all())  # type: ignore
+
+    rows_to_write = iter(to_write)
+    for status in statuses:
+        if status is None:
+            inserted = written.get(next(rows_to_write)["id"])
+            if inserted is None:
+                # Lost a race against a concurrent insert
+                status = BulkStatus.CONFLICT
+            elif inserted:
+                status = BulkStatus.CREATED
+            else:
+                status = BulkStatus.UPDATED
+        result.add(status)
+
+
+def _check_chunk_size(chunk_size: int) -> None:
+    if not 1 <= chunk_size <= MAX_BULK_CHUNK_SIZE:
+        raise ValueError(
+            f"`chunk_size` must be between 1 and {MAX_BULK_CHUNK_SIZE}"
+        )
+
+
+def _bulk_write_patients(
+    *,
+    session: Session,
+    patients: Iterable[PatientCreate],
+    chunk_size: int,
+    upsert: bool,
+    key: Literal["id", "ssn"],
+) -> PatientsBulkResult:
+    """Writes patients in chunks, all within a single transaction."""
+
+    _check_chunk_size(chunk_size)
+
+    result = PatientsBulkResult()
+    seen_ssns: set[str] = set()
+    seen_ids: set[UUID] = set()
+    try:
+        for chunk in _chunked(patients, chunk_size):
+            _bulk_write_chunk(
+                session=session,
+                chunk=chunk,
+                seen_ssns=seen_ssns,
+                seen_ids=seen_ids,
+                result=result,
+                upsert=upsert,
+                key=key,
+            )
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    if result.created or result.updated:
+        invalidate_count(Patient)
+    return result
+
+
+def bulk_create_patients(
+    *,
+    session: Session,
+    patients: Iterable[PatientCreate],
+    chunk_size: int = 1000,
+) -> PatientsBulkResult:
+    """
+    Create many patients at once, skipping the ones that already exist.
+
+    Patients are inserted with multi-row `INSERT ... ON CONFLICT DO NOTHING`
+    statements of up to `chunk_size` rows, all within a single transaction.
+    Patients whose SSN or ID already exist in the DB are reported as
+    conflicts, and repeated SSNs or IDs within `patients` as skipped. Created
+    patients are not refreshed.
+
+    Args:
+        session: DB session. Committed at the end, or rolled back on errors
+        patients: Patients to create
+        chunk_size: Maximum amount of patients per INSERT statement
+
+    Returns:
+        Counts of created, skipped and conflicting patients, plus the status
+        of each patient received, in order.
+    """
+
+    return _bulk_write_patients(
+        session=session,
+        patients=patients,
+        chunk_size=chunk_size,
+        upsert=False,
+        key="ssn",
+    )
+
+
+def bulk_upsert_patients(
+    *,
+    session: Session,
+    patients: Iterable[PatientCreate],
+    key: Literal["id", "ssn"] = "ssn",
+    chunk_size: int = 1000,
+) -> PatientsBulkResult:
+    """
+    Create many patients at once, updating the ones that already exist.
+
+    Patients are written with multi-row `INSERT ... ON CONFLICT DO UPDATE`
+    statements of up to `chunk_size` rows, all within a single transaction.
+
+    Args:
+        session: DB session. Committed at the end, or rolled back on errors
+        patients: Patients to create or update
+        key: Field identifying existing patients. When "ssn", the ID received
+            for patients that already exist is ignored. When "id", patients
+            can't take an SSN that belongs to another patient. Either way,
+            writes that would break SSN or ID uniqueness are reported as
+            conflicts, and repeated keys within `patients` as skipped
+        chunk_size: Maximum amount of patients per INSERT statement
+
+    Returns:
+        Counts of created, updated, skipped and conflicting patients, plus the
+        status of each patient received, in order.
+    """
+
+    return _bulk_write_patients(
+        session=session,
+        patients=patients,
+        chunk_size=chunk_size,
+        upsert=True,
+        key=key,
+    )
+
+
+def _bulk_update_chunk(
+    *,
+    session: Session,
+    chunk: list[PatientBulkUpdate],
+    seen_ids: set[UUID],
+    taken_ssns: dict[str, UUID],
+    result: PatientsBulkResult,
+) -> None:
+    """Updates a chunk of patients, with one query to check their keys."""
+
+    ids = [update.id for update in chunk]
+    new_ssns = [update.ssn for update in chunk if update.ssn is not None]
+    statement = select(Patient.id, Patient.ssn).where(
+        sa.or_(
+            Patient.id == any_of(ids, sa.Uuid),
+            Patient.ssn == any_of(new_ssns, sa.String),
+        )
+    )
+    existing = session.exec(statement).all()
+    existing_ids = {patient_id for patient_id, _ in existing}
+    for patient_id, ssn in existing:
+        taken_ssns.setdefault(ssn, patient_id)
+
+    rows: list[dict[str, Any]] = []
+    for update in chunk:
+        if update.id in seen_ids:
+            # Only the first update of each patient is applied
+            result.add(BulkStatus.SKIPPED)
+            continue
+        seen_ids.add(update.id)
+
+        if update.id not in existing_ids:
+            result.add(BulkStatus.NOT_FOUND)
+            continue
+
+        if (
+            update.ssn is not None
+            and taken_ssns.setdefault(update.ssn, update.id) != update.id
+        ):
+            result.add(BulkStatus.CONFLICT)
+            continue
+
+        rows.append(update.model_dump(exclude_unset=True))
+        result.add(BulkStatus.UPDATED)
+
+    if rows:
+        # Rows are grouped by their set of columns, each group being updated
+        # with a single executemany
+        session.execute(sa.update(Patient), rows)
+
+
+def bulk_update_patients(
+    *,
+    session: Session,
+    updates: Iterable[PatientBulkUpdate],
+    chunk_size: int = 1000,
+) -> PatientsBulkResult:
+    """
+    Update many patients at once, by ID.
+
+    Each chunk of up to `chunk_size` updates costs one query to find which
+    patients exist and which SSNs are taken, plus one batched UPDATE per set
+    of updated fields, all within a single transaction. Only the fields set
+    in each update are written.
+
+    Args:
+        session: DB session. Committed at the end, or rolled back on errors
+        updates: Updates to apply, each with the ID of its patient
+        chunk_size: Maximum amount of updates checked per query
+
+    Returns:
+        Counts of updated, skipped, conflicting and not found patients, plus
+        the status of each update received, in order. Repeated IDs are
+        skipped, and updates giving a patient an SSN that belongs to another
+        one are conflicts.
+    """
+
+    _check_chunk_size(chunk_size)
+
+    result = PatientsBulkResult()
+    seen_ids: set[UUID] = set()
+    # Owner of each SSN known so far, including the ones updated
+    taken_ssns: dict[str, UUID] = {}
+    try:
+        for chunk in _chunked(updates, chunk_size):
+            _bulk_update_chunk(
+                session=session,
+                chunk=chunk,
+                seen_ids=seen_ids,
+                taken_ssns=taken_ssns,
+                result=result,
+            )
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    if result.updated:
+        invalidate_count(Patient)
+    return result
+
+
+def bulk_delete_patients(
+    *, session: Session, patient_ids: list[UUID]
+) -> PatientsBulkResult:
+    """
+    Delete many patients at once, by ID, with a single DELETE statement.
+
+    Args:
+        session: DB session. Committed at the end
+        patient_ids: IDs of the patients to delete
+
+    Returns:
+        Counts of deleted, skipped and not found patients, plus the status of
+        each ID received, in order. Repeated IDs are skipped.
+    """
+
+    statement = (
+        sa.delete(Patient)
+        .where(Patient.id == any_of(patient_ids, sa.Uuid))
+        .returning(Patient.id)
+    )
+    try:
+        deleted = set(session.exec(statement).scalars())  # type: ignore
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
 
-    statement = select(func.count()).select_from(Patient)
-    count = session.exec(statement).one()
+    result = PatientsBulkResult()
+    seen_ids: set[UUID] = set()
+    for patient_id in patient_ids:
+        if patient_id in seen_ids:
+            result.add(BulkStatus.SKIPPED)
+        elif patient_id in deleted:
+            result.add(BulkStatus.DELETED)
+        else:
+            result.add(BulkStatus.NOT_FOUND)
+        seen_ids.add(patient_id)
 
-    return count
+    if result.deleted:
+        invalidate_count(Patient)
+    return result
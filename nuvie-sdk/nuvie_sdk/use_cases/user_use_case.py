@@ -5,8 +5,23 @@ from typing import Any
 from sqlmodel import Session, select
 
 # from .._logger import log
+from ._counts import count_rows, invalidate_count
+from ._login_guard import (
+    # Re-exported, for callers to tell throttled logins apart
+    LoginThrottledError,  # noqa: F401
+    check_login_throttle,
+    get_dummy_password_hash,
+    invalidate_login,
+    is_login_rejected,
+    record_login_failure,
+    record_login_success,
+    unknown_email_cache,
+)
+from ._user_cache import cache_user, get_cached_user, invalidate_user
+from ..db import on_replica
 from ..auth import get_password_hash, verify_password
 from ..models import (
+    CountMode,
     User,
     UserCreate,
     UserUpdate,
@@ -22,6 +37,8 @@ def create_user(*, session: Session, user_create: UserCreate) -> User:
     )
     session.add(db_obj)
     session.commit()
+    invalidate_count(User)
+    invalidate_login(db_obj.email)
     session.refresh(db_obj)
     return db_obj
 
@@ -31,6 +48,7 @@ def update_user(
 ) -> Any:
     """Update an existing user."""
 
+    previous_email = db_user.email
     user_data = user_in.model_dump(exclude_unset=True)
     extra_data = {}
     if "password" in user_data:
@@ -40,28 +58,107 @@ def update_user(
     db_user.sqlmodel_update(user_data, update=extra_data)
     session.add(db_user)
     session.commit()
+    invalidate_user(db_user.id)
+    invalidate_login(previous_email)
+    invalidate_login(db_user.email)
     session.refresh(db_user)
     return db_user
 
 
-def get_user_by_email(*, session: Session, email: str) -> User | None:
-    """Get a user by email."""
+def delete_user(*, session: Session, db_user: User) -> None:
+    """Delete a user."""
+
+    session.delete(db_user)
+    session.commit()
+    invalidate_count(User)
+    invalidate_user(db_user.id)
+
+
+def count_users(
+    *, session: Session, mode: CountMode = CountMode.EXACT
+) -> int | None:
+    """
+    Count total number of users.
+
+    Args:
+        session: DB session
+        mode: How to count. Exact counts are cached for `COUNT_CACHE_TTL`
+            seconds
+
+    Returns:
+        The amount of users, or None if `mode` is "none".
+    """
+
+    return count_rows(session=session, model=User, mode=mode)
+
+
+def get_user_by_email(
+    *, session: Session, email: str, replica: bool = False
+) -> User | None:
+    """
+    Get a user by email.
+
+    Read from the primary unless `replica` is set, so that uniqueness checks
+    and logins see the latest data, not a lagging replica's.
+    """
 
     statement = select(User).where(User.email == email)
+    if replica:
+        statement = on_replica(statement)
     session_user = session.exec(statement).first()
     return session_user
 
 
+def get_user_by_id(*, session: Session, user_id: int) -> User | None:
+    """
+    Get a user by id, for authenticating requests.
+
+    Users are cached for `USER_CACHE_TTL` seconds. Cached users are attached
+    to the session without querying the DB, so they can still be modified.
+    """
+
+    cached_user = get_cached_user(user_id)
+    if cached_user is not None:
+        return session.merge(cached_user, load=False)
+
+    db_user = session.get(User, user_id)
+    if db_user is not None:
+        cache_user(db_user)
+    return db_user
+
+
 def authenticate(
     *, session: Session, email: str, password: str
 ) -> User | None:
-    """Authenticate a user by email and password."""
+    """
+    Authenticate a user by email and password.
 
-    db_user = get_user_by_email(session=session, email=email)
+    Credentials that failed recently are rejected without querying the DB
+    nor verifying the password.
+
+    Raises:
+        LoginThrottledError: If the account failed too many logins, and a
+            password was already checked in the throttling interval
+    """
+
+    if is_login_rejected(email, password):
+        return None
+    check_login_throttle(email)
+
+    db_user = None
+    if not unknown_email_cache.get(email, False):
+        db_user = get_user_by_email(session=session, email=email)
     if not db_user:
+        unknown_email_cache.set(email, True)
+        # Taking as long as for existing users
+        verify_password(password, get_dummy_password_hash())
+        record_login_failure(email, password)
         return None
     if not verify_password(password, db_user.hashed_password):
+        record_login_failure(email, password)
         return None
+
+    record_login_success(email)
     return db_user
 
 
@@ -70,4 +167,6 @@ def update_user_password(db: Session, user: User, new_password: str):
 
     user.hashed_password = get_password_hash(new_password)
     db.commit()
+    invalidate_user(user.id)
+    invalidate_login(user.email)
     db.refresh(user)
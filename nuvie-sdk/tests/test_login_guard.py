@@ -0,0 +1,131 @@
+import asyncio
+import time
+
+from types import SimpleNamespace
+
+import pytest
+
+from nuvie_sdk import constants as c
+from nuvie_sdk.use_cases import (
+    _login_guard,
+    async_user_use_case,
+    user_use_case,
+)
+from nuvie_sdk.use_cases.user_use_case import LoginThrottledError
+
+EMAIL = "user@example.com"
+CORRECT_PASSWORD = "correct horse battery staple"
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def checked_passwords(monkeypatch, clock):
+    """Passwords that reached bcrypt, for a single user and no DB."""
+
+    checked = []
+
+    def verify_password(password, hashed_password):
+        checked.append(password)
+        return password == CORRECT_PASSWORD
+
+    async def verify_password_async(password, hashed_password):
+        return verify_password(password, hashed_password)
+
+    user = SimpleNamespace(email=EMAIL, hashed_password="hash")
+
+    async def get_user_by_email_async(*, session, email):
+        return user
+
+    monkeypatch.setattr(user_use_case, "verify_password", verify_password)
+    monkeypatch.setattr(
+        user_use_case, "get_user_by_email", lambda *, session, email: user
+    )
+    monkeypatch.setattr(
+        async_user_use_case, "verify_password_async", verify_password_async
+    )
+    monkeypatch.setattr(
+        async_user_use_case, "get_user_by_email", get_user_by_email_async
+    )
+    monkeypatch.setattr(c, "LOGIN_MAX_FAILURES", 3)
+
+    _login_guard.invalidate_login(EMAIL)
+    yield checked
+    _login_guard.invalidate_login(EMAIL)
+
+
+def authenticate(password: str):
+    return user_use_case.authenticate(
+        session=None, email=EMAIL, password=password
+    )
+
+
+def test_distinct_bad_passwords_stop_reaching_bcrypt(checked_passwords):
+    for i in range(3):
+        assert authenticate(f"guess {i}") is None
+    # One more password is checked for the interval, then none until it ends
+    assert authenticate("guess 3") is None
+    for i in range(4, 20):
+        with pytest.raises(LoginThrottledError) as error:
+            authenticate(f"guess {i}")
+
+    assert checked_passwords == [f"guess {i}" for i in range(4)]
+    assert error.value.retry_after == c.LOGIN_THROTTLE_INTERVAL
+
+
+def test_correct_password_logs_in_once_throttle_allows(
+    checked_passwords, clock
+):
+    for i in range(4):
+        assert authenticate(f"guess {i}") is None
+    with pytest.raises(LoginThrottledError):
+        authenticate(CORRECT_PASSWORD)
+
+    clock[0] += c.LOGIN_THROTTLE_INTERVAL
+    assert authenticate(CORRECT_PASSWORD) is not None
+
+    # Logging in stops throttling the account
+    assert authenticate("guess 4") is None
+    assert authenticate("guess 5") is None
+    assert checked_passwords[-3:] == [CORRECT_PASSWORD, "guess 4", "guess 5"]
+
+
+def test_throttled_logins_dont_delay_the_next_check(checked_passwords, clock):
+    for i in range(4):
+        assert authenticate(f"guess {i}") is None
+
+    clock[0] += c.LOGIN_THROTTLE_INTERVAL / 2
+    with pytest.raises(LoginThrottledError) as error:
+        authenticate(CORRECT_PASSWORD)
+    assert error.value.retry_after == c.LOGIN_THROTTLE_INTERVAL / 2
+
+    clock[0] += c.LOGIN_THROTTLE_INTERVAL / 2
+    assert authenticate(CORRECT_PASSWORD) is not None
+
+
+def test_repeated_credentials_are_rejected_without_bcrypt(checked_passwords):
+    for _ in range(10):
+        assert authenticate("guess") is None
+
+    assert checked_passwords == ["guess"]
+
+
+def test_async_logins_are_throttled_too(checked_passwords, clock):
+    async def authenticate_async(password: str):
+        return await async_user_use_case.authenticate(
+            session=None, email=EMAIL, password=password
+        )
+
+    for i in range(4):
+        assert asyncio.run(authenticate_async(f"guess {i}")) is None
+    with pytest.raises(LoginThrottledError):
+        asyncio.run(authenticate_async("guess 4"))
+
+    clock[0] += c.LOGIN_THROTTLE_INTERVAL
+    assert asyncio.run(authenticate_async(CORRECT_PASSWORD)) is not None
+    assert len(checked_passwords) == 5